@@ -0,0 +1,209 @@
+"""
+Activity
+--------
+
+Weed out inactive repos before any per-repo request goes out. Most tracked
+repos haven't been pushed to within the contributor-counting window, and many
+of them share an owner. A single listing of an owner's repos, sorted by
+`pushed_at`, answers the "was this pushed recently?" question for all of that
+owner's tracked repos at once. The `pushed_at` values seen are cached in
+`out/cache/`, so repos already known to be active can skip the check next run.
+"""
+
+import datetime
+import json
+import logging
+import os
+
+from github import Github
+from github.PaginatedList import PaginatedList
+from github.Repository import Repository
+
+from crawler.cache import cache_dir
+
+logger = logging.getLogger(__name__)
+
+RepoActivity = tuple[datetime.datetime | None, bool]
+"""A repo's `pushed_at` time, and whether it's archived."""
+
+observed_pushed_at: dict[str, datetime.datetime] = {}
+"""The `pushed_at` times seen during this run, keyed by `owner/name`."""
+
+
+def repo_key(repo: str) -> str:
+    """Turn a repository URL into a lower-cased `owner/name` key.
+
+    :param repo: The URL of the repository.
+    :type repo: str
+    :return: The lower-cased `owner/name` of the repository.
+    :rtype: str
+    """
+    return "/".join(repo.rstrip("/").split("/")[-2:]).lower()
+
+
+def group_by_owner(repos: list[str]) -> dict[str, set[str]]:
+    """Group repositories by their (lower-cased) owner.
+
+    :param repos: The URLs of the repositories.
+    :type repos: list[str]
+    :return: The lower-cased repo names, per lower-cased owner.
+    :rtype: dict[str, set[str]]
+    """
+    owners: dict[str, set[str]] = {}
+    for repo in repos:
+        owner, name = repo_key(repo).split("/")
+        owners.setdefault(owner, set()).add(name)
+    return owners
+
+
+def list_owner_activity(
+    client: Github,
+    owner: str,
+    names: set[str],
+    since: datetime.datetime,
+    max_pages: int,
+) -> dict[str, RepoActivity]:
+    """List an owner's repos, most recently pushed first, to find out which of
+    the given repos have been pushed to since the given time.
+
+    The listing stops as soon as every one of the given repos has been seen.
+    It also stops after `max_pages`, once it's past `since`; any repos not seen
+    by then are left out of the result, so they still get checked one by one.
+
+    :param client: The Github client to list with.
+    :type client: Github
+    :param owner: The user or organization owning the repos.
+    :type owner: str
+    :param names: The lower-cased names of the owner's tracked repos.
+    :type names: set[str]
+    :param since: The start of the contributor-counting window.
+    :type since: datetime.datetime
+    :param max_pages: The number of pages to list before giving up.
+    :type max_pages: int
+    :return: The activity of each tracked repo seen in the listing, keyed by
+        lower-cased `owner/name`.
+    :rtype: dict[str, RepoActivity]
+    """
+    listing = PaginatedList(
+        Repository,
+        client.requester,
+        f"/users/{owner}/repos",
+        {"sort": "pushed", "direction": "desc", "type": "owner"},
+    )
+    max_repos = max_pages * client.per_page
+
+    seen: dict[str, RepoActivity] = {}
+    for i, repository in enumerate(listing):
+        name = repository.name.lower()
+        if name in names:
+            seen[f"{owner}/{name}"] = (repository.pushed_at, repository.archived)
+            record_pushed_at(f"{owner}/{name}", repository.pushed_at)
+        if len(seen) == len(names):
+            break
+        if i + 1 >= max_repos and (
+            repository.pushed_at is None or repository.pushed_at < since
+        ):
+            break
+
+    logger.debug("Listed %d of %d repos owned by %s", len(seen), len(names), owner)
+    return seen
+
+
+def is_active(activity: RepoActivity, since: datetime.datetime) -> bool:
+    """Check if a repo may have commits since the given time.
+
+    :param activity: The repo's `pushed_at` time, and whether it's archived.
+    :type activity: RepoActivity
+    :param since: The start of the contributor-counting window.
+    :type since: datetime.datetime
+    :return: Whether the repo was pushed to (and isn't archived) since then.
+    :rtype: bool
+    """
+    pushed_at, archived = activity
+    return pushed_at is not None and not archived and since <= pushed_at
+
+
+def _pushed_at_filepath() -> str:
+    return f"{cache_dir()}/pushed_at.json"
+
+
+def load_pushed_at() -> dict[str, datetime.datetime]:
+    """Load the `pushed_at` times cached by previous runs.
+
+    :return: The cached `pushed_at` times, keyed by lower-cased `owner/name`.
+    :rtype: dict[str, datetime.datetime]
+    """
+    try:
+        with open(_pushed_at_filepath(), "r", encoding="utf-8") as f:
+            cached: dict[str, str] = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+    return {
+        key: datetime.datetime.fromisoformat(value) for key, value in cached.items()
+    }
+
+
+def record_pushed_at(repo: str, pushed_at: datetime.datetime | None) -> None:
+    """Note a repo's `pushed_at` time, to be cached for the next run.
+
+    :param repo: The URL (or `owner/name`) of the repository.
+    :type repo: str
+    :param pushed_at: The time the repo was last pushed to, if ever.
+    :type pushed_at: datetime.datetime | None
+    """
+    if pushed_at is not None:
+        observed_pushed_at[repo_key(repo)] = pushed_at
+
+
+def store_pushed_at() -> None:
+    """Cache the `pushed_at` times seen during this run for the next one."""
+    pushed_at = load_pushed_at() | observed_pushed_at
+    filepath = _pushed_at_filepath()
+    with open(f"{filepath}.tmp", "w", encoding="utf-8") as f:
+        json.dump({key: value.isoformat() for key, value in pushed_at.items()}, f)
+    os.replace(f"{filepath}.tmp", filepath)
+
+
+def classify_repos(
+    repos: list[str],
+    since: datetime.datetime,
+    listed: dict[str, RepoActivity],
+    cached: dict[str, datetime.datetime],
+) -> tuple[set[str], set[str]]:
+    """Split repos into those known to be active, and those still unknown.
+
+    Repos seen in an owner listing are either active or dropped outright.
+    Otherwise, a cached `pushed_at` within the window proves a repo active
+    (pushes only ever move it forward), but an older one proves nothing.
+
+    :param repos: The URLs of the repositories.
+    :type repos: list[str]
+    :param since: The start of the contributor-counting window.
+    :type since: datetime.datetime
+    :param listed: The activity seen in owner listings this run.
+    :type listed: dict[str, RepoActivity]
+    :param cached: The `pushed_at` times cached by previous runs.
+    :type cached: dict[str, datetime.datetime]
+    :return: The repos known to be active, and the repos that still need to be
+        checked one by one. Every other repo is inactive.
+    :rtype: tuple[set[str], set[str]]
+    """
+    active: set[str] = set()
+    unknown: set[str] = set()
+    for repo in repos:
+        key = repo_key(repo)
+        if key in listed:
+            if is_active(listed[key], since):
+                active.add(repo)
+        elif key in cached and since <= cached[key]:
+            active.add(repo)
+        else:
+            unknown.add(repo)
+
+    logger.info(
+        "Activity pre-filter: %d active, %d unknown, %d inactive repos",
+        len(active),
+        len(unknown),
+        len(repos) - len(active) - len(unknown),
+    )
+    return active, unknown
@@ -0,0 +1,108 @@
+"""
+Cache
+-----
+
+Persist parsed results under `out/cache/`, keyed on the state of the Open Dev
+Data `migrations/` directory. As long as no mutation file is added, removed or
+edited, a warm cache lets a run skip the taxonomy export subprocess (and the
+JSON parsing that follows it) entirely.
+"""
+
+import hashlib
+import logging
+import os
+import pickle
+from typing import Any
+
+from crawler.constants import BASE_REPO_PATH
+
+logger = logging.getLogger(__name__)
+
+
+def cache_dir() -> str:
+    """Return the directory the cache files are stored in, creating it if needed.
+
+    :return: The absolute path of the cache directory.
+    :rtype: str
+    """
+    path = f"{os.getcwd()}/out/cache"
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def migrations_fingerprint() -> str:
+    """Fingerprint the Open Dev Data `migrations/` directory.
+
+    The fingerprint covers the name, size and modification time of every
+    migration file, so adding, removing or touching any of them changes it.
+
+    :return: A hex digest identifying the current migrations state.
+    :rtype: str
+    """
+    digest = hashlib.sha256()
+    migrations_path = f"{BASE_REPO_PATH}/migrations"
+
+    with os.scandir(migrations_path) as entries:
+        for entry in sorted(entries, key=lambda e: e.name):
+            if entry.is_file():
+                stat = entry.stat()
+                digest.update(
+                    f"{entry.name}\0{stat.st_size}\0{stat.st_mtime_ns}\n".encode()
+                )
+
+    return digest.hexdigest()[:16]
+
+
+def _cache_filepath(name: str, fingerprint: str) -> str:
+    return f"{cache_dir()}/{name}-{fingerprint}.pickle"
+
+
+def load_cached(name: str, fingerprint: str) -> Any | None:
+    """Load a cached object, if one was stored for the given fingerprint.
+
+    :param name: A filepath-friendly name for the cached object.
+    :type name: str
+    :param fingerprint: The fingerprint the object must have been stored with.
+    :type fingerprint: str
+    :return: The cached object, or `None` on a cache miss.
+    :rtype: Any | None
+    """
+    filepath = _cache_filepath(name, fingerprint)
+    try:
+        with open(filepath, "rb") as f:
+            cached = pickle.load(f)
+    except FileNotFoundError:
+        logger.debug("Cache miss for %s (%s)", name, fingerprint)
+        return None
+    except (pickle.UnpicklingError, EOFError, AttributeError, ImportError):
+        logger.warning("Ignoring unreadable cache file: %s", filepath)
+        return None
+
+    logger.debug("Cache hit for %s (%s)", name, fingerprint)
+    return cached
+
+
+def store_cached(name: str, fingerprint: str, obj: Any) -> None:
+    """Store an object in the cache, replacing any stale copies of it.
+
+    :param name: A filepath-friendly name for the cached object.
+    :type name: str
+    :param fingerprint: The fingerprint to store the object under.
+    :type fingerprint: str
+    :param obj: The (picklable) object to store.
+    :type obj: Any
+    """
+    filepath = _cache_filepath(name, fingerprint)
+
+    # entries for any other fingerprint can never be hit again
+    with os.scandir(cache_dir()) as entries:
+        for entry in entries:
+            stale_name = entry.name.removesuffix(".pickle").rsplit("-", 1)[0]
+            if stale_name == name and entry.path != filepath:
+                os.remove(entry.path)
+
+    # write to a temporary file first, so an interrupted run can't leave a
+    # truncated cache file behind
+    with open(f"{filepath}.tmp", "wb") as f:
+        pickle.dump(obj, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(f"{filepath}.tmp", filepath)
@@ -0,0 +1,170 @@
+"""
+Checkpoint
+----------
+
+Journal the progress of a crawl, so one that dies midway (a network error, a
+failed export) can pick up where it stopped with `crawl --resume`, instead of
+spending all that throttled search quota again.
+
+The journal lives at `out/checkpoints/crawl.json`. It records the ecosystems
+already processed, the repos already written out as `repadd` lines, and for
+every search query, the shards it was split into (see `sharding.py`) and the
+pages fetched so far along with the repos found on them.
+"""
+
+import json
+import logging
+import os
+import threading
+from dataclasses import dataclass, field
+
+logger = logging.getLogger(__name__)
+
+
+def default_checkpoint_filepath() -> str:
+    """Return where the crawl journal is kept, creating its directory if needed.
+
+    :return: The absolute path of the crawl journal.
+    :rtype: str
+    """
+    path = f"{os.getcwd()}/out/checkpoints"
+    os.makedirs(path, exist_ok=True)
+    return f"{path}/crawl.json"
+
+
+@dataclass
+class QueryProgress:
+    """How far a single search query got."""
+
+    next_page: int = 0
+    """The (zero-based) page of results to fetch next."""
+
+    done: bool = False
+    """Whether every page of results has been fetched."""
+
+    repos: set[str] = field(default_factory=set)
+    """The repo URLs found on the pages fetched so far."""
+
+    total_count: int | None = None
+    """The total number of results Github reported for the query."""
+
+    shards: list[str] | None = None
+    """The shards the query was split into, once they've been planned."""
+
+    first_result: str | None = None
+    """The first result of the query, which becomes its new high-water mark in
+    the search history."""
+
+    known_run: int = 0
+    """The number of results in a row, up to the last one fetched, that only
+    found repos the search history already knew."""
+
+
+@dataclass
+class CrawlCheckpoint:
+    """The progress of a crawl, saved after every step."""
+
+    filepath: str | None = field(default_factory=default_checkpoint_filepath)
+    """Where the journal is saved, or `None` to keep it in memory only."""
+
+    completed_ecosystems: set[str] = field(default_factory=set)
+    """The ecosystems whose new repos have already been written out."""
+
+    seen_repos: set[str] = field(default_factory=set)
+    """The lower-cased repo URLs already written out as `repadd` lines."""
+
+    queries: dict[str, QueryProgress] = field(default_factory=dict)
+    """The progress of every search query, keyed by the search query string."""
+
+    lock: threading.RLock = field(
+        default_factory=threading.RLock, repr=False, compare=False
+    )
+    """Held while the journal is updated or saved, since the searches and the
+    rest of the crawl run on different threads."""
+
+    @classmethod
+    def load(cls, filepath: str | None = None) -> "CrawlCheckpoint":
+        """Load the journal of a previous, unfinished crawl.
+
+        :param filepath: Where the journal is saved. Defaults to
+            `out/checkpoints/crawl.json` in the current working directory.
+        :type filepath: str | None
+        :return: The saved progress, or a fresh checkpoint if there is none.
+        :rtype: CrawlCheckpoint
+        """
+        checkpoint = cls() if filepath is None else cls(filepath=filepath)
+        assert checkpoint.filepath is not None
+        try:
+            with open(checkpoint.filepath, "r", encoding="utf-8") as f:
+                saved = json.load(f)
+        except FileNotFoundError:
+            logger.info("No crawl checkpoint found, starting from scratch")
+            return checkpoint
+
+        checkpoint.completed_ecosystems = set(saved["completed_ecosystems"])
+        checkpoint.seen_repos = set(saved["seen_repos"])
+        checkpoint.queries = {
+            key: QueryProgress(
+                query["next_page"],
+                query["done"],
+                set(query["repos"]),
+                query.get("total_count"),
+                query.get("shards"),
+                query.get("first_result"),
+                query.get("known_run", 0),
+            )
+            for key, query in saved["queries"].items()
+        }
+        logger.info(
+            "Resuming crawl: %d ecosystems and %d queries already done",
+            len(checkpoint.completed_ecosystems),
+            sum(query.done for query in checkpoint.queries.values()),
+        )
+        return checkpoint
+
+    def query(self, search: str) -> QueryProgress:
+        """Return the progress of a search query, starting it if it's new.
+
+        Identical searches in different ecosystems share their progress (and
+        results).
+
+        :param search: The search query string.
+        :type search: str
+        :return: The query's progress, which is updated in place.
+        :rtype: QueryProgress
+        """
+        with self.lock:
+            return self.queries.setdefault(search, QueryProgress())
+
+    def save(self) -> None:
+        """Write the journal to disk."""
+        if self.filepath is None:
+            return
+        with self.lock:
+            self._write(self.filepath)
+
+    def _write(self, filepath: str) -> None:
+        saved = {
+            "completed_ecosystems": sorted(self.completed_ecosystems),
+            "seen_repos": sorted(self.seen_repos),
+            "queries": {
+                key: {
+                    "next_page": query.next_page,
+                    "done": query.done,
+                    "repos": sorted(query.repos),
+                    "total_count": query.total_count,
+                    "shards": query.shards,
+                    "first_result": query.first_result,
+                    "known_run": query.known_run,
+                }
+                for key, query in self.queries.items()
+            },
+        }
+        with open(f"{filepath}.tmp", "w", encoding="utf-8") as f:
+            json.dump(saved, f, indent=2)
+        os.replace(f"{filepath}.tmp", filepath)
+
+    def clear(self) -> None:
+        """Remove the journal, once the crawl has finished."""
+        if self.filepath is not None and os.path.exists(self.filepath):
+            os.remove(self.filepath)
@@ -0,0 +1,348 @@
+"""
+Commit Store
+------------
+
+Remember the commits already fetched for every repo, so a daily contributor
+count only has to ask Github for the commits made since the previous run.
+
+The store is a small SQLite database under `out/`. For each repo it keeps the
+commits fetched over the past `COMMIT_RETENTION_DAYS`, along with a watermark:
+the time up to which that repo's commits have been fetched. Commits older than
+that are expired as time moves on.
+
+It also keeps the ecosystems each repo was last counted in, and the
+sub-ecosystems of each ecosystem. Together with indexes on the commits, that
+answers contributor questions for any window, ecosystem or sub-ecosystem (a
+28-day count, monthly actives, the overlap of two ecosystems) with a single
+query, rather than another round of requests to Github. Windows reaching back
+further than the first run only see the commits fetched since then.
+"""
+
+import datetime
+import logging
+import os
+import sqlite3
+from collections.abc import Iterable
+from typing import NamedTuple
+
+from crawler.constants import CONTRIBUTOR_WINDOW_DAYS
+
+logger = logging.getLogger(__name__)
+
+
+class CommitRecord(NamedTuple):
+    """A single (non-bot) commit, as far as contributor counting cares."""
+
+    sha: str
+    author: str
+    committed_at: datetime.datetime
+
+
+def _epoch(moment: datetime.datetime) -> int:
+    return int(moment.timestamp())
+
+
+def _moment(epoch: int) -> datetime.datetime:
+    return datetime.datetime.fromtimestamp(epoch, datetime.timezone.utc)
+
+
+def contributor_window(
+    days: int = CONTRIBUTOR_WINDOW_DAYS, now: datetime.datetime | None = None
+) -> tuple[datetime.datetime, datetime.datetime]:
+    """Work out the window in which a contributor counts as recent.
+
+    :param days: The length of the window, in days.
+    :type days: int
+    :param now: The end of the window. Defaults to the current time.
+    :type now: datetime.datetime | None
+    :return: The start and the end of the window.
+    :rtype: tuple[datetime.datetime, datetime.datetime]
+    """
+    if now is None:
+        now = datetime.datetime.now(datetime.timezone.utc)
+    return now - datetime.timedelta(days=days), now
+
+
+_SCOPE = """
+    WITH RECURSIVE scope(ecosystem) AS (
+        SELECT ?
+        UNION
+        SELECT child FROM sub_ecosystems
+        JOIN scope ON sub_ecosystems.parent = scope.ecosystem
+        WHERE ?
+    )
+"""
+"""The ecosystem asked about, and (if the second parameter is true) all of its
+sub-ecosystems."""
+
+_SCOPED_COMMITS = """
+    FROM scope
+    JOIN ecosystem_repos ON ecosystem_repos.ecosystem = scope.ecosystem
+    JOIN commits ON commits.repo = ecosystem_repos.repo
+    WHERE commits.committed_at BETWEEN ? AND ?
+"""
+"""The commits to the repos of the ecosystems in scope, within a window."""
+
+
+class CommitStore:
+    """The per-repo commits and watermarks from previous runs.
+
+    :param filepath: Where the SQLite database lives. Defaults to
+        `out/commits.sqlite` in the current working directory.
+    :type filepath: str | None
+    """
+
+    def __init__(self, filepath: str | None = None) -> None:
+        if filepath is None:
+            os.makedirs(f"{os.getcwd()}/out", exist_ok=True)
+            filepath = f"{os.getcwd()}/out/commits.sqlite"
+        self.filepath = filepath
+        self.connection = sqlite3.connect(filepath)
+        self.connection.executescript("""
+            CREATE TABLE IF NOT EXISTS commits (
+                repo TEXT NOT NULL,
+                sha TEXT NOT NULL,
+                author TEXT NOT NULL,
+                committed_at INTEGER NOT NULL,
+                PRIMARY KEY (repo, sha)
+            );
+            CREATE INDEX IF NOT EXISTS commits_by_repo_and_time
+                ON commits (repo, committed_at, author);
+            CREATE INDEX IF NOT EXISTS commits_by_time
+                ON commits (committed_at);
+            CREATE TABLE IF NOT EXISTS watermarks (
+                repo TEXT PRIMARY KEY,
+                fetched_until INTEGER NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS ecosystem_repos (
+                ecosystem TEXT NOT NULL,
+                repo TEXT NOT NULL,
+                PRIMARY KEY (ecosystem, repo)
+            ) WITHOUT ROWID;
+            CREATE TABLE IF NOT EXISTS sub_ecosystems (
+                parent TEXT NOT NULL,
+                child TEXT NOT NULL,
+                PRIMARY KEY (parent, child)
+            ) WITHOUT ROWID;
+            """)
+
+    def __enter__(self) -> "CommitStore":
+        return self
+
+    def __exit__(self, *_: object) -> None:
+        self.close()
+
+    def close(self) -> None:
+        """Commit any pending changes and close the database."""
+        self.connection.commit()
+        self.connection.close()
+
+    def watermark(self, repo: str) -> datetime.datetime | None:
+        """Return the time up to which the repo's commits have been fetched.
+
+        :param repo: The URL of the repository.
+        :type repo: str
+        :return: The watermark, or `None` if the repo was never fetched.
+        :rtype: datetime.datetime | None
+        """
+        row = self.connection.execute(
+            "SELECT fetched_until FROM watermarks WHERE repo = ?", (repo.lower(),)
+        ).fetchone()
+        return _moment(row[0]) if row else None
+
+    def fetch_since(
+        self,
+        repo: str,
+        window_start: datetime.datetime,
+        overlap: datetime.timedelta,
+    ) -> datetime.datetime:
+        """Work out where a repo's next fetch needs to start from.
+
+        The fetch overlaps the previous one a little, to catch commits that were
+        pushed after that fetch but carry an earlier commit date. Commits seen
+        twice are only stored once.
+
+        :param repo: The URL of the repository.
+        :type repo: str
+        :param window_start: The start of the contributor-counting window.
+        :type window_start: datetime.datetime
+        :param overlap: How far to re-fetch before the watermark.
+        :type overlap: datetime.timedelta
+        :return: The start of the window to fetch commits for.
+        :rtype: datetime.datetime
+        """
+        watermark = self.watermark(repo)
+        if watermark is None or watermark - overlap <= window_start:
+            return window_start
+        return watermark - overlap
+
+    def record(
+        self,
+        repo: str,
+        commits: Iterable[CommitRecord],
+        fetched_until: datetime.datetime,
+    ) -> None:
+        """Store a repo's newly fetched commits, and move its watermark on.
+
+        :param repo: The URL of the repository.
+        :type repo: str
+        :param commits: The commits fetched for the repo.
+        :type commits: Iterable[CommitRecord]
+        :param fetched_until: The end of the window the commits were fetched for.
+        :type fetched_until: datetime.datetime
+        """
+        key = repo.lower()
+        self.connection.executemany(
+            "INSERT OR IGNORE INTO commits VALUES (?, ?, ?, ?)",
+            (
+                (key, commit.sha, commit.author, _epoch(commit.committed_at))
+                for commit in commits
+            ),
+        )
+        self.connection.execute(
+            "INSERT OR REPLACE INTO watermarks VALUES (?, ?)",
+            (key, _epoch(fetched_until)),
+        )
+
+    def expire(self, before: datetime.datetime) -> None:
+        """Forget the commits that have fallen out of the retention period.
+
+        :param before: The start of the retention period.
+        :type before: datetime.datetime
+        """
+        deleted = self.connection.execute(
+            "DELETE FROM commits WHERE committed_at < ?", (_epoch(before),)
+        ).rowcount
+        logger.debug("Expired %d commits from the commit store", deleted)
+
+    def authors(
+        self, repo: str, since: datetime.datetime, until: datetime.datetime
+    ) -> set[str]:
+        """Return the unique authors of a repo's stored commits in a window.
+
+        :param repo: The URL of the repository.
+        :type repo: str
+        :param since: The start of the window.
+        :type since: datetime.datetime
+        :param until: The end of the window.
+        :type until: datetime.datetime
+        :return: A set of unique Github usernames
+        :rtype: set[str]
+        """
+        rows = self.connection.execute(
+            "SELECT DISTINCT author FROM commits "
+            "WHERE repo = ? AND committed_at BETWEEN ? AND ?",
+            (repo.lower(), _epoch(since), _epoch(until)),
+        )
+        return {author for (author,) in rows}
+
+    def record_taxonomy(
+        self, ecosystem_repos: dict[str, set[str]], children: dict[str, set[str]]
+    ) -> None:
+        """Replace the ecosystems the repos are counted in.
+
+        :param ecosystem_repos: The repos attributed to each ecosystem.
+        :type ecosystem_repos: dict[str, set[str]]
+        :param children: The direct sub-ecosystems of each ecosystem.
+        :type children: dict[str, set[str]]
+        """
+        with self.connection:
+            self.connection.execute("DELETE FROM ecosystem_repos")
+            self.connection.execute("DELETE FROM sub_ecosystems")
+            self.connection.executemany(
+                "INSERT OR IGNORE INTO ecosystem_repos VALUES (?, ?)",
+                (
+                    (eco, repo.lower())
+                    for eco, repos in ecosystem_repos.items()
+                    for repo in repos
+                ),
+            )
+            self.connection.executemany(
+                "INSERT OR IGNORE INTO sub_ecosystems VALUES (?, ?)",
+                (
+                    (parent, child)
+                    for parent, branches in children.items()
+                    for child in branches
+                ),
+            )
+
+    def contributors(
+        self,
+        ecosystem: str,
+        since: datetime.datetime,
+        until: datetime.datetime,
+        include_sub_ecosystems: bool = True,
+    ) -> set[str]:
+        """Return the unique authors of an ecosystem's stored commits in a window.
+
+        :param ecosystem: The name of the ecosystem.
+        :type ecosystem: str
+        :param since: The start of the window.
+        :type since: datetime.datetime
+        :param until: The end of the window.
+        :type until: datetime.datetime
+        :param include_sub_ecosystems: Whether to count the commits to the repos
+            of the ecosystem's sub-ecosystems too.
+        :type include_sub_ecosystems: bool
+        :return: A set of unique Github usernames
+        :rtype: set[str]
+        """
+        rows = self.connection.execute(
+            f"{_SCOPE} SELECT DISTINCT commits.author {_SCOPED_COMMITS}",
+            (ecosystem, include_sub_ecosystems, _epoch(since), _epoch(until)),
+        )
+        return {author for (author,) in rows}
+
+    def overlap(
+        self,
+        first: str,
+        second: str,
+        since: datetime.datetime,
+        until: datetime.datetime,
+    ) -> set[str]:
+        """Return the authors who contributed to both ecosystems in a window.
+
+        :param first: The name of one ecosystem, including its sub-ecosystems.
+        :type first: str
+        :param second: The name of the other one, including its sub-ecosystems.
+        :type second: str
+        :param since: The start of the window.
+        :type since: datetime.datetime
+        :param until: The end of the window.
+        :type until: datetime.datetime
+        :return: A set of unique Github usernames
+        :rtype: set[str]
+        """
+        return self.contributors(first, since, until) & self.contributors(
+            second, since, until
+        )
+
+    def monthly_active(
+        self,
+        ecosystem: str,
+        since: datetime.datetime,
+        until: datetime.datetime,
+        include_sub_ecosystems: bool = True,
+    ) -> dict[str, int]:
+        """Count an ecosystem's unique authors in each calendar month (UTC).
+
+        :param ecosystem: The name of the ecosystem.
+        :type ecosystem: str
+        :param since: The start of the first month's window.
+        :type since: datetime.datetime
+        :param until: The end of the last month's window.
+        :type until: datetime.datetime
+        :param include_sub_ecosystems: Whether to count the commits to the repos
+            of the ecosystem's sub-ecosystems too.
+        :type include_sub_ecosystems: bool
+        :return: The number of unique authors, keyed by month (`YYYY-MM`).
+        :rtype: dict[str, int]
+        """
+        rows = self.connection.execute(
+            f"{_SCOPE} SELECT"
+            " strftime('%Y-%m', commits.committed_at, 'unixepoch') AS month,"
+            f" COUNT(DISTINCT commits.author) {_SCOPED_COMMITS}"
+            " GROUP BY month ORDER BY month",
+            (ecosystem, include_sub_ecosystems, _epoch(since), _epoch(until)),
+        )
+        return dict(rows.fetchall())
@@ -20,9 +20,83 @@ load_dotenv()
 GITHUB_TOKEN: str | None = os.getenv("GITHUB_TOKEN")
 """The Personal Access Token used to authenticate with Github APIs."""
 
+GITHUB_TOKENS: list[str] = [
+    token.strip()
+    for token in os.getenv("GITHUB_TOKENS", GITHUB_TOKEN or "").split(",")
+    if token.strip()
+]
+"""The tokens a sharded contributor count hands out to its shards, one each
+(comma-separated). Defaults to `GITHUB_TOKEN` alone."""
+
+CONTRIBUTOR_SHARDS: int = int(os.getenv("CONTRIBUTOR_SHARDS", "0"))
+"""The number of shards (and worker processes) contributor counts are split
+into by default. `0` counts every repo in this process, with `GITHUB_TOKEN`."""
+
+GITHUB_API_URL: str = os.getenv("GITHUB_API_URL", "https://api.github.com")
+"""The base URL of the Github API, e.g. for a Github Enterprise Server."""
+
 BASE_REPO_PATH: str | None = os.getenv("BASE_REPO_PATH")
 """The local, absolute path to the EC repository."""
 
+TAXONOMY_SOURCE: str = os.getenv("TAXONOMY_SOURCE", "replay")
+"""How the taxonomy is read: `replay`, to apply the new migrations in-process on
+top of the state from the last run (exporting with `run.sh` only if they can't
+be), or `export`, to always export it with `run.sh`."""
+
+CONTRIBUTOR_WORKERS: int = int(os.getenv("CONTRIBUTOR_WORKERS", "8"))
+"""The number of contributor-counting requests run concurrently."""
+
+PIPELINE_QUEUE_SIZE: int = int(os.getenv("PIPELINE_QUEUE_SIZE", "8"))
+"""The most items waiting between any two stages of a crawl or count pipeline."""
+
+CONTRIBUTOR_BACKEND: str = os.getenv("CONTRIBUTOR_BACKEND", "graphql")
+"""Which Github API to count contributors with: `graphql` or `rest`."""
+
+GRAPHQL_BATCH_SIZE: int = int(os.getenv("GRAPHQL_BATCH_SIZE", "50"))
+"""The number of repos asked about in each GraphQL contributor query."""
+
+REPO_INDEX_TTL_DAYS: int = int(os.getenv("REPO_INDEX_TTL_DAYS", "30"))
+"""The number of days the repo index trusts what a URL led to, before looking
+it up again (in case the repo has since been renamed, moved or deleted)."""
+
+HTTP_CACHE_MAX_MB: int = int(os.getenv("HTTP_CACHE_MAX_MB", "256"))
+"""The size bound of the on-disk Github response cache. `0` disables it."""
+
+CONTRIBUTOR_WINDOW_DAYS: int = int(os.getenv("CONTRIBUTOR_WINDOW_DAYS", "28"))
+"""The number of days, counting back from now, a contributor counts as recent."""
+
+COMMIT_RETENTION_DAYS: int = int(os.getenv("COMMIT_RETENTION_DAYS", "400"))
+"""The number of days fetched commits are kept in the commit store, so longer
+windows (e.g. monthly actives over the past year) can be queried from it."""
+
+COMMIT_WATERMARK_OVERLAP_HOURS: int = 24
+"""How far before a repo's watermark an incremental fetch starts, to catch
+commits pushed after the previous run but dated before it."""
+
+ACTIVITY_LISTING_MIN_REPOS: int = 3
+"""The number of tracked repos an owner needs before their repos are checked for
+recent activity with a single listing, rather than one by one."""
+
+ACTIVITY_LISTING_MAX_PAGES: int = 5
+"""The number of pages of an owner's repos to list, before giving up and
+checking the rest of their tracked repos one by one."""
+
+SEARCH_FULL_SWEEP_DAYS: int = int(os.getenv("SEARCH_FULL_SWEEP_DAYS", "30"))
+"""The number of days a code search is run incrementally, stopping at the
+results it already knows, before it's run in full again."""
+
+SEARCH_KNOWN_RUN: int = int(os.getenv("SEARCH_KNOWN_RUN", "100"))
+"""The number of results in a row an incremental code search goes through only
+finding repos it already knows, before it stops paging."""
+
+MANIFEST_WORKERS: int = int(os.getenv("MANIFEST_WORKERS", "8"))
+"""The number of code search hits' manifests fetched concurrently, to check
+that they really depend on what was searched for."""
+
+PROMETHEUS_TEXTFILE: str | None = os.getenv("PROMETHEUS_TEXTFILE")
+"""Where to also write each run's metrics, in the Prometheus text format (e.g.
+for node_exporter's textfile collector). Unset, only the JSON report is written."""
+
 BASE_ECOSYSTEM: str = "Stellar"
 """The crypto ecosystem which will be processed as the parent."""
 
@@ -0,0 +1,329 @@
+"""
+Contributor Shards
+------------------
+
+A single token caps a contributor count at Github's 5000 core requests per
+hour, which the whole Stellar ecosystem needs more than. A sharded count splits
+the tracked repos across `N` shards, each fetching its own repos with its own
+token (see `GITHUB_TOKENS`), then merges their contributor sets.
+
+Repos are assigned to shards by consistent hashing. Each shard keeps its own
+commit store (`out/shards/commits-<shard>.sqlite`), so its watermarks carry
+over from run to run. Changing the number of shards only moves about `1/N` of
+the repos between them, so most of those watermarks stay useful.
+
+Shards can run as worker processes on one machine (`count_contrib --shards N`),
+or one at a time on separate machines (`count_contrib --shards N --shard I`).
+Either way, each shard writes its partial counts to
+`out/dumps/contribs/shard-<I>-of-<N>/`, and `merge_contrib --shards N` combines
+them into the usual `out/dumps/contribs/` dumps once every shard is in.
+"""
+
+import bisect
+import datetime
+import hashlib
+import json
+import logging
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any
+
+from crawler.commit_store import contributor_window
+from crawler.constants import GITHUB_TOKENS
+from crawler.counter import get_ecosystem_repos
+from crawler.instrumentation import metrics, stage
+from crawler.search_github import get_contributors_by_repo, use_token
+
+logger = logging.getLogger(__name__)
+
+RING_REPLICAS = 128
+"""The number of points each shard gets on the hash ring. More points spread
+the repos more evenly."""
+
+MANIFEST_FILENAME = "shard.json"
+"""The file a shard writes last, next to its partial counts, to mark them done."""
+
+
+def _ring_hash(key: str) -> int:
+    return int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest())
+
+
+# pylint: disable-next=too-few-public-methods
+class HashRing:
+    """Assign repos to shards by consistent hashing.
+
+    Every shard is hashed onto a ring at `RING_REPLICAS` points, and each repo
+    belongs to the shard at the first point after its own hash. The points
+    depend on nothing but the shard's number, so every machine assigns the
+    repos the same way, and adding a shard only takes repos from the others.
+
+    :param shards: The number of shards.
+    :type shards: int
+    """
+
+    def __init__(self, shards: int) -> None:
+        if shards < 1:
+            raise ValueError(f"A count needs at least one shard, not {shards}")
+        points = sorted(
+            (_ring_hash(f"shard-{shard}/{replica}"), shard)
+            for shard in range(shards)
+            for replica in range(RING_REPLICAS)
+        )
+        self.shards = shards
+        self._hashes = [point for point, _ in points]
+        self._owners = [shard for _, shard in points]
+
+    def shard_of(self, repo: str) -> int:
+        """Find the shard a repo belongs to.
+
+        :param repo: The URL of the repository.
+        :type repo: str
+        :return: The shard's number, from `0` to `shards - 1`.
+        :rtype: int
+        """
+        point = bisect.bisect(self._hashes, _ring_hash(repo.lower()))
+        return self._owners[point % len(self._owners)]
+
+
+def token_for(shard: int) -> str | None:
+    """Pick the token a shard authenticates with, from `GITHUB_TOKENS`.
+
+    :param shard: The shard's number.
+    :type shard: int
+    :return: The shard's token, or `None` if there are no tokens at all.
+    :rtype: str | None
+    """
+    if not GITHUB_TOKENS:
+        return None
+    return GITHUB_TOKENS[shard % len(GITHUB_TOKENS)]
+
+
+def shard_dirpath(shard: int, shards: int) -> str:
+    """Return the directory a shard's partial counts are written to.
+
+    :param shard: The shard's number.
+    :type shard: int
+    :param shards: The number of shards.
+    :type shards: int
+    :return: The absolute path of the shard's directory.
+    :rtype: str
+    """
+    return f"{os.getcwd()}/out/dumps/contribs/shard-{shard}-of-{shards}"
+
+
+def count_shard(
+    ecosystem_sets: dict[str, set[str]], shard: int, shards: int
+) -> dict[str, set[str]]:
+    """Count the contributors to one shard's repos, and write them out.
+
+    :param ecosystem_sets: The repos attributed to each ecosystem, as returned
+        by `get_ecosystem_repos`. Only the shard's own repos are fetched.
+    :type ecosystem_sets: dict[str, set[str]]
+    :param shard: The shard's number.
+    :type shard: int
+    :param shards: The number of shards.
+    :type shards: int
+    :return: The contributors to the shard's repos in each ecosystem.
+    :rtype: dict[str, set[str]]
+    """
+    ring = HashRing(shards)
+    repos = {
+        repo.lower(): repo
+        for eco_repos in ecosystem_sets.values()
+        for repo in eco_repos
+        if ring.shard_of(repo) == shard
+    }
+    logger.info(
+        "Counting contributors to %d repos in shard %d of %d",
+        len(repos),
+        shard,
+        shards,
+    )
+
+    # until this run of the shard is done, it can't be merged
+    out_dirpath = shard_dirpath(shard, shards)
+    os.makedirs(out_dirpath, exist_ok=True)
+    Path(f"{out_dirpath}/{MANIFEST_FILENAME}").unlink(missing_ok=True)
+
+    os.makedirs(f"{os.getcwd()}/out/shards", exist_ok=True)
+    with stage("count shard") as counted:
+        counted.items = len(repos)
+        by_repo = get_contributors_by_repo(
+            set(repos.values()),
+            store_filepath=f"{os.getcwd()}/out/shards/commits-{shard}.sqlite",
+        )
+    by_lower = {repo.lower(): contributors for repo, contributors in by_repo.items()}
+
+    contributor_sets = {
+        eco: set().union(
+            *(by_lower[repo.lower()] for repo in eco_repos if repo.lower() in repos)
+        )
+        for eco, eco_repos in ecosystem_sets.items()
+    }
+    _write_shard(contributor_sets, shard, shards, len(repos))
+    return contributor_sets
+
+
+def _write_shard(
+    contributor_sets: dict[str, set[str]], shard: int, shards: int, repos: int
+) -> None:
+    out_dirpath = shard_dirpath(shard, shards)
+    for eco, contributors in contributor_sets.items():
+        with open(f"{out_dirpath}/{eco}.txt", "w", encoding="utf-8") as f:
+            f.writelines(f"{contrib}\n" for contrib in sorted(contributors))
+    since, until = contributor_window()
+    manifest = {
+        "shard": shard,
+        "shards": shards,
+        "repos": repos,
+        "ecosystems": sorted(contributor_sets),
+        "since": since.isoformat(),
+        "until": until.isoformat(),
+    }
+    with open(f"{out_dirpath}/{MANIFEST_FILENAME}", "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+
+
+@dataclass
+class ShardJob:
+    """One shard of a count, as handed to its worker process."""
+
+    shard: int
+    shards: int
+    token: str | None
+    ecosystem_sets: dict[str, set[str]]
+
+
+def _init_worker() -> None:
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s - %(processName)s - %(name)s - %(levelname)s - %(message)s",
+    )
+
+
+def _run_shard_job(job: ShardJob) -> dict[str, dict[str, Any]]:
+    use_token(job.token)
+    count_shard(job.ecosystem_sets, job.shard, job.shards)
+    return metrics.snapshot()
+
+
+def merge_contributor_shards(parent_ecosystem: str, shards: int) -> dict[str, set[str]]:
+    """Combine every shard's partial counts into the contributor dumps.
+
+    :param parent_ecosystem: The name of the counted ecosystem.
+    :type parent_ecosystem: str
+    :param shards: The number of shards the count was split into.
+    :type shards: int
+    :raises RuntimeError: If any of the shards hasn't finished.
+    :return: The contributors in each ecosystem.
+    :rtype: dict[str, set[str]]
+    """
+    manifests: list[dict[str, Any]] = []
+    missing: list[int] = []
+    for shard in range(shards):
+        try:
+            with open(
+                f"{shard_dirpath(shard, shards)}/{MANIFEST_FILENAME}",
+                "r",
+                encoding="utf-8",
+            ) as f:
+                manifests.append(json.load(f))
+        except FileNotFoundError:
+            missing.append(shard)
+    if missing:
+        raise RuntimeError(
+            f"Shards {missing} of {shards} haven't finished (no "
+            f"`{MANIFEST_FILENAME}` under `out/dumps/contribs/shard-*-of-{shards}/`)."
+        )
+
+    untils = [datetime.datetime.fromisoformat(m["until"]) for m in manifests]
+    if max(untils) - min(untils) > datetime.timedelta(days=1):
+        logger.warning(
+            "The shards were counted over windows ending up to %s apart",
+            max(untils) - min(untils),
+        )
+
+    contributor_sets: dict[str, set[str]] = {parent_ecosystem: set()}
+    for manifest in manifests:
+        dirpath = shard_dirpath(manifest["shard"], shards)
+        for eco in manifest["ecosystems"]:
+            with open(f"{dirpath}/{eco}.txt", "r", encoding="utf-8") as f:
+                contributor_sets.setdefault(eco, set()).update(
+                    line.strip() for line in f if line.strip()
+                )
+
+    out_dirpath = f"{os.getcwd()}/out/dumps/contribs"
+    all_contributors: set[str] = set()
+    for eco, contributors in contributor_sets.items():
+        all_contributors.update(contributors)
+        logger.info(
+            "Found %d recent contributors in the %s ecosystem", len(contributors), eco
+        )
+        with open(f"{out_dirpath}/{eco}.txt", "w", encoding="utf-8") as f:
+            f.writelines(f"{contrib}\n" for contrib in contributors)
+
+    logger.info(
+        "Found %d recent contributors across the entire %s parent ecosystem, "
+        "merged from %d shards.",
+        len(all_contributors),
+        parent_ecosystem,
+        shards,
+    )
+    return contributor_sets
+
+
+def count_contributor_shards(
+    parent_ecosystem: str, shards: int, only_shard: int | None = None
+) -> dict[str, set[str]] | None:
+    """Count the contributors to the parent ecosystem's repos in shards.
+
+    :param parent_ecosystem: The name of the ecosystem to count.
+    :type parent_ecosystem: str
+    :param shards: The number of shards to split the repos into.
+    :type shards: int
+    :param only_shard: Count just this one shard, in this process (for spreading
+        the shards over separate machines). Otherwise, every shard is counted
+        in a worker process of its own, and their counts are merged.
+    :type only_shard: int | None
+    :return: The contributors in each ecosystem, or `None` if only one shard was
+        counted (and there's nothing to merge yet).
+    :rtype: dict[str, set[str]] | None
+    """
+    ecosystem_sets = get_ecosystem_repos(parent_ecosystem)
+
+    if only_shard is not None:
+        if not 0 <= only_shard < shards:
+            raise ValueError(f"There's no shard {only_shard} of {shards}")
+        use_token(token_for(only_shard))
+        count_shard(ecosystem_sets, only_shard, shards)
+        logger.info(
+            "Shard %d of %d done. Run `merge_contrib --shards %d` once all are in.",
+            only_shard,
+            shards,
+            shards,
+        )
+        return None
+
+    if len(GITHUB_TOKENS) < shards:
+        logger.warning(
+            "%d shards share %d tokens, and their rate limits with them",
+            shards,
+            len(GITHUB_TOKENS),
+        )
+    jobs = [
+        ShardJob(shard, shards, token_for(shard), ecosystem_sets)
+        for shard in range(shards)
+    ]
+    # spawned, not forked: the parent holds open databases and threads
+    with ProcessPoolExecutor(
+        max_workers=shards,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=_init_worker,
+    ) as executor:
+        for snapshot in executor.map(_run_shard_job, jobs):
+            metrics.merge(snapshot)
+
+    return merge_contributor_shards(parent_ecosystem, shards)
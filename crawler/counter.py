@@ -6,59 +6,62 @@ Take a stab at actually counting the repos/contributors in the ecosystem.
 """
 
 import logging
-from os import getcwd
+from collections.abc import Iterator
+from os import getcwd, makedirs
 
+from crawler.commit_store import CommitStore, contributor_window
 from crawler.ecosystem import (
-    find_sub_ecosystems,
+    EcosystemTree,
+    attribute_repos,
+    load_ecosystem_tree,
     parse_eco_filename,
-    run_export_ecosystem,
 )
-from crawler.search_github import get_contributors
+from crawler.instrumentation import stage
+from crawler.pipeline import Stage, run_pipeline
+from crawler.search_github import get_contributors_by_repo, resolve_repo_ids
 
 logger = logging.getLogger(__name__)
 
 
-def get_ecosystem_repos(ecosystem_name: str) -> dict[str, set[str]]:
-    """Retrieve the tracked repos in the given ecosystem.
+def get_ecosystem_repos(
+    ecosystem_name: str, tree: EcosystemTree | None = None
+) -> dict[str, set[str]]:
+    """Retrieve the tracked repos in the given ecosystem and its sub-ecosystems.
+
+    Each repo is attributed to the most specific ecosystems tracking it (see
+    `attribute_repos`), and each ecosystem's repos are written out once. Repos
+    are told apart by their Github IDs (see `repo_index.py`), and go by their
+    current URLs.
 
     :param ecosystem_name: The name of the ecosystem, as written in the EC
         taxonomy DSL mutations.
     :type ecosystem_name: str
+    :param tree: The indexed taxonomy. Callers may omit this; it is exported
+        automatically.
+    :type tree: EcosystemTree | None
+    :return: The repos attributed to the ecosystem, and to each of its
+        sub-ecosystems.
+    :rtype: dict[str, set[str]]
     """
-    ecosystem_sets: dict[str, set[str]] = {ecosystem_name: set()}
-    ecosystem = parse_eco_filename(ecosystem_name)
-
-    repos_list = run_export_ecosystem(ecosystem_name)
-
-    # 1. recurse into the subecosystems
-    sub_ecos = find_sub_ecosystems(repos_list)
-    if len(sub_ecos) > 0:
-        for sub_eco in sub_ecos:
-            sub_repos = get_ecosystem_repos(sub_eco)
-            ecosystem_sets[sub_eco] = sub_repos[sub_eco]
-
-    logger.debug("Retrieving repositories in ecosystem: %s", ecosystem)
-    existing_repos: set[str] = set()
-    for repos in ecosystem_sets.values():
-        existing_repos.update(repos)
-    existing_repos_lower = {repo.lower() for repo in existing_repos}
-    ecosystem_sets[ecosystem_name].update(
-        r["repo_url"]
-        for r in repos_list
-        if r["repo_url"].lower() not in existing_repos_lower
-    )
-
-    # 2. log the findings
-    logger.info(
-        "Tracking %d repositories in the %s ecosystem.",
-        len(ecosystem_sets[ecosystem_name]),
-        ecosystem_name,
-    )
-
-    # 3. store the findings
-    out_filepath: str = f"{getcwd()}/out/dumps/repos/{ecosystem}.txt"
-    with open(out_filepath, "w", encoding="utf-8") as f:
-        f.writelines(f"{repo}\n" for repo in ecosystem_sets[ecosystem_name])
+    if tree is None:
+        tree = load_ecosystem_tree(ecosystem_name)
+
+    logger.debug("Retrieving repositories in ecosystem: %s", ecosystem_name)
+    repo_ids = resolve_repo_ids(tree.repo_urls(ecosystem_name))
+    with stage("attribute repos") as attributed:
+        ecosystem_sets = attribute_repos(tree, ecosystem_name, repo_ids)
+        attributed.items = len(tree.repos[ecosystem_name])
+
+    out_dirpath = f"{getcwd()}/out/dumps/repos"
+    makedirs(out_dirpath, exist_ok=True)
+    for eco, repos in ecosystem_sets.items():
+        # 1. log the findings
+        logger.info("Tracking %d repositories in the %s ecosystem.", len(repos), eco)
+
+        # 2. store the findings
+        out_filepath: str = f"{out_dirpath}/{parse_eco_filename(eco)}.txt"
+        with open(out_filepath, "w", encoding="utf-8") as f:
+            f.writelines(f"{repo}\n" for repo in repos)
 
     # 3. return the sets, so it can be combined/grand-totalled
     return ecosystem_sets
@@ -83,15 +86,48 @@ def count_all_repos(parent_ecosystem: str) -> None:
 
 
 def get_ecosystem_contributors(ecosystem_name: str) -> dict[str, set[str]]:
-    """Count all contributors to the tracked repos from the previous 30 days."""
+    """Count all contributors to the tracked repos from the previous
+    `CONTRIBUTOR_WINDOW_DAYS` days.
 
-    contributor_sets: dict[str, set[str]] = {ecosystem_name: set()}
+    The ecosystems are counted in a pipeline: each ecosystem's contributors are
+    fetched as soon as its repos are known, and written out while the next one
+    is being fetched. Ecosystems are fetched one at a time, since each already
+    runs `CONTRIBUTOR_WORKERS` requests at once against the same commit store.
+    A repo attributed to more than one ecosystem is only fetched once.
 
-    ecosystem_repos_sets = get_ecosystem_repos(ecosystem_name)
+    The ecosystems the repos are attributed to are recorded in the commit store
+    too, and each ecosystem's count is a query against it.
+    """
+
+    contributor_sets: dict[str, set[str]] = {ecosystem_name: set()}
+    fetched: set[str] = set()
 
-    for eco, repos in ecosystem_repos_sets.items():
+    def fetch(item: tuple[str, set[str]]) -> list[tuple[str, set[str]]]:
+        eco, repos = item
         logger.info("Counting contributors for ecosystem: %s", eco)
-        contributors = get_contributors(repos)
+        with stage("count contributors") as counted:
+            counted.items = len(repos)
+            missing = {repo for repo in repos if repo.lower() not in fetched}
+            if missing:
+                get_contributors_by_repo(missing)
+                fetched.update(repo.lower() for repo in missing)
+            since, until = contributor_window()
+            with CommitStore() as store:
+                contributors = store.contributors(
+                    eco, since, until, include_sub_ecosystems=False
+                )
+        return [(eco, contributors)]
+
+    def walk() -> Iterator[tuple[str, set[str]]]:
+        # runs on the pipeline's own thread, export and all
+        tree = load_ecosystem_tree(ecosystem_name)
+        ecosystem_sets = get_ecosystem_repos(ecosystem_name, tree)
+        with CommitStore() as store:
+            store.record_taxonomy(ecosystem_sets, tree.children)
+        yield from ecosystem_sets.items()
+
+    counted = run_pipeline(walk(), [Stage("contributors", fetch)])
+    for eco, contributors in counted:
         contributor_sets[eco] = contributors
         logger.info(
             "Found %d recent contributors in the %s ecosystem", len(contributors), eco
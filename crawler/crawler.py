@@ -7,7 +7,7 @@ The entry point of the package! Here, we grab the Github token, defined the base
 is ready to go.
 
 Then, user will be presented with a 'hey, don't forget to make a new branch'
-kind-of message. After confirming, the `process_ecosystem()` function is called,
+kind-of message. After confirming, the `crawl_ecosystem()` function is called,
 with our base ecosystem's name as an argument.
 
 This is also where we have some of our most important constants defined. Most
@@ -17,15 +17,25 @@ Define search queries in these ecosystems using filename (or path) and the
 keyword to search for.
 """
 
+import argparse
 import logging
 
+from crawler.checkpoint import CrawlCheckpoint
+from crawler.commit_store import CommitStore, contributor_window
 from crawler.constants import (
     BASE_ECOSYSTEM,
     CHOOSE_WHAT_TO_DO_MESSAGE,
+    CONTRIBUTOR_SHARDS,
+    CONTRIBUTOR_WINDOW_DAYS,
     DISCLAIMER_MESSAGE,
 )
+from crawler.contrib_shards import count_contributor_shards, merge_contributor_shards
 from crawler.counter import count_all_contributors, count_all_repos
-from crawler.ecosystem import process_ecosystem
+from crawler.ecosystem import crawl_ecosystem
+from crawler.ratelimit import log_rate_limit_waits
+from crawler.run_report import reporting
+from crawler.search_github import report_search_plan
+from crawler.search_history import SearchHistory
 
 # Configure logging
 logger = logging.getLogger(__name__)
@@ -42,23 +52,153 @@ logging.basicConfig(
 def count_repos():
     """Count all repositories within the entire parent ecosystem."""
     logger.info("Counting repositories")
-    count_all_repos(BASE_ECOSYSTEM)
+    with reporting("count_repos"):
+        count_all_repos(BASE_ECOSYSTEM)
 
 
 def count_contributors():
-    """Count all contributors within the entire parent ecosystem."""
+    """Count all contributors within the entire parent ecosystem.
+
+    Pass `--shards N` to split the count across `N` worker processes, each with
+    its own token from `GITHUB_TOKENS`. Add `--shard I` to count only shard `I`
+    here, and merge the shards with `merge_contrib` once they're all in.
+    """
+    parser = argparse.ArgumentParser(description="Count recent contributors.")
+    parser.add_argument(
+        "--shards",
+        type=int,
+        default=CONTRIBUTOR_SHARDS,
+        help="split the count into this many shards (default: %(default)s, none)",
+    )
+    parser.add_argument(
+        "--shard",
+        type=int,
+        help="count only this shard (from 0), e.g. on one of several machines",
+    )
+    args, _ = parser.parse_known_args()
+
     logger.info("Counting contributors")
-    count_all_contributors(BASE_ECOSYSTEM)
+    with reporting("count_contrib"):
+        if args.shards > 0:
+            count_contributor_shards(BASE_ECOSYSTEM, args.shards, args.shard)
+        else:
+            count_all_contributors(BASE_ECOSYSTEM)
+
+
+def merge_contributors():
+    """Merge the partial counts of a sharded contributor count, once every shard
+    has finished (on this machine, or copied over from others).
+    """
+    parser = argparse.ArgumentParser(
+        description="Merge the shards of a contributor count."
+    )
+    parser.add_argument(
+        "--shards",
+        type=int,
+        default=CONTRIBUTOR_SHARDS,
+        help="the number of shards the count was split into (default: %(default)s)",
+    )
+    args, _ = parser.parse_known_args()
+
+    with reporting("merge_contrib"):
+        merge_contributor_shards(BASE_ECOSYSTEM, args.shards)
+
+
+def query_contributors():
+    """Answer contributor questions from the commit store, without any requests
+    to Github. The store is filled by `count_contrib`.
+    """
+    parser = argparse.ArgumentParser(
+        description="Query contributor counts from the commit store."
+    )
+    parser.add_argument(
+        "--ecosystem",
+        default=BASE_ECOSYSTEM,
+        help="the ecosystem to count (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--days",
+        type=int,
+        default=CONTRIBUTOR_WINDOW_DAYS,
+        help="the length of the window, counting back from now (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--direct",
+        action="store_true",
+        help="leave out the repos of the ecosystem's sub-ecosystems",
+    )
+    parser.add_argument(
+        "--overlap",
+        metavar="ECOSYSTEM",
+        help="count the contributors shared with another ecosystem instead",
+    )
+    parser.add_argument(
+        "--monthly",
+        action="store_true",
+        help="count the unique contributors in each calendar month of the window",
+    )
+    args, _ = parser.parse_known_args()
+
+    since, until = contributor_window(args.days)
+    with CommitStore() as store:
+        if args.overlap:
+            shared = store.overlap(args.ecosystem, args.overlap, since, until)
+            logger.info(
+                "%d contributors to both %s and %s in the last %d days",
+                len(shared),
+                args.ecosystem,
+                args.overlap,
+                args.days,
+            )
+        elif args.monthly:
+            for month, count in store.monthly_active(
+                args.ecosystem, since, until, not args.direct
+            ).items():
+                logger.info("%s: %d contributors in %s", month, count, args.ecosystem)
+        else:
+            contributors = store.contributors(
+                args.ecosystem, since, until, not args.direct
+            )
+            logger.info(
+                "%d contributors in %s in the last %d days",
+                len(contributors),
+                args.ecosystem,
+                args.days,
+            )
 
 
 def crawl():
-    """Start the process by processing the base ecosystem."""
+    """Start the process by processing the base ecosystem.
+
+    Pass `--resume` to pick up an interrupted crawl where it stopped, and
+    `--full-sweep` to run every code search in full, rather than only for the
+    results that are new since the last crawl.
+    """
+    parser = argparse.ArgumentParser(description="Crawl Github code search.")
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="continue the last crawl from its checkpoint, instead of starting over",
+    )
+    parser.add_argument(
+        "--full-sweep",
+        action="store_true",
+        help="run every code search in full, even if it was swept recently",
+    )
+    args, _ = parser.parse_known_args()
+
     print(DISCLAIMER_MESSAGE)
     answer = input("Is your locally cloned repo ready? ")
 
     if answer.lower() == "yes" or answer.lower() == "y":
         logger.info("Crawl function started.")
-        process_ecosystem(BASE_ECOSYSTEM)
+        checkpoint = CrawlCheckpoint.load() if args.resume else CrawlCheckpoint()
+        history = SearchHistory.load(full_sweep=args.full_sweep)
+        with reporting("crawl"):
+            report_search_plan(checkpoint)
+            crawl_ecosystem(BASE_ECOSYSTEM, checkpoint, history)
+            checkpoint.clear()
+        log_rate_limit_waits()
 
     elif answer.lower() == "no" or answer.lower() == "n":
         print("That's fine. Run the script again once you're ready.")
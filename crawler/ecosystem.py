@@ -6,27 +6,80 @@ The main workhorse of the package! This module is responsible for managing the
 process of the crawl.
 """
 
-import json
 import logging
 import os
 import shlex
 import subprocess
+from collections.abc import Iterable, Iterator
+from dataclasses import dataclass, field
 from datetime import datetime
-from typing import TypedDict
 
-from crawler.constants import BASE_ECOSYSTEM, BASE_REPO_PATH
-from crawler.search_github import search_gh_repos
+from crawler.cache import load_cached, migrations_fingerprint, store_cached
+from crawler.checkpoint import CrawlCheckpoint
+from crawler.constants import BASE_ECOSYSTEM, BASE_REPO_PATH, TAXONOMY_SOURCE
+from crawler.export_reader import RepoRecord, read_export
+from crawler.instrumentation import stage
+from crawler.migrations import MigrationError, replay_migrations
+from crawler.pipeline import Results, Stage, run_pipeline
+from crawler.repo_index import RepoIdentity, canonical_url, identity_key
+from crawler.search_github import resolve_repo_ids, search_gh_repos, search_plan
+from crawler.search_history import SearchHistory
 
 logger = logging.getLogger(__name__)
 
+TREE_CACHE_VERSION = 2
+"""Bumped whenever the shape of `EcosystemTree` changes, so that trees cached
+by an older version aren't loaded."""
 
-class RepoJson(TypedDict):
-    """A dictionary representing each repo in the EC taxonomy."""
 
-    eco_name: str
-    branch: list[str]
-    repo_url: str
-    tags: list[str]
+@dataclass
+class EcosystemTree:
+    """An indexed, in-memory view of a single exported taxonomy.
+
+    Built from one export of the parent ecosystem, it can answer for any
+    ecosystem in that taxonomy the same questions a separate `run.sh export -e`
+    of that ecosystem would, without another subprocess.
+    """
+
+    name: str
+    """The name of the (parent) ecosystem that was exported."""
+
+    children: dict[str, set[str]] = field(default_factory=dict)
+    """The direct sub-ecosystems of each ecosystem."""
+
+    repos: dict[str, list[str]] = field(default_factory=dict)
+    """The unique repo URLs in each ecosystem (including its sub-ecosystems), in
+    export order."""
+
+    lower_repos: dict[str, set[str]] = field(default_factory=dict)
+    """The same repo URLs, lower-cased, for case-insensitive comparisons."""
+
+    direct: dict[str, dict[str, str]] = field(default_factory=dict)
+    """The repos tracked directly in each ecosystem (at the end of their
+    `branch`), as their URLs keyed by lower-cased URL."""
+
+    def repo_urls(self, ecosystem_name: str) -> list[str]:
+        """Return the repo URLs an export of the given ecosystem would contain.
+
+        :param ecosystem_name: The name of the ecosystem, as written in the EC
+            taxonomy DSL mutations.
+        :type ecosystem_name: str
+        :return: The unique repo URLs in the ecosystem's slice of the taxonomy.
+        :rtype: list[str]
+        """
+        return self.repos.get(ecosystem_name, [])
+
+    def lower_repo_urls(self, ecosystem_name: str) -> set[str]:
+        """Return the lower-cased repo URLs in the given ecosystem.
+
+        :param ecosystem_name: The name of the ecosystem, as written in the EC
+            taxonomy DSL mutations.
+        :type ecosystem_name: str
+        :return: The lower-cased repo URLs in the ecosystem's slice of the
+            taxonomy.
+        :rtype: set[str]
+        """
+        return self.lower_repos.get(ecosystem_name, set())
 
 
 def parse_eco_filename(ecosystem_name: str) -> str:
@@ -41,14 +94,14 @@ def parse_eco_filename(ecosystem_name: str) -> str:
     return "-".join(ecosystem_name.split()).lower().replace("(", "").replace(")", "")
 
 
-def run_export_ecosystem(ecosystem_name: str) -> list[RepoJson]:
-    """Export the jsonl file for the ecosystem and return it as a list
+def run_export_ecosystem(ecosystem_name: str) -> Iterator[RepoRecord]:
+    """Export the jsonl file for the ecosystem and stream its records
 
     :param ecosystem_name: The name of the ecosystem, as written in the EC
         taxonomy DSL mutations.
     :type ecosystem_name: str
-    :return: The exported taxonomy of repositories, as a list of typed dicts.
-    :rtype: list[RepoJson]
+    :return: The exported taxonomy of repositories, one record at a time.
+    :rtype: Iterator[RepoRecord]
     """
     ecosystem = parse_eco_filename(ecosystem_name)
     filepath: str = f"{os.getcwd()}/out/{ecosystem}.jsonl"
@@ -65,7 +118,8 @@ def run_export_ecosystem(ecosystem_name: str) -> list[RepoJson]:
     # export would fail. Strip it from the subprocess env to force the `uv run`
     # path, which resolves the CLI from the Open Dev Data project itself.
     env = {k: v for k, v in os.environ.items() if k != "VIRTUAL_ENV"}
-    result = subprocess.run(command, cwd=BASE_REPO_PATH, env=env, check=False)
+    with stage("taxonomy export", subprocess=True):
+        result = subprocess.run(command, cwd=BASE_REPO_PATH, env=env, check=False)
     if result.returncode != 0:
         # Fail loudly rather than silently reading a stale export from a previous
         # run, which would make the crawler operate on outdated taxonomy data.
@@ -75,21 +129,111 @@ def run_export_ecosystem(ecosystem_name: str) -> list[RepoJson]:
             f"BASE_REPO_PATH a valid Open Dev Data clone?"
         )
 
-    with open(filepath, "r", encoding="utf-8") as file:
-        repos_list: list[RepoJson] = [json.loads(l) for l in list(file)]
+    return read_export(filepath)
 
-    return repos_list
 
+def build_ecosystem_tree(
+    ecosystem_name: str, records: Iterable[RepoRecord]
+) -> EcosystemTree:
+    """Index an exported taxonomy by ecosystem, in a single pass.
 
-def find_sub_ecosystems(repos_list: list[RepoJson]) -> set[str]:
-    """Find the unique sub-ecosystems in an ecosystem's taxonomy file.
+    Each repo's `branch` lists the sub-ecosystems between the exported
+    ecosystem and the one the repo is tracked in, outermost first. So a repo
+    belongs to every ecosystem along its branch, and each pair of neighbours on
+    the branch is a parent/child connection.
 
-    :param repos_list: The list of all repos in an ecosystem.
-    :type repos_list: list[RepoJson]
+    :param ecosystem_name: The name of the exported ecosystem, as written in the
+        EC taxonomy DSL mutations.
+    :type ecosystem_name: str
+    :param records: The exported taxonomy of repositories.
+    :type records: Iterable[RepoRecord]
+    :return: The indexed ecosystem tree.
+    :rtype: EcosystemTree
+    """
+    tree = EcosystemTree(
+        name=ecosystem_name,
+        repos={ecosystem_name: []},
+        lower_repos={ecosystem_name: set()},
+    )
+
+    with stage("index taxonomy") as indexed:
+        for record in records:
+            indexed.items += 1
+            url = record.repo_url
+            lower = url.lower()
+            parent = ecosystem_name
+            for branch in record.branch:
+                tree.children.setdefault(parent, set()).add(branch)
+                parent = branch
+            direct = record.branch[-1] if record.branch else ecosystem_name
+            tree.direct.setdefault(direct, {}).setdefault(lower, url)
+            for eco in (ecosystem_name, *record.branch):
+                seen = tree.lower_repos.setdefault(eco, set())
+                if lower not in seen:
+                    seen.add(lower)
+                    tree.repos.setdefault(eco, []).append(url)
+
+    return tree
+
+
+def load_ecosystem_tree(ecosystem_name: str) -> EcosystemTree:
+    """Export the ecosystem once and index it into an ecosystem tree.
+
+    The indexed tree is cached against the current state of the `migrations/`
+    directory, so the export is skipped entirely while it hasn't changed. When
+    it has, the new migrations are replayed in-process (see `migrations.py`),
+    unless `TAXONOMY_SOURCE` is `export` or they can't be, in which case the
+    taxonomy is exported with `run.sh`.
+
+    :param ecosystem_name: The name of the ecosystem, as written in the EC
+        taxonomy DSL mutations.
+    :type ecosystem_name: str
+    :return: The indexed ecosystem tree.
+    :rtype: EcosystemTree
+    """
+    cache_name = f"tree-v{TREE_CACHE_VERSION}-{parse_eco_filename(ecosystem_name)}"
+    fingerprint = migrations_fingerprint()
+
+    tree = load_cached(cache_name, fingerprint)
+    if isinstance(tree, EcosystemTree):
+        logger.info("Using cached taxonomy export for %s", ecosystem_name)
+        return tree
+
+    tree = None
+    if TAXONOMY_SOURCE == "replay":
+        try:
+            taxonomy = replay_migrations()
+            tree = build_ecosystem_tree(ecosystem_name, taxonomy.export(ecosystem_name))
+        except MigrationError as err:
+            logger.warning("Can't replay the migrations, exporting instead: %s", err)
+    if tree is None:
+        tree = build_ecosystem_tree(
+            ecosystem_name, run_export_ecosystem(ecosystem_name)
+        )
+    store_cached(cache_name, fingerprint, tree)
+    return tree
+
+
+def find_sub_ecosystems(tree: EcosystemTree, ecosystem_name: str) -> set[str]:
+    """Find the unique sub-ecosystems (at any depth) of an ecosystem.
+
+    :param tree: The indexed taxonomy the ecosystem belongs to.
+    :type tree: EcosystemTree
+    :param ecosystem_name: The name of the ecosystem, as written in the EC
+        taxonomy DSL mutations.
+    :type ecosystem_name: str
     :return: The unique "branches" for all the ecosystem's repos.
     :rtype: set[str]
     """
-    return set(branch for repo in repos_list for branch in repo["branch"])
+    sub_ecosystems: set[str] = set()
+    pending = list(tree.children.get(ecosystem_name, set()))
+    while pending:
+        branch = pending.pop()
+        if branch not in sub_ecosystems:
+            sub_ecosystems.add(branch)
+            pending.extend(tree.children.get(branch, set()))
+
+    return sub_ecosystems
 
 
 def write_repadd_mutations(ecosystem_name: str, repos: list[str]) -> str:
@@ -110,13 +254,107 @@ def write_repadd_mutations(ecosystem_name: str, repos: list[str]) -> str:
     name = f'"{ecosystem_name}"' if " " in ecosystem_name else ecosystem_name
 
     with open(mutation_filepath, "a+", encoding="utf-8") as f:
+        f.seek(0)
+        existing = set(f.read().splitlines())
         for repo in repos:
-            f.write(f"repadd {name} {repo}\n")
+            line = f"repadd {name} {repo}"
+            if line not in existing:
+                f.write(f"{line}\n")
 
     return mutation_filepath
 
 
-def process_ecosystem(ecosystem_name: str, seen_repos: set[str] | None = None) -> None:
+def attribute_repos(
+    tree: EcosystemTree,
+    ecosystem_name: str,
+    repo_ids: dict[str, RepoIdentity | None] | None = None,
+) -> dict[str, set[str]]:
+    """Attribute every repo in an ecosystem to its most specific sub-ecosystems.
+
+    A repo counts towards each ecosystem that tracks it directly, unless another
+    ecosystem tracking it directly is a sub-ecosystem of that one. Most repos
+    are tracked in just one ecosystem, so this takes a single pass over the
+    repos; sub-ecosystems are only worked out (once each) for the few repos
+    tracked in more than one place.
+
+    :param tree: The indexed taxonomy the ecosystem belongs to.
+    :type tree: EcosystemTree
+    :param ecosystem_name: The name of the ecosystem, as written in the EC
+        taxonomy DSL mutations.
+    :type ecosystem_name: str
+    :param repo_ids: The identities of the repos, keyed by lower-cased URL.
+        Given these, a repo tracked under several URLs (e.g. from before and
+        after a rename) is attributed as one repo, by its current URL.
+    :type repo_ids: dict[str, RepoIdentity | None] | None
+    :return: The repos attributed to the ecosystem and to each of its
+        sub-ecosystems (at any depth).
+    :rtype: dict[str, set[str]]
+    """
+    scope = [ecosystem_name, *sorted(find_sub_ecosystems(tree, ecosystem_name))]
+    ecosystem_sets: dict[str, set[str]] = {eco: set() for eco in scope}
+
+    # every scoped ecosystem tracking each repo directly
+    def direct(eco: str) -> Iterable[tuple[int | str, str]]:
+        repos = tree.direct.get(eco, {})
+        if repo_ids is None:
+            return repos.items()
+        return (
+            (identity_key(lower, repo_ids), canonical_url(url, repo_ids))
+            for lower, url in repos.items()
+        )
+
+    tracked_in: dict[int | str, list[str]] = {}
+    urls: dict[int | str, str] = {}
+    for eco in scope:
+        for key, url in direct(eco):
+            ecos = tracked_in.setdefault(key, [])
+            # the same repo can be tracked under two URLs in one ecosystem
+            if not ecos or ecos[-1] != eco:
+                ecos.append(eco)
+            urls.setdefault(key, url)
+
+    descendants: dict[str, set[str]] = {}
+
+    def descendants_of(eco: str) -> set[str]:
+        if eco not in descendants:
+            descendants[eco] = find_sub_ecosystems(tree, eco)
+        return descendants[eco]
+
+    for key, ecos in tracked_in.items():
+        if len(ecos) > 1:
+            ecos = [
+                eco
+                for eco in ecos
+                if not any(other in descendants_of(eco) for other in ecos)
+            ]
+        for eco in ecos:
+            ecosystem_sets[eco].add(urls[key])
+
+    return ecosystem_sets
+
+
+def _unknown_repos(
+    repos: set[str], known: set[str], repo_ids: dict[str, RepoIdentity | None]
+) -> set[str]:
+    """Pick out the repos that aren't among the known (lower-cased) URLs, under
+    any of the URLs the repo index knows them by."""
+    known_keys = {identity_key(repo, repo_ids) for repo in known}
+    return {
+        repo
+        for repo in repos
+        if repo.lower() not in known and identity_key(repo, repo_ids) not in known_keys
+    }
+
+
+def process_ecosystem(
+    ecosystem_name: str,
+    seen_repos: set[str] | None = None,
+    tree: EcosystemTree | None = None,
+    checkpoint: CrawlCheckpoint | None = None,
+    searches: Results | None = None,
+    *,
+    repo_ids: dict[str, RepoIdentity | None] | None = None,
+) -> None:
     """Process the ecosystem, managing the entire process.
 
     :param ecosystem_name: The name of the ecosystem, as written in the Open Dev
@@ -128,42 +366,124 @@ def process_ecosystem(ecosystem_name: str, seen_repos: set[str] | None = None) -
         to the first (most specific) ecosystem that claims it. Callers should
         omit this; it is seeded automatically on the top-level call.
     :type seen_repos: set[str] | None
+    :param tree: The indexed taxonomy, exported once for the whole crawl and
+        shared across the recursive calls. Callers should omit this; it is
+        exported automatically on the top-level call.
+    :type tree: EcosystemTree | None
+    :param checkpoint: The crawl journal, recording progress so an interrupted
+        crawl can be resumed. Ecosystems it has already completed are skipped.
+        Callers may omit this, in which case a fresh journal is kept for the
+        crawl and removed once it finishes.
+    :type checkpoint: CrawlCheckpoint | None
+    :param searches: The code search results of each ecosystem, keyed by
+        ecosystem filename, as found by a search stage running alongside. When
+        omitted, each ecosystem is searched as it's processed.
+    :type searches: Results | None
+    :param repo_ids: The identities of the repos in the taxonomy and found so
+        far, keyed by lower-cased URL, so that a repo found under a new name
+        isn't added again. Callers should omit this; the taxonomy's repos are
+        looked up automatically on the top-level call.
+    :type repo_ids: dict[str, RepoIdentity | None] | None
     """
+    top_level = checkpoint is None
+    if checkpoint is None:
+        checkpoint = CrawlCheckpoint()
     if seen_repos is None:
-        seen_repos = set()
+        seen_repos = checkpoint.seen_repos
+    if tree is None:
+        tree = load_ecosystem_tree(ecosystem_name)
+    if repo_ids is None:
+        repo_ids = resolve_repo_ids(tree.repo_urls(ecosystem_name))
+
+    if ecosystem_name in checkpoint.completed_ecosystems:
+        logger.debug("Already processed ecosystem: %s", ecosystem_name)
+        return
 
     ecosystem_repos: set[str] = set()
     ecosystem = parse_eco_filename(ecosystem_name)
 
-    # 0. export the jsonl file for the ecosystem and read/load it for use here
-    repos_list = run_export_ecosystem(ecosystem_name)
-    current_repos: set[str] = set(r["repo_url"].lower() for r in repos_list)
+    # 0. read this ecosystem's slice of the exported taxonomy
+    current_repos = tree.lower_repo_urls(ecosystem_name)
 
     # 1. recurse into subecosystems
-    branches = find_sub_ecosystems(repos_list)
+    branches = find_sub_ecosystems(tree, ecosystem_name)
 
     for branch in branches:
-        process_ecosystem(ecosystem_name=branch, seen_repos=seen_repos)
+        process_ecosystem(
+            ecosystem_name=branch,
+            seen_repos=seen_repos,
+            tree=tree,
+            checkpoint=checkpoint,
+            searches=searches,
+            repo_ids=repo_ids,
+        )
 
     logger.info("Processing ecosystem: %s", ecosystem)
 
     # 1. add search results
-    found_repos = search_gh_repos(ecosystem)
+    if searches is not None:
+        found_repos = searches.get(ecosystem, set())
+    else:
+        found_repos = search_gh_repos(ecosystem, checkpoint)
     ecosystem_repos.update(found_repos)
 
     # 2. Keep repos that are neither already in the taxonomy nor already emitted
-    #    earlier in this crawl (both compared case-insensitively).
-    new_repos = {
-        repo
-        for repo in ecosystem_repos
-        if repo.lower() not in current_repos and repo.lower() not in seen_repos
-    }
+    #    earlier in this crawl (both compared by Github ID where it's known, and
+    #    case-insensitively by URL otherwise).
+    repo_ids.update(resolve_repo_ids(ecosystem_repos))
+    new_repos = _unknown_repos(ecosystem_repos, current_repos | seen_repos, repo_ids)
     if len(new_repos) == 0:
         logger.info("No new repositories found")
-        return
+    else:
+        # 3. sort and add new_repos to a taxonomy mutation, save to disk
+        with checkpoint.lock:
+            seen_repos.update(repo.lower() for repo in new_repos)
+        logger.info("Found %d new repositories.", len(new_repos))
+        mutation_filepath = write_repadd_mutations(ecosystem_name, sorted(new_repos))
+        logger.info("Wrote mutations to %s", mutation_filepath)
+
+    # 4. record the progress, so a resumed crawl won't do this one again
+    with checkpoint.lock:
+        checkpoint.seen_repos.update(seen_repos)
+        checkpoint.completed_ecosystems.add(ecosystem_name)
+        checkpoint.save()
+    if top_level:
+        checkpoint.clear()
+
+
+def crawl_ecosystem(
+    ecosystem_name: str,
+    checkpoint: CrawlCheckpoint,
+    history: SearchHistory | None = None,
+) -> None:
+    """Crawl the ecosystem and all of its sub-ecosystems, searching Github while
+    the taxonomy is being exported.
+
+    The code searches don't depend on the taxonomy, so they run as a pipeline
+    stage right from the start. Each ecosystem then picks up its search results
+    as it's processed, waiting for them only if they aren't in yet.
+
+    :param ecosystem_name: The name of the ecosystem, as written in the Open Dev
+        Data taxonomy DSL mutations.
+    :type ecosystem_name: str
+    :param checkpoint: The crawl journal, recording progress so an interrupted
+        crawl can be resumed.
+    :type checkpoint: CrawlCheckpoint
+    :param history: The search history of earlier crawls, to only search for
+        results that are new since.
+    :type history: SearchHistory | None
+    """
 
-    # 3. sort and add new_repos to a taxonomy mutation, save to disk
-    seen_repos.update(repo.lower() for repo in new_repos)
-    logger.info("Found %d new repositories.", len(new_repos))
-    mutation_filepath = write_repadd_mutations(ecosystem_name, sorted(new_repos))
-    logger.info("Wrote mutations to %s", mutation_filepath)
+    def search(eco: str) -> list[tuple[str, set[str]]]:
+        return [(eco, search_gh_repos(eco, checkpoint, history))]
+
+    searches = Results(run_pipeline(search_plan, [Stage("search", search)]))
+    try:
+        with stage("crawl") as crawled:
+            tree = load_ecosystem_tree(ecosystem_name)
+            crawled.items = len(tree.repos[ecosystem_name])
+            process_ecosystem(
+                ecosystem_name, tree=tree, checkpoint=checkpoint, searches=searches
+            )
+    finally:
+        searches.close()
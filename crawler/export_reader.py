@@ -0,0 +1,94 @@
+"""
+Export Reader
+-------------
+
+Stream a taxonomy export (`run.sh export`'s JSONL) one record at a time, rather
+than loading the whole file and every repo's dict into memory at once.
+
+Each line becomes a compact, slotted `RepoRecord`. Ecosystem names, branches
+and tags repeat on nearly every line, so they're interned: every record shares
+the same string objects. Lines are parsed with `orjson` when it's installed,
+falling back on the standard library's `json` otherwise.
+"""
+
+import json
+import logging
+import sys
+from collections.abc import Callable, Iterator
+from typing import Any
+
+logger = logging.getLogger(__name__)
+
+_loads: Callable[[bytes], Any]
+try:
+    import orjson  # type: ignore[import-not-found,unused-ignore]
+
+    _loads = orjson.loads
+except ImportError:
+    _loads = json.loads
+
+
+class RepoRecord:
+    """A single repo in a taxonomy export.
+
+    :param eco_name: The name of the exported ecosystem.
+    :type eco_name: str
+    :param branch: The sub-ecosystems between the exported ecosystem and the one
+        the repo is tracked in, outermost first.
+    :type branch: tuple[str, ...]
+    :param repo_url: The URL of the repository.
+    :type repo_url: str
+    :param tags: The repo's tags.
+    :type tags: tuple[str, ...]
+    """
+
+    __slots__ = ("eco_name", "branch", "repo_url", "tags")
+
+    def __init__(
+        self,
+        eco_name: str,
+        branch: tuple[str, ...],
+        repo_url: str,
+        tags: tuple[str, ...] = (),
+    ) -> None:
+        self.eco_name = eco_name
+        self.branch = branch
+        self.repo_url = repo_url
+        self.tags = tags
+
+    def __repr__(self) -> str:
+        return (
+            f"RepoRecord({self.eco_name!r}, {self.branch!r}, "
+            f"{self.repo_url!r}, {self.tags!r})"
+        )
+
+    @classmethod
+    def from_json(cls, line: bytes) -> "RepoRecord":
+        """Parse a line of an export.
+
+        :param line: The JSON object on a single line of the export.
+        :type line: bytes
+        :return: The parsed record, with its repeated strings interned.
+        :rtype: RepoRecord
+        """
+        repo = _loads(line)
+        return cls(
+            sys.intern(repo["eco_name"]),
+            tuple(sys.intern(branch) for branch in repo["branch"]),
+            repo["repo_url"],
+            tuple(sys.intern(tag) for tag in repo.get("tags") or ()),
+        )
+
+
+def read_export(filepath: str) -> Iterator[RepoRecord]:
+    """Stream the records of an exported taxonomy.
+
+    :param filepath: The path to the exported JSONL file.
+    :type filepath: str
+    :return: Each repo in the export, in file order.
+    :rtype: Iterator[RepoRecord]
+    """
+    with open(filepath, "rb") as file:
+        for line in file:
+            if line.strip():
+                yield RepoRecord.from_json(line)
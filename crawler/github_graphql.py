@@ -0,0 +1,342 @@
+"""
+Github GraphQL
+--------------
+
+Batch the repository activity checks and commit-author listings behind the
+contributor count into a handful of GraphQL requests. A single request asks
+about many repositories at once (as aliased `repository` nodes), and only the
+few repositories whose commit history overflows the first page need any
+follow-up requests.
+"""
+
+import datetime
+import logging
+from typing import Any
+
+from github.Requester import Requester
+
+from crawler.activity import record_pushed_at
+from crawler.commit_store import CommitRecord
+from crawler.repo_index import RepoIdentity
+
+logger = logging.getLogger(__name__)
+
+HISTORY_FIELDS = """
+    pageInfo { hasNextPage endCursor }
+    nodes { oid committedDate author { name user { login } } }
+"""
+"""The fields requested for every page of a repository's commit history."""
+
+
+class GraphqlRateLimited(Exception):
+    """Raised when a GraphQL response reports that the rate limit was hit."""
+
+    def __init__(self, headers: dict[str, Any]) -> None:
+        super().__init__("GraphQL rate limit exceeded")
+        self.headers = headers
+
+
+def split_repo_url(repo: str) -> tuple[str, str]:
+    """Split a repository URL into its owner and name.
+
+    :param repo: The URL of the repository.
+    :type repo: str
+    :return: The owner and name of the repository.
+    :rtype: tuple[str, str]
+    """
+    owner, name = repo.rstrip("/").split("/")[-2:]
+    return owner, name
+
+
+def build_batch_query(count: int) -> str:
+    """Build a query for the activity and recent commits of many repos.
+
+    :param count: The number of repositories the query asks about. Their owners,
+        names and the start of their windows are passed as the `$owner<i>`,
+        `$name<i>` and `$since<i>` variables.
+    :type count: int
+    :return: The GraphQL query.
+    :rtype: str
+    """
+    variables = ["$until: GitTimestamp!"]
+    nodes: list[str] = []
+    for i in range(count):
+        variables.append(f"$owner{i}: String!, $name{i}: String!")
+        variables.append(f"$since{i}: GitTimestamp!")
+        nodes.append(f"""r{i}: repository(owner: $owner{i}, name: $name{i}) {{
+    isArchived
+    pushedAt
+    defaultBranchRef {{
+      target {{
+        ... on Commit {{
+          history(since: $since{i}, until: $until, first: 100) {{ ...page }}
+        }}
+      }}
+    }}
+  }}""")
+
+    return f"""
+query({", ".join(variables)}) {{
+  {chr(10).join(nodes)}
+}}
+fragment page on CommitHistoryConnection {{ {HISTORY_FIELDS} }}
+"""
+
+
+HISTORY_PAGE_QUERY = f"""
+query(
+  $owner: String!, $name: String!,
+  $since: GitTimestamp!, $until: GitTimestamp!, $after: String
+) {{
+  repository(owner: $owner, name: $name) {{
+    defaultBranchRef {{
+      target {{
+        ... on Commit {{
+          history(since: $since, until: $until, first: 100, after: $after) {{
+            {HISTORY_FIELDS}
+          }}
+        }}
+      }}
+    }}
+  }}
+}}
+"""
+"""The follow-up query for a single repository whose history overflowed."""
+
+
+def build_identity_query(count: int) -> str:
+    """Build a query for the IDs and current URLs of many repos.
+
+    Github answers for a renamed or transferred repo under its old name too.
+
+    :param count: The number of repositories the query asks about. Their owners
+        and names are passed as the `$owner<i>` and `$name<i>` variables.
+    :type count: int
+    :return: The GraphQL query.
+    :rtype: str
+    """
+    variables = [f"$owner{i}: String!, $name{i}: String!" for i in range(count)]
+    nodes = [
+        f"r{i}: repository(owner: $owner{i}, name: $name{i}) {{ databaseId id url }}"
+        for i in range(count)
+    ]
+    return f"""
+query({", ".join(variables)}) {{
+  {chr(10).join(nodes)}
+}}
+"""
+
+
+def run_query(
+    requester: Requester, query: str, variables: dict[str, Any]
+) -> tuple[dict[str, Any], list[dict[str, Any]]]:
+    """Run a GraphQL query, tolerating partial errors.
+
+    Unlike PyGithub's own `graphql_query`, one missing repository in a batch
+    doesn't throw away the data for all the others.
+
+    :param requester: The requester of the client to query with.
+    :type requester: Requester
+    :param query: The GraphQL query.
+    :type query: str
+    :param variables: The variables for the query.
+    :type variables: dict[str, Any]
+    :raises GraphqlRateLimited: If the response reports a rate limit error.
+    :return: The response data, and any errors that came with it.
+    :rtype: tuple[dict[str, Any], list[dict[str, Any]]]
+    """
+    headers, response = requester.requestJsonAndCheck(
+        "POST", requester.graphql_url, input={"query": query, "variables": variables}
+    )
+    errors: list[dict[str, Any]] = response.get("errors") or []
+    if any(error.get("type") == "RATE_LIMITED" for error in errors):
+        raise GraphqlRateLimited(headers)
+    return response.get("data") or {}, errors
+
+
+def history_commits(history: dict[str, Any]) -> list[CommitRecord]:
+    """Collect the (non-bot) commits from a page of commit history.
+
+    :param history: A `history` connection from a GraphQL response.
+    :type history: dict[str, Any]
+    :return: The commits, each attributed to a lower-cased Github username (or
+        author name, for commits that aren't linked to a Github user).
+    :rtype: list[CommitRecord]
+    """
+    commits: list[CommitRecord] = []
+    for node in history["nodes"]:
+        author = node.get("author") or {}
+        user = author.get("user") or {}
+        committer = user.get("login") or author.get("name")
+        if committer and "[bot]" not in committer:
+            commits.append(
+                CommitRecord(
+                    node["oid"],
+                    committer.lower(),
+                    datetime.datetime.fromisoformat(node["committedDate"]),
+                )
+            )
+    return commits
+
+
+def _history(repository: dict[str, Any] | None) -> dict[str, Any] | None:
+    """Dig the commit history out of a `repository` node, if it has one."""
+    branch = (repository or {}).get("defaultBranchRef") or {}
+    return (branch.get("target") or {}).get("history")
+
+
+def fetch_history_overflow(
+    requester: Requester,
+    repo: str,
+    period: tuple[datetime.datetime, datetime.datetime],
+    cursor: str,
+) -> list[CommitRecord]:
+    """Page through the rest of a repository's commit history.
+
+    :param requester: The requester of the client to query with.
+    :type requester: Requester
+    :param repo: The URL of the repository.
+    :type repo: str
+    :param period: The start and end of the window to look for commits in.
+    :type period: tuple[datetime.datetime, datetime.datetime]
+    :param cursor: The cursor of the last page already fetched.
+    :type cursor: str
+    :return: The commits on the remaining pages.
+    :rtype: list[CommitRecord]
+    """
+    owner, name = split_repo_url(repo)
+    commits: list[CommitRecord] = []
+    after: str | None = cursor
+
+    while after:
+        data, _ = run_query(
+            requester,
+            HISTORY_PAGE_QUERY,
+            {
+                "owner": owner,
+                "name": name,
+                "since": period[0].isoformat(),
+                "until": period[1].isoformat(),
+                "after": after,
+            },
+        )
+        history = _history(data.get("repository"))
+        if history is None:
+            break
+        commits.extend(history_commits(history))
+        page_info = history["pageInfo"]
+        after = page_info["endCursor"] if page_info["hasNextPage"] else None
+
+    return commits
+
+
+def _log_batch_errors(repos: list[str], errors: list[dict[str, Any]]) -> None:
+    """Log the errors for individual repositories in a batch response."""
+    for error in errors:
+        alias = str((error.get("path") or ["?"])[0])
+        repo = repos[int(alias[1:])] if alias[1:].isdigit() else alias
+        if error.get("type") == "NOT_FOUND":
+            logger.error("GraphQL repository not found: %s", repo)
+        else:
+            logger.error("GraphQL error for %s: %s", repo, error.get("message"))
+
+
+def fetch_batch_commits(
+    requester: Requester,
+    repos: dict[str, datetime.datetime],
+    until: datetime.datetime,
+) -> dict[str, list[CommitRecord]]:
+    """Find the recent commits to a batch of repos with a single query.
+
+    Archived repos, and repos that haven't been pushed to within their window,
+    have no commits, just like with the REST backend.
+
+    :param requester: The requester of the client to query with.
+    :type requester: Requester
+    :param repos: The start of the window to look for commits in, per URL of
+        each repository in the batch.
+    :type repos: dict[str, datetime.datetime]
+    :param until: The end of the window to look for commits in.
+    :type until: datetime.datetime
+    :return: The commits, per repository URL.
+    :rtype: dict[str, list[CommitRecord]]
+    """
+    urls = list(repos)
+    variables: dict[str, Any] = {"until": until.isoformat()}
+    for i, repo in enumerate(urls):
+        variables[f"owner{i}"], variables[f"name{i}"] = split_repo_url(repo)
+        variables[f"since{i}"] = repos[repo].isoformat()
+
+    data, errors = run_query(requester, build_batch_query(len(urls)), variables)
+    _log_batch_errors(urls, errors)
+
+    commits: dict[str, list[CommitRecord]] = {}
+    for i, repo in enumerate(urls):
+        repository = data.get(f"r{i}")
+        history = _history(repository)
+        if repository is None or history is None:
+            # missing, or empty (no default branch to take history from)
+            commits[repo] = []
+            continue
+
+        pushed_at = repository["pushedAt"]
+        if pushed_at:
+            record_pushed_at(repo, datetime.datetime.fromisoformat(pushed_at))
+        if (
+            repository["isArchived"]
+            or not pushed_at
+            or datetime.datetime.fromisoformat(pushed_at) < repos[repo]
+        ):
+            commits[repo] = []
+            continue
+
+        commits[repo] = history_commits(history)
+        if history["pageInfo"]["hasNextPage"]:
+            commits[repo].extend(
+                fetch_history_overflow(
+                    requester,
+                    repo,
+                    (repos[repo], until),
+                    history["pageInfo"]["endCursor"],
+                )
+            )
+
+    return commits
+
+
+def fetch_repo_identities(
+    requester: Requester, repos: list[str]
+) -> dict[str, RepoIdentity | None]:
+    """Look up the IDs and current URLs of a batch of repos with a single query.
+
+    :param requester: The requester of the client to query with.
+    :type requester: Requester
+    :param repos: The URLs of the repositories.
+    :type repos: list[str]
+    :return: The identity of the repo each URL leads to, or `None` if it leads
+        to none. URLs the query failed for some other reason are left out.
+    :rtype: dict[str, RepoIdentity | None]
+    """
+    variables: dict[str, Any] = {}
+    for i, repo in enumerate(repos):
+        variables[f"owner{i}"], variables[f"name{i}"] = split_repo_url(repo)
+
+    data, errors = run_query(requester, build_identity_query(len(repos)), variables)
+    # a repo that's gone is what the lookup is there to find out
+    gone = {
+        str((error.get("path") or ["?"])[0])
+        for error in errors
+        if error.get("type") == "NOT_FOUND"
+    }
+    _log_batch_errors(repos, [e for e in errors if e.get("type") != "NOT_FOUND"])
+
+    identities: dict[str, RepoIdentity | None] = {}
+    for i, repo in enumerate(repos):
+        repository = data.get(f"r{i}")
+        if repository is not None:
+            identities[repo] = RepoIdentity(
+                repository["databaseId"], repository["id"], repository["url"]
+            )
+        elif f"r{i}" in gone:
+            identities[repo] = None
+    return identities
@@ -0,0 +1,330 @@
+"""
+HTTP Cache
+----------
+
+A persistent, on-disk cache of Github API responses, plugged in underneath
+PyGithub's requester so every client uses it.
+
+Responses are stored with their `ETag`/`Last-Modified` validators. While an
+entry is younger than its endpoint's TTL it's replayed without a request at
+all; after that, the request is made conditional, and a `304 Not Modified`
+(which doesn't count against Github's primary rate limit) replays the stored
+body. The cache is bounded in size, evicting the least recently used entries.
+"""
+
+import hashlib
+import json
+import logging
+import re
+import sqlite3
+import threading
+import time
+from typing import Any, NamedTuple
+
+from github.Requester import Requester, RequestsResponse
+from requests.structures import CaseInsensitiveDict
+
+from crawler.cache import cache_dir
+from crawler.ratelimit import GovernedHTTPConnection, GovernedHTTPSConnection
+
+logger = logging.getLogger(__name__)
+
+ENDPOINT_TTLS: list[tuple[re.Pattern[str], int | None]] = [
+    # search results are neither stable nor validated by Github
+    (re.compile(r"^/search/"), None),
+    # repository metadata changes rarely, and only `pushed_at` matters much
+    (re.compile(r"^/repos/[^/]+/[^/?]+(\?|$)"), 3600),
+    # manifests are kept parsed by their blob SHA instead (see `manifests.py`)
+    (re.compile(r"^/repos/[^/]+/[^/]+/git/blobs/"), None),
+]
+"""Seconds an entry is replayed without revalidation, by request path. Paths
+mapped to `None` are never cached; unlisted paths are always revalidated."""
+
+RATE_LIMIT_HEADERS = ("x-ratelimit-limit", "x-ratelimit-remaining", "x-ratelimit-reset")
+
+
+def endpoint_ttl(path: str) -> int | None:
+    """Look up how long a response for the given path stays fresh.
+
+    :param path: The request path, including any query string.
+    :type path: str
+    :return: The TTL in seconds, or `None` if the path isn't cached at all.
+    :rtype: int | None
+    """
+    for pattern, ttl in ENDPOINT_TTLS:
+        if pattern.search(path):
+            return ttl
+    return 0
+
+
+class CachedEntry(NamedTuple):
+    """A stored response, along with the validators to revalidate it."""
+
+    etag: str | None
+    last_modified: str | None
+    headers: dict[str, str]
+    body: str
+    stored_at: float
+
+
+class CachedResponse(RequestsResponse):
+    """A stored response, replayed in the shape PyGithub expects."""
+
+    # pylint: disable-next=super-init-not-called
+    def __init__(self, entry: CachedEntry, fresh_headers: dict[str, str]) -> None:
+        self.status = 200
+        self.headers = CaseInsensitiveDict(entry.headers)
+        self.headers.update(fresh_headers)
+        self.body = entry.body
+
+    def read(self) -> str:
+        """Return the response body."""
+        return self.body
+
+    def raise_for_status(self) -> None:
+        """Do nothing; only successful responses are ever stored."""
+
+
+class HttpCache:
+    """The SQLite-backed store of cached responses.
+
+    The shards of a contributor count share the cache from separate processes,
+    so it's kept in write-ahead-log mode, and every write is committed at once.
+
+    :param filepath: Where the SQLite database lives.
+    :type filepath: str
+    :param max_bytes: The total size of the stored bodies to evict down to.
+    :type max_bytes: int
+    """
+
+    def __init__(self, filepath: str, max_bytes: int) -> None:
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.revalidated = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self.connection = sqlite3.connect(
+            filepath, timeout=30.0, check_same_thread=False
+        )
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.executescript("""
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                etag TEXT,
+                last_modified TEXT,
+                headers TEXT NOT NULL,
+                body TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                stored_at REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS responses_accessed_at
+                ON responses (accessed_at);
+            """)
+        row = self.connection.execute("SELECT SUM(size) FROM responses").fetchone()
+        self.total_bytes: int = row[0] or 0
+
+    @staticmethod
+    def key(url: str, authorization: str | None) -> str:
+        """Build the cache key for a request.
+
+        Responses can differ by token, so the `Authorization` header is part of
+        the key (hashed, so the token itself never hits the disk).
+
+        :param url: The full request URL.
+        :type url: str
+        :param authorization: The request's `Authorization` header, if any.
+        :type authorization: str | None
+        :return: The cache key.
+        :rtype: str
+        """
+        return hashlib.sha256(f"{authorization}\0{url}".encode()).hexdigest()
+
+    def get(self, key: str) -> CachedEntry | None:
+        """Look up a stored response, marking it as recently used.
+
+        :param key: The cache key.
+        :type key: str
+        :return: The stored response, if there is one.
+        :rtype: CachedEntry | None
+        """
+        with self._lock:
+            row = self.connection.execute(
+                "SELECT etag, last_modified, headers, body, stored_at "
+                "FROM responses WHERE key = ?",
+                (key,),
+            ).fetchone()
+            if row is None:
+                return None
+            self.connection.execute(
+                "UPDATE responses SET accessed_at = ? WHERE key = ?",
+                (time.time(), key),
+            )
+            self.connection.commit()
+        return CachedEntry(row[0], row[1], json.loads(row[2]), row[3], row[4])
+
+    def refresh(self, key: str) -> None:
+        """Restart a stored response's TTL, after Github confirmed it unchanged.
+
+        :param key: The cache key.
+        :type key: str
+        """
+        with self._lock:
+            self.connection.execute(
+                "UPDATE responses SET stored_at = ? WHERE key = ?", (time.time(), key)
+            )
+            self.connection.commit()
+
+    def put(self, key: str, response: RequestsResponse) -> None:
+        """Store a successful response, then evict down to the size bound.
+
+        :param key: The cache key.
+        :type key: str
+        :param response: The response to store.
+        :type response: RequestsResponse
+        """
+        body = response.read()
+        headers = {
+            k: v for k, v in response.headers.items() if k.lower() != "set-cookie"
+        }
+        now = time.time()
+        with self._lock:
+            old = self.connection.execute(
+                "SELECT size FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            self.connection.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    key,
+                    response.headers.get("ETag"),
+                    response.headers.get("Last-Modified"),
+                    json.dumps(headers),
+                    body,
+                    len(body),
+                    now,
+                    now,
+                ),
+            )
+            self.total_bytes += len(body) - (old[0] if old else 0)
+            self._evict()
+            self.connection.commit()
+
+    def _evict(self) -> None:
+        """Drop the least recently used responses until under the size bound."""
+        while self.total_bytes > self.max_bytes:
+            rows = self.connection.execute(
+                "SELECT key, size FROM responses ORDER BY accessed_at LIMIT 100"
+            ).fetchall()
+            if not rows:
+                self.total_bytes = 0
+                return
+            for key, size in rows:
+                self.connection.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self.total_bytes -= size
+                if self.total_bytes <= self.max_bytes:
+                    return
+
+    def close(self) -> None:
+        """Commit any pending changes and close the database."""
+        with self._lock:
+            self.connection.commit()
+            self.connection.close()
+
+
+_installed: dict[str, Any] = {}
+_lock = threading.Lock()
+
+
+def active_http_cache() -> HttpCache | None:
+    """Return the installed HTTP cache, opening its database on first use.
+
+    :return: The HTTP cache, or `None` if it hasn't been installed.
+    :rtype: HttpCache | None
+    """
+    if "max_bytes" not in _installed:
+        return None
+    with _lock:
+        if "cache" not in _installed:
+            _installed["cache"] = HttpCache(
+                f"{cache_dir()}/http.sqlite", _installed["max_bytes"]
+            )
+    return _installed["cache"]
+
+
+# pylint: disable-next=too-few-public-methods
+class _CachingConnectionMixin:
+    """Serve GET requests from the HTTP cache where possible."""
+
+    protocol: str
+    host: str
+    port: int
+    verb: str
+    url: str
+    headers: dict[str, str]
+
+    def getresponse(self) -> RequestsResponse:
+        """Send the request, or replay it from the cache."""
+        fetch = super().getresponse  # type: ignore[misc]
+        ttl = endpoint_ttl(self.url)
+        http_cache = active_http_cache()
+        if http_cache is None or self.verb != "GET" or ttl is None:
+            return fetch()
+
+        key = http_cache.key(
+            f"{self.protocol}://{self.host}:{self.port}{self.url}",
+            self.headers.get("Authorization"),
+        )
+        entry = http_cache.get(key)
+        if entry is not None and time.time() - entry.stored_at < ttl:
+            http_cache.hits += 1
+            return CachedResponse(entry, {})
+
+        if entry is not None:
+            if entry.etag:
+                self.headers["If-None-Match"] = entry.etag
+            if entry.last_modified:
+                self.headers["If-Modified-Since"] = entry.last_modified
+
+        response: RequestsResponse = fetch()
+        if response.status == 304 and entry is not None:
+            http_cache.revalidated += 1
+            http_cache.refresh(key)
+            # keep the client's view of the rate limit current
+            fresh = {
+                k: v
+                for k, v in response.headers.items()
+                if k.lower() in RATE_LIMIT_HEADERS
+            }
+            return CachedResponse(entry, fresh)
+
+        http_cache.misses += 1
+        if response.status == 200 and (
+            "ETag" in response.headers or "Last-Modified" in response.headers
+        ):
+            http_cache.put(key, response)
+        return response
+
+
+class CachingHTTPSConnection(_CachingConnectionMixin, GovernedHTTPSConnection):
+    """PyGithub's HTTPS connection, with the HTTP cache in front of it.
+
+    Requests replayed from the cache don't take a rate-limit token.
+    """
+
+
+class CachingHTTPConnection(_CachingConnectionMixin, GovernedHTTPConnection):
+    """PyGithub's plain HTTP connection, with the HTTP cache in front of it."""
+
+
+def install_http_cache(max_bytes: int) -> None:
+    """Put the HTTP cache underneath every PyGithub client created from now on,
+    along with the rate-limit buckets (see `ratelimit.py`).
+
+    The cache's database isn't opened until the first request goes out.
+
+    :param max_bytes: The total size of the stored bodies to evict down to.
+    :type max_bytes: int
+    """
+    if "max_bytes" not in _installed:
+        _installed["max_bytes"] = max_bytes
+        Requester.injectConnectionClasses(CachingHTTPConnection, CachingHTTPSConnection)
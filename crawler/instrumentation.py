@@ -0,0 +1,213 @@
+"""
+Instrumentation
+---------------
+
+Account for where a run's time goes: how long each stage took (and how many
+items it got through), how long the taxonomy export's subprocess ran, and how
+many requests (and pages of results) each Github endpoint took.
+
+Everything is collected into a single `RunMetrics`, shared by every thread of
+the run. Stages may nest and overlap (the pipelined ones run side by side), so
+their times don't add up to the run's wall time. See `run_report.py` for the
+report written from them at the end of a run.
+"""
+
+import logging
+import re
+import threading
+import time
+from collections.abc import Iterator
+from contextlib import contextmanager
+from dataclasses import dataclass, replace
+from typing import Any
+from urllib.parse import urlsplit
+
+logger = logging.getLogger(__name__)
+
+_SHA = re.compile(r"[0-9a-f]{40}")
+
+_NAMED_SEGMENTS = {"repos": ("{owner}", "{repo}"), "users": ("{user}",)}
+"""The path segments naming a resource, after the segment that introduces
+them, as they're written in Github's API docs."""
+
+
+@dataclass
+class StageTiming:
+    """The time spent in (and the items handled by) one kind of stage."""
+
+    calls: int = 0
+    """The number of times the stage ran."""
+
+    seconds: float = 0.0
+    """The total time the stage ran for."""
+
+    items: int = 0
+    """The number of items (repos, records, ...) the stage got through."""
+
+
+@dataclass
+class EndpointCalls:
+    """The requests made to one Github endpoint."""
+
+    calls: int = 0
+    """The number of requests sent, including failed ones."""
+
+    pages: int = 0
+    """The number of those that fetched a page of a paginated listing."""
+
+    errors: int = 0
+    """The number of those that failed (with a `4xx` or `5xx` status)."""
+
+    seconds: float = 0.0
+    """The total time spent waiting for responses (but not rate limits)."""
+
+
+def endpoint_of(method: str, url: str) -> str:
+    """Name the endpoint a request was made to, like Github's API docs do.
+
+    :param method: The request method.
+    :type method: str
+    :param url: The request path (or URL), including any query string.
+    :type url: str
+    :return: The method and the path, with owners, names and SHAs replaced by
+        placeholders, e.g. `GET /repos/{owner}/{repo}/commits`.
+    :rtype: str
+    """
+    segments = urlsplit(url).path.split("/")
+    for i, segment in enumerate(segments):
+        if _SHA.fullmatch(segment):
+            segments[i] = "{sha}"
+    # only the first one introduces names, e.g. `/users/{user}/repos`
+    named = next((i for i, s in enumerate(segments) if s in _NAMED_SEGMENTS), None)
+    if named is not None:
+        for offset, name in enumerate(_NAMED_SEGMENTS[segments[named]], named + 1):
+            if offset < len(segments):
+                segments[offset] = name
+    return f"{method} {'/'.join(segments)}"
+
+
+class RunMetrics:
+    """The timings and request counts of a run, safe to update from any thread."""
+
+    def __init__(self) -> None:
+        self.started_at = time.time()
+        self.stages: dict[str, StageTiming] = {}
+        self.subprocesses: dict[str, StageTiming] = {}
+        self.endpoints: dict[str, EndpointCalls] = {}
+        self._lock = threading.Lock()
+
+    def reset(self) -> None:
+        """Start over, as a new run."""
+        with self._lock:
+            self.started_at = time.time()
+            self.stages.clear()
+            self.subprocesses.clear()
+            self.endpoints.clear()
+
+    def snapshot(self) -> dict[str, dict[str, Any]]:
+        """Copy out the totals so far, e.g. to send them back from a worker
+        process.
+
+        :return: Copies of the stage, subprocess and endpoint totals.
+        :rtype: dict[str, dict[str, Any]]
+        """
+        with self._lock:
+            return {
+                "stages": {k: replace(v) for k, v in self.stages.items()},
+                "subprocesses": {k: replace(v) for k, v in self.subprocesses.items()},
+                "endpoints": {k: replace(v) for k, v in self.endpoints.items()},
+            }
+
+    def merge(self, snapshot: dict[str, dict[str, Any]]) -> None:
+        """Add the totals of another process's run to this one's.
+
+        :param snapshot: The other run's totals, from its `snapshot()`.
+        :type snapshot: dict[str, dict[str, Any]]
+        """
+        with self._lock:
+            for kind, timings in (
+                (self.stages, snapshot["stages"]),
+                (self.subprocesses, snapshot["subprocesses"]),
+            ):
+                for name, timing in timings.items():
+                    total = kind.setdefault(name, StageTiming())
+                    total.calls += timing.calls
+                    total.seconds += timing.seconds
+                    total.items += timing.items
+            for endpoint, calls in snapshot["endpoints"].items():
+                total_calls = self.endpoints.setdefault(endpoint, EndpointCalls())
+                total_calls.calls += calls.calls
+                total_calls.pages += calls.pages
+                total_calls.errors += calls.errors
+                total_calls.seconds += calls.seconds
+
+    def add_timing(
+        self, kind: dict[str, StageTiming], name: str, seconds: float, items: int
+    ) -> None:
+        """Add one run of a stage (or subprocess) to its totals."""
+        with self._lock:
+            timing = kind.setdefault(name, StageTiming())
+            timing.calls += 1
+            timing.seconds += seconds
+            timing.items += items
+
+    def record_request(
+        self, method: str, url: str, status: int, seconds: float, paginated: bool
+    ) -> None:
+        """Count a request sent to Github.
+
+        :param method: The request method.
+        :type method: str
+        :param url: The request path, including any query string.
+        :type url: str
+        :param status: The response's status code.
+        :type status: int
+        :param seconds: How long the response took.
+        :type seconds: float
+        :param paginated: Whether the response was a page of a listing.
+        :type paginated: bool
+        """
+        endpoint = endpoint_of(method, url)
+        with self._lock:
+            calls = self.endpoints.setdefault(endpoint, EndpointCalls())
+            calls.calls += 1
+            calls.pages += paginated
+            calls.errors += status >= 400
+            calls.seconds += seconds
+
+
+metrics = RunMetrics()
+"""The metrics of the current run, shared by every module."""
+
+
+@dataclass
+class StageItems:
+    """The items handled by a single run of a stage."""
+
+    items: int = 0
+
+
+@contextmanager
+def stage(name: str, subprocess: bool = False) -> Iterator[StageItems]:
+    """Time a stage of the run, adding it to the run's metrics.
+
+    The stage is recorded even if it raises, so failed runs can be told apart
+    by where they spent their time too.
+
+    :param name: The name of the stage.
+    :type name: str
+    :param subprocess: Whether the stage is a subprocess, such as the taxonomy
+        export.
+    :type subprocess: bool
+    :return: The stage's item counter, to add the items it handled to.
+    :rtype: Iterator[StageItems]
+    """
+    counter = StageItems()
+    started = time.perf_counter()
+    try:
+        yield counter
+    finally:
+        seconds = time.perf_counter() - started
+        kind = metrics.subprocesses if subprocess else metrics.stages
+        metrics.add_timing(kind, name, seconds, counter.items)
+        logger.debug("The %s stage took %.2fs", name, seconds)
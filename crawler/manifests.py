@@ -0,0 +1,338 @@
+"""
+Manifests
+---------
+
+Check that a code search hit really depends on what was searched for. Code
+search matches keywords anywhere in a file, so a `soroban` in a `mix.exs`
+comment, a `stellar-sdk` in a `pom.xml` description, or a vendored copy of
+someone else's manifest all look like hits. Each hit's manifest is parsed for
+its actual dependency entries instead, and the hit only counts if one of them
+matches a searched keyword.
+
+Manifests are fetched by their git blob SHA, which the search results come
+with, and what was parsed out of them is kept in `out/cache/manifests.sqlite`
+by that SHA. A manifest that hasn't changed is never fetched or parsed again.
+
+Files with no parser here (or that don't parse) are given the benefit of the
+doubt, as they were before any hit was verified.
+"""
+
+import json
+import logging
+import re
+import sqlite3
+import tomllib
+from collections.abc import Callable, Iterable
+from typing import Any
+
+from crawler.cache import cache_dir
+
+logger = logging.getLogger(__name__)
+
+_COMMENTS = {
+    "hash": re.compile(r"#[^\n]*"),
+    # not the `//` in a URL
+    "slash": re.compile(r"(?<!:)//[^\n]*|/\*.*?\*/", re.DOTALL),
+    "xml": re.compile(r"<!--.*?-->", re.DOTALL),
+}
+
+
+def _strip(text: str, style: str) -> str:
+    return _COMMENTS[style].sub("", text)
+
+
+def _json_keys(*sections: str) -> Callable[[str], set[str]]:
+    def parse(text: str) -> set[str]:
+        manifest = json.loads(text)
+        return {
+            name
+            for section in sections
+            if isinstance(manifest.get(section), dict)
+            for name in manifest[section]
+        }
+
+    return parse
+
+
+def _cargo_section(table: dict[str, Any]) -> set[str]:
+    names: set[str] = set()
+    for key in ("dependencies", "dev-dependencies", "build-dependencies"):
+        for name, spec in table.get(key, {}).items():
+            names.add(name)
+            # a renamed dependency still pulls in the named package
+            if isinstance(spec, dict) and "package" in spec:
+                names.add(spec["package"])
+    return names
+
+
+def _parse_cargo(text: str) -> set[str]:
+    manifest = tomllib.loads(text)
+    names = _cargo_section(manifest)
+    names |= _cargo_section(manifest.get("workspace", {}))
+    for target in manifest.get("target", {}).values():
+        names |= _cargo_section(target)
+    return names
+
+
+_REQUIREMENT = re.compile(r"^\s*([A-Za-z0-9][A-Za-z0-9._-]*)")
+
+
+def _requirement_names(requirements: Iterable[str]) -> set[str]:
+    return {
+        match[1]
+        for requirement in requirements
+        if isinstance(requirement, str) and (match := _REQUIREMENT.match(requirement))
+    }
+
+
+def _parse_pyproject(text: str) -> set[str]:
+    manifest = tomllib.loads(text)
+    project = manifest.get("project", {})
+    requirements = list(project.get("dependencies", []))
+    for extra in project.get("optional-dependencies", {}).values():
+        requirements.extend(extra)
+    for group in manifest.get("dependency-groups", {}).values():
+        requirements.extend(group)
+    poetry = manifest.get("tool", {}).get("poetry", {})
+    names = _requirement_names(requirements)
+    names.update(poetry.get("dependencies", {}))
+    names.update(poetry.get("dev-dependencies", {}))
+    for group in poetry.get("group", {}).values():
+        names.update(group.get("dependencies", {}))
+    return names
+
+
+def _parse_requirements(text: str) -> set[str]:
+    return _requirement_names(
+        line
+        for line in _strip(text, "hash").splitlines()
+        if not line.lstrip().startswith("-")
+    )
+
+
+def _parse_go_mod(text: str) -> set[str]:
+    text = _strip(text, "slash")
+    names = set(re.findall(r"^\s*require\s+([^\s(]\S*)\s", text, re.MULTILINE))
+    for block in re.findall(r"^\s*require\s*\((.*?)\)", text, re.DOTALL | re.MULTILINE):
+        names.update(line.split()[0] for line in block.splitlines() if line.split())
+    return names
+
+
+def _find(pattern: str, style: str, flags: int = 0) -> Callable[[str], set[str]]:
+    compiled = re.compile(pattern, flags)
+
+    def parse(text: str) -> set[str]:
+        return set(compiled.findall(_strip(text, style)))
+
+    return parse
+
+
+def _parse_pom(text: str) -> set[str]:
+    blocks = re.findall(
+        r"<dependency>(.*?)</dependency>", _strip(text, "xml"), re.DOTALL
+    )
+    return {
+        match[1]
+        for block in blocks
+        if (match := re.search(r"<artifactId>\s*([^<\s]+)\s*</artifactId>", block))
+    }
+
+
+def _parse_gradle(text: str) -> set[str]:
+    coordinates = re.findall(
+        r"""["']([\w.-]+:[\w.-]+)(?::[^"']*)?["']""", _strip(text, "slash")
+    )
+    return set(coordinates) | {coordinate.split(":")[1] for coordinate in coordinates}
+
+
+def _parse_pubspec(text: str) -> set[str]:
+    names: set[str] = set()
+    section = False
+    for line in _strip(text, "hash").splitlines():
+        if not line.strip():
+            continue
+        if not line[0].isspace():
+            section = line.split(":")[0].strip() in (
+                "dependencies",
+                "dev_dependencies",
+                "dependency_overrides",
+            )
+        elif section and (match := re.match(r"^ {1,2}([A-Za-z0-9_]+)\s*:", line)):
+            names.add(match[1])
+    return names
+
+
+def _parse_swift(text: str) -> set[str]:
+    urls = re.findall(r"""\.package\s*\([^)]*?url:\s*"([^"]+)""", _strip(text, "slash"))
+    return {url.rstrip("/").removesuffix(".git").split("/")[-1] for url in urls}
+
+
+_PARSERS: dict[str, Callable[[str], set[str]]] = {
+    "package.json": _json_keys(
+        "dependencies",
+        "devDependencies",
+        "peerDependencies",
+        "optionalDependencies",
+    ),
+    "composer.json": _json_keys("require", "require-dev"),
+    "Cargo.toml": _parse_cargo,
+    "pyproject.toml": _parse_pyproject,
+    "requirements.txt": _parse_requirements,
+    "go.mod": _parse_go_mod,
+    "pom.xml": _parse_pom,
+    "build.gradle": _parse_gradle,
+    "build.gradle.kts": _parse_gradle,
+    "build.sbt": _find(r'"[\w.-]+"\s*%%?\s*"([\w.-]+)"', "slash"),
+    "mix.exs": _find(r"\{\s*:(\w+)\s*,", "hash"),
+    "Gemfile": _find(r"""^\s*gem\s+["']([\w.-]+)["']""", "hash", re.MULTILINE),
+    "Podfile": _find(r"""^\s*pod\s+["']([\w./-]+)["']""", "hash", re.MULTILINE),
+    "Cartfile": _find(r'^\s*\w+\s+"([^"]+)"', "hash", re.MULTILINE),
+    "pubspec.yaml": _parse_pubspec,
+    "Package.swift": _parse_swift,
+    "packages.config": _find(r'<package\s[^>]*\bid="([^"]+)"', "xml"),
+    ".nuspec": _find(r'<dependency\s[^>]*\bid="([^"]+)"', "xml"),
+    ".csproj": _find(r'<PackageReference\s[^>]*\bInclude="([^"]+)"', "xml"),
+}
+"""The dependency parser for each kind of manifest, by file name (or by
+extension, for the kinds searched for by `path:`)."""
+
+
+def manifest_kind(path: str) -> str | None:
+    """Work out which kind of manifest a file is, from its path.
+
+    :param path: The file's path within its repository.
+    :type path: str
+    :return: The key of the file's parser in `_PARSERS`, or `None` if there's no
+        parser for it.
+    :rtype: str | None
+    """
+    name = path.rsplit("/", 1)[-1]
+    if name in _PARSERS:
+        return name
+    extension = f".{name.rsplit('.', 1)[-1]}"
+    return extension if "." in name and extension in _PARSERS else None
+
+
+def parse_manifest(kind: str, content: bytes) -> set[str] | None:
+    """Parse the names of a manifest's dependencies.
+
+    :param kind: The kind of manifest, as returned by `manifest_kind`.
+    :type kind: str
+    :param content: The manifest's content.
+    :type content: bytes
+    :return: The names of the dependencies, or `None` if the manifest couldn't
+        be parsed.
+    :rtype: set[str] | None
+    """
+    try:
+        return _PARSERS[kind](content.decode("utf-8", errors="replace"))
+    except (ValueError, AttributeError, TypeError) as err:
+        # malformed JSON or TOML, or the wrong shapes in the right places
+        logger.debug("Could not parse a %s manifest: %s", kind, err)
+        return None
+
+
+def _normalize(name: str) -> str:
+    return name.lower().replace("_", "-")
+
+
+def matches_keyword(dependencies: Iterable[str], keywords: Iterable[str]) -> bool:
+    """Check if any of the dependencies is what one of the keywords searched for.
+
+    A keyword matches a dependency it's a whole part of (like code search
+    would), so `stellar-sdk` matches `java-stellar-sdk` and
+    `github.com/stellar/go-stellar-sdk`, but not `stellar-sdkx`. Case and the
+    difference between `_` and `-` don't matter.
+
+    :param dependencies: The names of the dependencies.
+    :type dependencies: Iterable[str]
+    :param keywords: The keywords searched for.
+    :type keywords: Iterable[str]
+    :return: Whether any of the dependencies matches.
+    :rtype: bool
+    """
+    patterns = [
+        re.compile(rf"(?<![a-z0-9]){re.escape(_normalize(keyword))}(?![a-z0-9])")
+        for keyword in keywords
+    ]
+    return any(
+        pattern.search(_normalize(dependency))
+        for dependency in dependencies
+        for pattern in patterns
+    )
+
+
+class ManifestCache:
+    """The dependencies parsed out of every manifest so far, by blob SHA.
+
+    :param filepath: Where the SQLite database lives. Defaults to
+        `out/cache/manifests.sqlite` in the current working directory.
+    :type filepath: str | None
+    """
+
+    def __init__(self, filepath: str | None = None) -> None:
+        if filepath is None:
+            filepath = f"{cache_dir()}/manifests.sqlite"
+        self.filepath = filepath
+        self.connection = sqlite3.connect(filepath, timeout=30.0)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.executescript("""
+            CREATE TABLE IF NOT EXISTS manifests (
+                sha TEXT NOT NULL,
+                kind TEXT NOT NULL,
+                dependencies TEXT,
+                PRIMARY KEY (sha, kind)
+            ) WITHOUT ROWID;
+            """)
+
+    def __enter__(self) -> "ManifestCache":
+        return self
+
+    def __exit__(self, *_: object) -> None:
+        self.close()
+
+    def close(self) -> None:
+        """Commit any pending changes and close the database."""
+        self.connection.commit()
+        self.connection.close()
+
+    def lookup(
+        self, blobs: Iterable[tuple[str, str]]
+    ) -> dict[tuple[str, str], set[str] | None]:
+        """Return the dependencies already parsed out of some manifests.
+
+        :param blobs: The blob SHA and kind of each manifest.
+        :type blobs: Iterable[tuple[str, str]]
+        :return: The dependencies of each manifest parsed before (or `None` if
+            it couldn't be), keyed by blob SHA and kind.
+        :rtype: dict[tuple[str, str], set[str] | None]
+        """
+        known: dict[tuple[str, str], set[str] | None] = {}
+        for sha, kind in blobs:
+            row = self.connection.execute(
+                "SELECT dependencies FROM manifests WHERE sha = ? AND kind = ?",
+                (sha, kind),
+            ).fetchone()
+            if row is not None:
+                known[sha, kind] = None if row[0] is None else set(json.loads(row[0]))
+        return known
+
+    def record(self, parsed: dict[tuple[str, str], set[str] | None]) -> None:
+        """Remember the dependencies parsed out of some manifests.
+
+        :param parsed: The dependencies of each manifest (or `None` if it
+            couldn't be parsed), keyed by blob SHA and kind.
+        :type parsed: dict[tuple[str, str], set[str] | None]
+        """
+        with self.connection:
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO manifests VALUES (?, ?, ?)",
+                (
+                    (
+                        sha,
+                        kind,
+                        None if names is None else json.dumps(sorted(names)),
+                    )
+                    for (sha, kind), names in parsed.items()
+                ),
+            )
@@ -0,0 +1,351 @@
+"""
+Migrations
+----------
+
+Replay the Open Dev Data taxonomy's migrations in-process, instead of through
+`run.sh export`, which replays the whole history every time.
+
+The taxonomy that results is kept under `out/cache/`, along with the migration
+files that went into it. The next replay picks it up and applies only the files
+added since (or the lines appended to the newest one, as `write_repadd_mutations`
+does), so a load takes time in proportion to the new mutations, not to the
+whole history. If an already-applied file changes, or a new one sorts before
+it, everything is replayed from scratch.
+
+The DSL has one command per line, with names containing spaces in double
+quotes. Lines starting with `--` are comments:
+
+```text
+ecoadd Stellar
+ecoadd "Aquarius (AQUA token)"
+ecocon Stellar "Aquarius (AQUA token)"
+repadd Stellar https://github.com/stellar/js-stellar-sdk #sdk
+```
+
+`ecoadd`, `ecorem` and `ecomov` add, remove and rename ecosystems, `ecocon` and
+`ecodis` connect and disconnect a sub-ecosystem, `repadd` adds a (tagged) repo
+to an ecosystem, `repmov` renames a repo everywhere, and `reprem` removes a
+repo, either everywhere or (given an ecosystem too) from just the one.
+
+Anything else raises a `MigrationError`, so the taxonomy can be exported the old
+way instead of being replayed wrong.
+"""
+
+import hashlib
+import logging
+import os
+import pickle
+import re
+import sys
+from collections.abc import Iterator
+from dataclasses import dataclass
+
+from crawler.cache import cache_dir
+from crawler.constants import BASE_REPO_PATH
+from crawler.export_reader import RepoRecord
+from crawler.instrumentation import stage
+
+logger = logging.getLogger(__name__)
+
+STATE_VERSION = 1
+"""Bumped whenever the shape of `Taxonomy` changes, so that states persisted by
+an older version aren't loaded."""
+
+_TOKEN = re.compile(r'"([^"]*)"|(\S+)')
+
+_ARITY: dict[str, tuple[int, int | None]] = {
+    "ecoadd": (1, 1),
+    "ecorem": (1, 1),
+    "ecomov": (2, 2),
+    "ecocon": (2, 2),
+    "ecodis": (2, 2),
+    "repadd": (2, None),
+    "reprem": (1, 2),
+    "repmov": (2, 2),
+}
+"""The fewest and most arguments each command takes."""
+
+
+class MigrationError(Exception):
+    """A migration the native replay can't apply (or doesn't understand)."""
+
+
+@dataclass
+class AppliedFile:
+    """A migration file that went into a replayed taxonomy."""
+
+    name: str
+    """The file's name, within `migrations/`."""
+
+    size: int
+    """The number of bytes of the file that were applied."""
+
+    digest: str
+    """The SHA-256 of those bytes."""
+
+
+def parse_mutation(line: str) -> list[str]:
+    """Split a line of the migrations DSL into its command and arguments.
+
+    :param line: A line of a migration file.
+    :type line: str
+    :return: The command and its arguments (unquoted), or nothing for blank
+        and comment lines.
+    :rtype: list[str]
+    """
+    line = line.strip()
+    if not line or line.startswith(("--", "#")):
+        return []
+    return [quoted if quoted else bare for quoted, bare in _TOKEN.findall(line)]
+
+
+class Taxonomy:
+    """The materialized state of the taxonomy, as of the migrations applied."""
+
+    def __init__(self) -> None:
+        self.repos: dict[str, dict[str, tuple[str, ...]]] = {}
+        """The tags of the repos tracked directly in each ecosystem, keyed by
+        ecosystem and URL."""
+
+        self.children: dict[str, set[str]] = {}
+        """The direct sub-ecosystems of each ecosystem."""
+
+        self.repo_ecosystems: dict[str, set[str]] = {}
+        """The ecosystems each repo URL is tracked in directly."""
+
+        self.applied: list[AppliedFile] = []
+        """The migration files applied so far, in order."""
+
+    def _ecosystem(self, name: str) -> dict[str, tuple[str, ...]]:
+        if name not in self.repos:
+            raise MigrationError(f"There's no ecosystem named {name!r}")
+        return self.repos[name]
+
+    def _remove_repo(self, eco: str, url: str) -> None:
+        self.repos[eco].pop(url, None)
+        ecosystems = self.repo_ecosystems.get(url, set())
+        ecosystems.discard(eco)
+        if not ecosystems:
+            self.repo_ecosystems.pop(url, None)
+
+    def apply(self, args: list[str]) -> None:
+        """Apply a single (parsed) mutation.
+
+        :param args: The mutation's command and arguments.
+        :type args: list[str]
+        :raises MigrationError: If the command is unknown, or its arguments don't
+            fit the current state.
+        """
+        command, *rest = args
+        if command not in _ARITY:
+            raise MigrationError(f"Unknown command {command!r}")
+        low, high = _ARITY[command]
+        if len(rest) < low or (high is not None and len(rest) > high):
+            raise MigrationError(f"Wrong number of arguments for {command}: {rest}")
+        getattr(self, f"_{command}")(*(sys.intern(arg) for arg in rest))
+
+    def _ecoadd(self, name: str) -> None:
+        self.repos.setdefault(name, {})
+
+    def _ecorem(self, name: str) -> None:
+        for url in list(self._ecosystem(name)):
+            self._remove_repo(name, url)
+        del self.repos[name]
+        self.children.pop(name, None)
+        for children in self.children.values():
+            children.discard(name)
+
+    def _ecomov(self, old: str, new: str) -> None:
+        repos = self._ecosystem(old)
+        if new in self.repos:
+            raise MigrationError(f"Can't rename {old!r}: {new!r} already exists")
+        self.repos[new] = repos
+        del self.repos[old]
+        for url in repos:
+            ecosystems = self.repo_ecosystems[url]
+            ecosystems.discard(old)
+            ecosystems.add(new)
+        if old in self.children:
+            self.children[new] = self.children.pop(old)
+        for children in self.children.values():
+            if old in children:
+                children.discard(old)
+                children.add(new)
+
+    def _ecocon(self, parent: str, child: str) -> None:
+        self._ecosystem(parent)
+        self._ecosystem(child)
+        self.children.setdefault(parent, set()).add(child)
+
+    def _ecodis(self, parent: str, child: str) -> None:
+        self.children.get(parent, set()).discard(child)
+
+    def _repadd(self, eco: str, url: str, *tags: str) -> None:
+        if any(not tag.startswith("#") for tag in tags):
+            raise MigrationError(f"Tags must start with `#`: {tags}")
+        repos = self._ecosystem(eco)
+        repos[url] = tuple(dict.fromkeys((*repos.get(url, ()), *tags)))
+        self.repo_ecosystems.setdefault(url, set()).add(eco)
+
+    def _reprem(self, *args: str) -> None:
+        *eco, url = args
+        for name in eco or list(self.repo_ecosystems.get(url, ())):
+            self._ecosystem(name)
+            self._remove_repo(name, url)
+
+    def _repmov(self, old: str, new: str) -> None:
+        for eco in list(self.repo_ecosystems.get(old, ())):
+            tags = self.repos[eco][old]
+            self._remove_repo(eco, old)
+            self._repadd(eco, new, *tags)
+
+    def apply_text(self, name: str, text: str, first_line: int = 1) -> int:
+        """Apply the mutations in (part of) a migration file.
+
+        :param name: The file's name, for error messages.
+        :type name: str
+        :param text: The mutations, one per line.
+        :type text: str
+        :param first_line: The line number of the text's first line.
+        :type first_line: int
+        :raises MigrationError: If any mutation can't be applied.
+        :return: The number of mutations applied.
+        :rtype: int
+        """
+        applied = 0
+        for number, line in enumerate(text.splitlines(), first_line):
+            args = parse_mutation(line)
+            if not args:
+                continue
+            try:
+                self.apply(args)
+            except MigrationError as err:
+                raise MigrationError(f"{name}:{number}: {err}") from err
+            applied += 1
+        return applied
+
+    def export(self, ecosystem_name: str) -> Iterator[RepoRecord]:
+        """Walk an ecosystem and its sub-ecosystems, like `run.sh export -e` does.
+
+        :param ecosystem_name: The name of the ecosystem to export.
+        :type ecosystem_name: str
+        :raises MigrationError: If there's no such ecosystem.
+        :return: Every repo tracked in the ecosystem, once per branch it's
+            tracked under.
+        :rtype: Iterator[RepoRecord]
+        """
+        self._ecosystem(ecosystem_name)
+        root = sys.intern(ecosystem_name)
+
+        def walk(eco: str, branch: tuple[str, ...]) -> Iterator[RepoRecord]:
+            for url, tags in self.repos[eco].items():
+                yield RepoRecord(root, branch, url, tags)
+            for child in sorted(self.children.get(eco, ())):
+                # a connection back up the branch would never end
+                if child != root and child not in branch:
+                    yield from walk(child, (*branch, child))
+
+        return walk(root, ())
+
+
+def _state_filepath() -> str:
+    return f"{cache_dir()}/taxonomy-v{STATE_VERSION}.pickle"
+
+
+def _load_state() -> Taxonomy | None:
+    try:
+        with open(_state_filepath(), "rb") as f:
+            taxonomy = pickle.load(f)
+    except FileNotFoundError:
+        return None
+    except (pickle.UnpicklingError, EOFError, AttributeError, ImportError):
+        logger.warning("Ignoring unreadable taxonomy state: %s", _state_filepath())
+        return None
+    return taxonomy if isinstance(taxonomy, Taxonomy) else None
+
+
+def _store_state(taxonomy: Taxonomy) -> None:
+    filepath = _state_filepath()
+    with open(f"{filepath}.tmp", "wb") as f:
+        pickle.dump(taxonomy, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(f"{filepath}.tmp", filepath)
+
+
+def _digest(content: bytes) -> str:
+    return hashlib.sha256(content).hexdigest()
+
+
+def _resume_point(
+    taxonomy: Taxonomy, names: list[str], contents: dict[str, bytes]
+) -> int | None:
+    """Work out how much of the migrations a persisted taxonomy already covers.
+
+    :return: The number of files that were applied unchanged (the last of
+        which may have grown since), or `None` if the taxonomy can't be built on.
+    """
+    applied = taxonomy.applied
+    if [file.name for file in applied] != names[: len(applied)]:
+        return None
+    for i, file in enumerate(applied):
+        content = contents[file.name]
+        # only the newest file may have grown, and only by whole lines
+        grown = (
+            i == len(applied) - 1
+            and len(content) > file.size
+            and content[file.size - 1 : file.size] in (b"", b"\n")
+        )
+        if len(content) != file.size and not grown:
+            return None
+        if _digest(content[: file.size]) != file.digest:
+            return None
+    return len(applied)
+
+
+def replay_migrations(migrations_path: str | None = None) -> Taxonomy:
+    """Bring the taxonomy up to date with the migration files.
+
+    :param migrations_path: The `migrations/` directory. Defaults to the one in
+        `BASE_REPO_PATH`.
+    :type migrations_path: str | None
+    :raises MigrationError: If any of the new mutations can't be applied. Nothing
+        is persisted then.
+    :return: The taxonomy, as of the last migration.
+    :rtype: Taxonomy
+    """
+    if migrations_path is None:
+        migrations_path = f"{BASE_REPO_PATH}/migrations"
+    with os.scandir(migrations_path) as entries:
+        names = sorted(entry.name for entry in entries if entry.is_file())
+    contents: dict[str, bytes] = {}
+    for name in names:
+        with open(f"{migrations_path}/{name}", "rb") as f:
+            contents[name] = f.read()
+
+    taxonomy = _load_state()
+    resume = None if taxonomy is None else _resume_point(taxonomy, names, contents)
+    if taxonomy is None or resume is None:
+        logger.info("Replaying all %d migration files", len(names))
+        taxonomy, resume = Taxonomy(), 0
+
+    changed = False
+    with stage("replay migrations") as replayed:
+        if resume and len(contents[names[resume - 1]]) > taxonomy.applied[-1].size:
+            # the newest file has grown, e.g. by another crawl on the same day
+            last = taxonomy.applied[-1]
+            tail = contents[last.name][last.size :].decode("utf-8")
+            first_line = contents[last.name][: last.size].count(b"\n") + 1
+            replayed.items += taxonomy.apply_text(last.name, tail, first_line)
+            taxonomy.applied[-1] = AppliedFile(
+                last.name, len(contents[last.name]), _digest(contents[last.name])
+            )
+            changed = True
+        for name in names[resume:]:
+            content = contents[name]
+            replayed.items += taxonomy.apply_text(name, content.decode("utf-8"))
+            taxonomy.applied.append(AppliedFile(name, len(content), _digest(content)))
+            changed = True
+        logger.info("Applied %d new mutations to the taxonomy", replayed.items)
+
+    if changed:
+        _store_state(taxonomy)
+    return taxonomy
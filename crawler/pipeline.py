@@ -0,0 +1,208 @@
+"""
+Pipeline
+--------
+
+Run the stages of a crawl or count side by side, instead of one after another.
+Each stage is a small pool of worker threads, reading items from a bounded
+queue and writing its results to the next one. Network-bound stages (code
+search, commit listing) keep going while the CPU and subprocess work (the
+taxonomy export, writing dumps) happens elsewhere, so the whole run takes about
+as long as its slowest stage, rather than the sum of all of them. The queues
+being bounded means a fast stage can only run so far ahead of a slow one.
+
+An error in any stage stops the whole pipeline, and is raised to whoever is
+consuming its results.
+"""
+
+import logging
+import queue
+import threading
+from collections.abc import Callable, Hashable, Iterable, Iterator, Sequence
+from typing import Any, NamedTuple
+
+from crawler.constants import PIPELINE_QUEUE_SIZE
+
+logger = logging.getLogger(__name__)
+
+_DONE = object()
+"""Put on a queue once the stage feeding it has finished."""
+
+
+class Stage(NamedTuple):
+    """A step of a pipeline."""
+
+    name: str
+    """The name of the stage, for its threads and log messages."""
+
+    work: Callable[[Any], Iterable[Any]]
+    """Turns one item from the previous stage into any number of results."""
+
+    workers: int = 1
+    """The number of items worked on concurrently. Results from more than one
+    worker may come out in a different order than their items went in."""
+
+
+class _Pipeline:
+    """The queues and threads of a running pipeline."""
+
+    def __init__(self, stages: Sequence[Stage], maxsize: int) -> None:
+        self.stages = stages
+        self.queues: list[queue.Queue[Any]] = [
+            queue.Queue(maxsize) for _ in range(len(stages) + 1)
+        ]
+        self.errors: list[BaseException] = []
+        self.stop = threading.Event()
+        self.lock = threading.Lock()
+        self.remaining = [max(stage.workers, 1) for stage in stages]
+        self.threads: list[threading.Thread] = []
+
+    def put(self, outbox: queue.Queue[Any], item: Any) -> bool:
+        """Put an item on a queue, unless the pipeline stops first."""
+        while not self.stop.is_set():
+            try:
+                outbox.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def get(self, inbox: queue.Queue[Any]) -> Any:
+        """Take an item off a queue, or `_DONE` if the pipeline stops first."""
+        while not self.stop.is_set():
+            try:
+                return inbox.get(timeout=0.1)
+            except queue.Empty:
+                continue
+        return _DONE
+
+    def fail(self, err: BaseException) -> None:
+        """Record an error, and stop the pipeline."""
+        self.errors.append(err)
+        self.stop.set()
+
+    def feed(self, source: Iterable[Any]) -> None:
+        """Put the source's items on the first stage's queue."""
+        try:
+            for item in source:
+                if not self.put(self.queues[0], item):
+                    return
+        except BaseException as err:  # pylint: disable=broad-exception-caught
+            self.fail(err)
+        self.put(self.queues[0], _DONE)
+
+    def work(self, index: int) -> None:
+        """Work on a stage's items, until the previous stage has finished."""
+        stage = self.stages[index]
+        inbox, outbox = self.queues[index], self.queues[index + 1]
+        try:
+            while (item := self.get(inbox)) is not _DONE:
+                for result in stage.work(item):
+                    if not self.put(outbox, result):
+                        return
+            # leave the marker for this stage's other workers
+            self.put(inbox, _DONE)
+        except BaseException as err:  # pylint: disable=broad-exception-caught
+            logger.error("The %s stage failed: %s", stage.name, err)
+            self.fail(err)
+        finally:
+            with self.lock:
+                self.remaining[index] -= 1
+                last = self.remaining[index] == 0
+            if last:
+                self.put(outbox, _DONE)
+
+    def start(self, source: Iterable[Any]) -> None:
+        """Start the source's thread, and every stage's workers."""
+        self.threads.append(
+            threading.Thread(
+                target=self.feed, args=(source,), name="pipeline-source", daemon=True
+            )
+        )
+        for index, stage in enumerate(self.stages):
+            self.threads.extend(
+                threading.Thread(
+                    target=self.work,
+                    args=(index,),
+                    name=f"pipeline-{stage.name}-{i}",
+                    daemon=True,
+                )
+                for i in range(self.remaining[index])
+            )
+        for thread in self.threads:
+            thread.start()
+
+    def drain(self) -> Iterator[Any]:
+        """Yield the last stage's results, then raise the first error if any."""
+        try:
+            while (result := self.get(self.queues[-1])) is not _DONE:
+                yield result
+        finally:
+            self.stop.set()
+            for thread in self.threads:
+                thread.join()
+        if self.errors:
+            raise self.errors[0]
+
+
+def run_pipeline(
+    source: Iterable[Any],
+    stages: Sequence[Stage],
+    maxsize: int = PIPELINE_QUEUE_SIZE,
+) -> Iterator[Any]:
+    """Feed items through the stages of a pipeline, all running concurrently.
+
+    The stages start working right away, before any results are consumed.
+
+    :param source: The items for the first stage. It's iterated on a thread of
+        its own, so it may be slow to produce them too.
+    :type source: Iterable[Any]
+    :param stages: The stages, in order.
+    :type stages: Sequence[Stage]
+    :param maxsize: The most items waiting between any two stages.
+    :type maxsize: int
+    :raises Exception: Whatever the source or a stage raised first.
+    :return: The results of the last stage.
+    :rtype: Iterator[Any]
+    """
+    pipeline = _Pipeline(stages, maxsize)
+    pipeline.start(source)
+    return pipeline.drain()
+
+
+class Results:
+    """Look up keyed results from a pipeline, in whatever order they're needed.
+
+    Results that come out of the pipeline before they're asked for are held on
+    to until they are.
+
+    :param results: The `(key, value)` results of a pipeline.
+    :type results: Iterator[tuple[Hashable, Any]]
+    """
+
+    def __init__(self, results: Iterator[tuple[Hashable, Any]]) -> None:
+        self._results = results
+        self._ready: dict[Hashable, Any] = {}
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """Return the result for a key, waiting for it if needed.
+
+        :param key: The key of the result.
+        :type key: Hashable
+        :param default: Returned if the pipeline finishes without that key.
+        :type default: Any
+        :return: The result for the key.
+        :rtype: Any
+        """
+        while key not in self._ready:
+            try:
+                ready_key, value = next(self._results)
+            except StopIteration:
+                return default
+            self._ready[ready_key] = value
+        return self._ready[key]
+
+    def close(self) -> None:
+        """Stop the pipeline, once no more results are needed."""
+        close = getattr(self._results, "close", None)
+        if close is not None:
+            close()
@@ -0,0 +1,148 @@
+"""
+Query Planner
+-------------
+
+Turn the entries in `SEARCH_QUERIES` into as few code searches as possible.
+Every search costs at least one throttled request, so:
+
+- Entries that only differ by case or surrounding whitespace are run once.
+- Keywords searched for in the same file (`filename:` or `path:`) within an
+  ecosystem are combined into a single `OR` search, staying within Github's
+  limits of five boolean operators and 256 characters per query.
+- Identical searches in different ecosystems share their results (they're
+  keyed by the search string in the crawl checkpoint).
+
+Keywords from different ecosystems are never combined, since a result can't be
+attributed to the keyword that matched it.
+"""
+
+import logging
+import re
+
+logger = logging.getLogger(__name__)
+
+MAX_BOOLEAN_OPERATORS = 5
+"""The most `AND`/`OR`/`NOT` operators Github allows in a search query."""
+
+MAX_QUERY_LENGTH = 256
+"""The longest search query Github accepts, in characters."""
+
+_QUALIFIERS = re.compile(r"\b(?:filename|path|size|sort):\S+")
+
+
+def build_search_query(query: dict[str, str]) -> str:
+    """Build a search query string based on the given criteria.
+
+    :param query: The dictionary of query qualifiers, keyed by available Github
+        `API search query qualifiers
+        <https://docs.github.com/search-github/searching-on-github/searching-code>`_
+    :type query: dict[str, str]
+    :return: The formatted query string to use in the Github search request.
+    :rtype: str
+    """
+    query_parts: list[str] = []
+
+    if "filename" in query:
+        query_parts.append(f"filename:{query['filename']}")
+    if "path" in query:
+        query_parts.append(f"path:{query['path']}")
+    if "keyword" in query:
+        query_parts.append(f"{query['keyword']}")
+
+    query_parts.append("sort:updated")
+    return " ".join(query_parts)
+
+
+def search_keywords(search: str) -> list[str]:
+    """Pick the keywords back out of a search query string.
+
+    :param search: The search query string, as built by `build_search_query`
+        (and possibly sharded).
+    :type search: str
+    :return: The keywords the search is for, unquoted.
+    :rtype: list[str]
+    """
+    keywords = _QUALIFIERS.sub(" ", search).split(" OR ")
+    return [
+        keyword
+        for part in keywords
+        if (keyword := part.replace("\\", "").replace('"', "").strip())
+    ]
+
+
+def combine_keywords(qualifiers: dict[str, str], keywords: list[str]) -> list[str]:
+    """Pack keywords into as few `OR` expressions as the query limits allow.
+
+    :param qualifiers: The qualifiers (`filename`, `path`) the keywords share.
+    :type qualifiers: dict[str, str]
+    :param keywords: The keywords to search for, in order.
+    :type keywords: list[str]
+    :return: The `keyword` value of each combined query.
+    :rtype: list[str]
+    """
+    groups: list[list[str]] = []
+    for keyword in keywords:
+        if groups:
+            candidate = groups[-1] + [keyword]
+            combined = {**qualifiers, "keyword": " OR ".join(candidate)}
+            if (
+                len(candidate) - 1 <= MAX_BOOLEAN_OPERATORS
+                and len(build_search_query(combined)) <= MAX_QUERY_LENGTH
+            ):
+                groups[-1] = candidate
+                continue
+        groups.append([keyword])
+
+    return [" OR ".join(group) for group in groups]
+
+
+def plan_queries(queries: list[dict[str, str]]) -> list[dict[str, str]]:
+    """Normalize, deduplicate and combine an ecosystem's search queries.
+
+    :param queries: The ecosystem's entries in `SEARCH_QUERIES`.
+    :type queries: list[dict[str, str]]
+    :return: The queries to run instead, in the same shape. Together they match
+        everything the original queries do.
+    :rtype: list[dict[str, str]]
+    """
+    keywords_by_scope: dict[tuple[tuple[str, str], ...], list[str]] = {}
+    planned: list[dict[str, str]] = []
+    seen: set[tuple[tuple[str, str], ...]] = set()
+
+    for query in queries:
+        normalized = {key: value.strip() for key, value in query.items()}
+        identity = tuple(sorted((k, v.casefold()) for k, v in normalized.items()))
+        if identity in seen:
+            continue
+        seen.add(identity)
+
+        keyword = normalized.pop("keyword", "")
+        if not keyword:
+            # nothing to combine, it matches every file in its scope
+            planned.append(normalized)
+            continue
+        scope = tuple(sorted(normalized.items()))
+        keywords_by_scope.setdefault(scope, []).append(keyword)
+
+    for scope, keywords in keywords_by_scope.items():
+        qualifiers = dict(scope)
+        for combined in combine_keywords(qualifiers, keywords):
+            planned.append({**qualifiers, "keyword": combined})
+
+    return planned
+
+
+def plan_search_queries(
+    search_queries: dict[str, list[dict[str, str]]],
+) -> dict[str, list[str]]:
+    """Plan the search query strings to run for every ecosystem.
+
+    :param search_queries: The search queries, by ecosystem name.
+    :type search_queries: dict[str, list[dict[str, str]]]
+    :return: The search query strings to run, by ecosystem name.
+    :rtype: dict[str, list[str]]
+    """
+    return {
+        ecosystem: [build_search_query(query) for query in plan_queries(queries)]
+        for ecosystem, queries in search_queries.items()
+    }
@@ -0,0 +1,336 @@
+"""
+Rate Limit
+----------
+
+Keep every Github request inside the API budget, without any fixed sleeps.
+
+Each rate-limit resource Github tracks (`core`, `search`, `code_search` and
+`graphql`) gets its own token bucket, shared by every client and worker. A
+bucket is filled from the `X-RateLimit-*` headers of every response (and from
+polling `/rate_limit`), and drained by one token per request. While a bucket
+has tokens to spare, requests go out right away; once it runs down to its
+reserve, requests wait for the window to reset. Secondary rate limits (a `403`
+or `429` with a `Retry-After`, or none at all) pause the bucket with jittered,
+exponential backoff.
+
+The governing happens in PyGithub's connection classes, so it covers every
+request, including the pages fetched behind a `PaginatedList`. That's also where
+each request is counted in the run's metrics.
+"""
+
+import logging
+import random
+import re
+import threading
+import time
+from collections.abc import Mapping
+from typing import Any
+
+from github.Requester import (
+    HTTPRequestsConnectionClass,
+    HTTPSRequestsConnectionClass,
+    Requester,
+    RequestsResponse,
+)
+from requests import Session
+
+from crawler.instrumentation import metrics
+
+logger = logging.getLogger(__name__)
+
+SECONDARY_LIMIT_BACKOFF = 60.0
+"""Seconds to back off after the first secondary rate limit without a
+`Retry-After`; doubled for every consecutive one."""
+
+
+def _header(headers: Mapping[str, Any] | None, name: str) -> str | None:
+    """Read a response header case-insensitively.
+
+    :param headers: The response headers, as attached to a `GithubException`.
+    :type headers: Mapping[str, Any] | None
+    :param name: The name of the header to read.
+    :type name: str
+    :return: The value of the header, or `None` if it isn't present.
+    :rtype: str | None
+    """
+    if not headers:
+        return None
+    for key, value in headers.items():
+        if key.lower() == name.lower():
+            return str(value)
+    return None
+
+
+# pylint: disable-next=too-many-instance-attributes
+class RateLimitGovernor:
+    """A thread-safe token bucket for one rate-limit resource.
+
+    :param reserve: The number of requests to hold back from the budget, so
+        in-flight paginated requests don't run it dry.
+    :type reserve: int
+    """
+
+    def __init__(self, reserve: int = 50) -> None:
+        self.reserve = reserve
+        self.limit: int | None = None
+        self.remaining: int | None = None
+        self.reset_at: float = 0.0
+        self.paused_until: float = 0.0
+        self.consecutive_backoffs = 0
+        self.requests = 0
+        """The number of requests let through."""
+        self.waits = 0
+        """The number of requests that had to wait."""
+        self.waited_seconds = 0.0
+        """The total time requests spent waiting."""
+        self.backoffs = 0
+        """The number of times the bucket was paused by a rate-limit error."""
+        self._lock = threading.Lock()
+
+    def observe(
+        self, remaining: int, reset_at: float, limit: int | None = None
+    ) -> None:
+        """Record the `X-RateLimit-Remaining`/`Reset` values a worker saw.
+
+        :param remaining: The number of requests left in the current window.
+        :type remaining: int
+        :param reset_at: The epoch time at which the current window resets.
+        :type reset_at: float
+        :param limit: The number of requests allowed per window, if known.
+        :type limit: int | None
+        """
+        if remaining < 0:
+            # the client hasn't seen any rate-limit headers yet
+            return
+        with self._lock:
+            if limit is not None:
+                self.limit = limit
+            if reset_at > self.reset_at or self.remaining is None:
+                self.remaining, self.reset_at = remaining, reset_at
+            elif reset_at == self.reset_at:
+                self.remaining = min(self.remaining, remaining)
+            if remaining > 0:
+                self.consecutive_backoffs = 0
+
+    def back_off(self, headers: Mapping[str, Any] | None) -> float:
+        """Pause every worker after a rate-limit error.
+
+        Secondary rate limits usually come with a `Retry-After` header, primary
+        ones with `X-RateLimit-Reset`. Without either, back off exponentially.
+        A little jitter keeps the paused workers from all retrying at once.
+
+        :param headers: The headers of the rate-limited response.
+        :type headers: Mapping[str, Any] | None
+        :return: The number of seconds the workers are paused for.
+        :rtype: float
+        """
+        now = time.time()
+        retry_after = _header(headers, "Retry-After")
+        reset = _header(headers, "X-RateLimit-Reset")
+        with self._lock:
+            if retry_after is not None:
+                delay = float(retry_after)
+            elif reset is not None and _header(headers, "X-RateLimit-Remaining") == "0":
+                delay = float(reset) - now + 1
+            else:
+                delay = SECONDARY_LIMIT_BACKOFF * 2**self.consecutive_backoffs
+            delay = max(delay, 1.0) * random.uniform(1.0, 1.2)
+
+            self.consecutive_backoffs += 1
+            self.backoffs += 1
+            self.paused_until = max(self.paused_until, now + delay)
+            delay = self.paused_until - now
+        logger.warning("Rate limited; pausing all workers for %.0fs", delay)
+        return delay
+
+    def wait(self) -> None:
+        """Block until the budget allows another request to be started."""
+        started = time.time()
+        slept = False
+        while True:
+            with self._lock:
+                now = time.time()
+                if self.remaining is not None and now >= self.reset_at:
+                    # the window has reset since the last observation; the
+                    # next response tells how full the bucket is again
+                    self.remaining = None
+                delay = self.paused_until - now
+                if self.remaining is not None and self.remaining <= self.reserve:
+                    delay = max(delay, self.reset_at - now + 1)
+                if delay <= 0:
+                    if self.remaining is not None:
+                        self.remaining -= 1
+                    self.requests += 1
+                    if slept:
+                        self.waits += 1
+                        self.waited_seconds += now - started
+                    return
+            logger.debug("Waiting %.1fs for the rate limit to allow a request", delay)
+            time.sleep(min(delay, 60.0))
+            slept = True
+
+
+buckets: dict[str, RateLimitGovernor] = {
+    "core": RateLimitGovernor(),
+    "search": RateLimitGovernor(reserve=0),
+    "code_search": RateLimitGovernor(reserve=0),
+    "graphql": RateLimitGovernor(reserve=5),
+}
+"""The token bucket of every rate-limit resource, shared by all clients."""
+
+
+def resource_for(path: str) -> str | None:
+    """Work out which rate-limit resource a request draws on.
+
+    :param path: The request path, including any query string.
+    :type path: str
+    :return: The name of the resource, or `None` for requests that don't count
+        against any rate limit.
+    :rtype: str | None
+    """
+    if re.search(r"/rate_limit(\?|$)", path):
+        return None
+    if re.search(r"/search/code(\?|$)", path):
+        return "code_search"
+    if "/search/" in path:
+        return "search"
+    if re.search(r"/graphql(\?|$)", path):
+        return "graphql"
+    return "core"
+
+
+def observe_response(
+    path: str, status: int, headers: Mapping[str, Any], body: str = ""
+) -> None:
+    """Feed a response's rate-limit headers to the matching bucket.
+
+    :param path: The request path, including any query string.
+    :type path: str
+    :param status: The response's status code.
+    :type status: int
+    :param headers: The response headers.
+    :type headers: Mapping[str, Any]
+    :param body: The response body, checked for a secondary rate-limit message.
+    :type body: str
+    """
+    resource = _header(headers, "X-RateLimit-Resource") or resource_for(path)
+    bucket = buckets.get(resource or "")
+    if bucket is None:
+        return
+
+    remaining = _header(headers, "X-RateLimit-Remaining")
+    reset = _header(headers, "X-RateLimit-Reset")
+    limit = _header(headers, "X-RateLimit-Limit")
+    if remaining is not None and reset is not None:
+        bucket.observe(int(remaining), float(reset), int(limit) if limit else None)
+
+    if status in (403, 429) and (
+        remaining == "0"
+        or _header(headers, "Retry-After") is not None
+        or "rate limit" in body.lower()
+    ):
+        bucket.back_off(headers)
+
+
+def poll_rate_limits(requester: Requester) -> None:
+    """Fill every bucket from `/rate_limit`, which doesn't count against it.
+
+    :param requester: The requester of the client to poll with.
+    :type requester: Requester
+    """
+    _, data = requester.requestJsonAndCheck("GET", "/rate_limit")
+    for resource, values in data.get("resources", {}).items():
+        if resource in buckets:
+            buckets[resource].observe(
+                values["remaining"], float(values["reset"]), values["limit"]
+            )
+
+
+def log_rate_limit_waits() -> None:
+    """Log how many requests each bucket let through, and how long they waited."""
+    for resource, bucket in buckets.items():
+        if bucket.requests:
+            logger.info(
+                "%s: %d requests, %d waited %.0fs in total, %d rate-limit backoffs",
+                resource,
+                bucket.requests,
+                bucket.waits,
+                bucket.waited_seconds,
+                bucket.backoffs,
+            )
+
+
+_sessions = threading.local()
+
+
+class _GovernedConnectionMixin:
+    """Take a token from the right bucket before every request, and feed the
+    response's rate-limit headers back to it."""
+
+    protocol: str
+    host: str
+    port: int
+    url: str
+    verb: str
+    session: Session
+
+    def _reuse_session(self) -> None:
+        # PyGithub builds a new connection for every request once custom
+        # connection classes are injected; sharing one session per thread and
+        # host keeps the underlying connections alive between requests
+        if not hasattr(_sessions, "by_host"):
+            _sessions.by_host = {}
+        sessions: dict[tuple[str, str, int], Session] = _sessions.by_host
+        key = (self.protocol, self.host, self.port)
+        if key in sessions:
+            self.session.close()
+            self.session = sessions[key]
+        else:
+            sessions[key] = self.session
+
+    def close(self) -> None:
+        """Keep the shared session open for the next request."""
+
+    def getresponse(self) -> RequestsResponse:
+        """Wait for the budget to allow the request, then send it."""
+        resource = resource_for(self.url)
+        if resource is not None:
+            buckets[resource].wait()
+        started = time.perf_counter()
+        response: RequestsResponse = super().getresponse()  # type: ignore[misc]
+        metrics.record_request(
+            self.verb,
+            self.url,
+            response.status,
+            time.perf_counter() - started,
+            "Link" in response.headers,
+        )
+        observe_response(
+            self.url,
+            response.status,
+            response.headers,
+            response.read() if response.status in (403, 429) else "",
+        )
+        return response
+
+
+class GovernedHTTPSConnection(_GovernedConnectionMixin, HTTPSRequestsConnectionClass):
+    """PyGithub's HTTPS connection, kept inside the rate-limit budget."""
+
+    def __init__(self, *args: Any, **kwargs: Any) -> None:
+        super().__init__(*args, **kwargs)
+        self._reuse_session()
+
+
+class GovernedHTTPConnection(_GovernedConnectionMixin, HTTPRequestsConnectionClass):
+    """PyGithub's plain HTTP connection, kept inside the rate-limit budget."""
+
+    def __init__(self, *args: Any, **kwargs: Any) -> None:
+        super().__init__(*args, **kwargs)
+        self._reuse_session()
+
+
+def install_rate_governor() -> None:
+    """Put the rate-limit buckets underneath every PyGithub client created from
+    now on. (The HTTP cache installs them along with itself.)"""
+    Requester.injectConnectionClasses(GovernedHTTPConnection, GovernedHTTPSConnection)
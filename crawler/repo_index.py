@@ -0,0 +1,184 @@
+"""
+Repo Index
+----------
+
+Tell repos apart by their Github ID, rather than by URL. A renamed or
+transferred repo keeps its ID, while Github redirects its old URL to the new
+one, so the taxonomy (or a code search) can know the same repo by several
+URLs. Compared as URLs, those look like different repos: the crawl adds them
+again, and the contributor count fetches (and counts) them twice.
+
+The index maps every URL a repo has been seen under (its `owner/name`,
+lower-cased) to the repo's database ID, GraphQL node ID and current URL. It's
+filled in from the repos in code search results, which come with their IDs,
+and from batched GraphQL lookups of the URLs it doesn't know yet (see
+`resolve_repo_ids` in `search_github.py`). URLs that don't resolve to any
+repo are remembered too, and every URL is looked up again once it's been
+`REPO_INDEX_TTL_DAYS` days since the last time.
+
+The index is a small SQLite database at `out/cache/repo_index.sqlite`, shared
+by the crawl, the counts and any count shards running alongside.
+"""
+
+import datetime
+import logging
+import sqlite3
+from collections.abc import Iterable
+from typing import NamedTuple
+
+from crawler.activity import repo_key
+from crawler.cache import cache_dir
+from crawler.constants import REPO_INDEX_TTL_DAYS
+
+logger = logging.getLogger(__name__)
+
+
+class RepoIdentity(NamedTuple):
+    """A repo, as Github knows it now."""
+
+    id: int
+    """The repo's database ID, as in the REST API."""
+
+    node_id: str
+    """The repo's GraphQL node ID."""
+
+    url: str
+    """The repo's current URL."""
+
+
+def canonical_url(repo: str, repo_ids: dict[str, RepoIdentity | None]) -> str:
+    """Return the URL a repo goes by now, if it's known.
+
+    :param repo: The URL of the repository.
+    :type repo: str
+    :param repo_ids: The identities of the repos, keyed by lower-cased URL.
+    :type repo_ids: dict[str, RepoIdentity | None]
+    :return: The repo's current URL, or the one given if that isn't known.
+    :rtype: str
+    """
+    identity = repo_ids.get(repo.lower())
+    return identity.url if identity is not None else repo
+
+
+def identity_key(repo: str, repo_ids: dict[str, RepoIdentity | None]) -> int | str:
+    """Return what tells a repo apart from the others: its ID, if it's known.
+
+    :param repo: The URL of the repository.
+    :type repo: str
+    :param repo_ids: The identities of the repos, keyed by lower-cased URL.
+    :type repo_ids: dict[str, RepoIdentity | None]
+    :return: The repo's ID, or its lower-cased URL if its ID isn't known.
+    :rtype: int | str
+    """
+    identity = repo_ids.get(repo.lower())
+    return identity.id if identity is not None else repo.lower()
+
+
+class RepoIndex:
+    """The Github IDs of the repos, keyed by every URL they've been seen under.
+
+    :param filepath: Where the SQLite database lives. Defaults to
+        `out/cache/repo_index.sqlite` in the current working directory.
+    :type filepath: str | None
+    """
+
+    def __init__(self, filepath: str | None = None) -> None:
+        if filepath is None:
+            filepath = f"{cache_dir()}/repo_index.sqlite"
+        self.filepath = filepath
+        # the count shards' worker processes share the index
+        self.connection = sqlite3.connect(filepath, timeout=30.0)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.executescript("""
+            CREATE TABLE IF NOT EXISTS repos (
+                id INTEGER PRIMARY KEY,
+                node_id TEXT NOT NULL,
+                url TEXT NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS aliases (
+                alias TEXT PRIMARY KEY,
+                id INTEGER,
+                checked_at INTEGER NOT NULL
+            ) WITHOUT ROWID;
+            """)
+
+    def __enter__(self) -> "RepoIndex":
+        return self
+
+    def __exit__(self, *_: object) -> None:
+        self.close()
+
+    def close(self) -> None:
+        """Commit any pending changes and close the database."""
+        self.connection.commit()
+        self.connection.close()
+
+    def record(self, found: dict[str, RepoIdentity | None]) -> None:
+        """Remember which repo each URL leads to, as of now.
+
+        :param found: The identity of the repo each URL leads to, or `None` if
+            it doesn't lead to any.
+        :type found: dict[str, RepoIdentity | None]
+        """
+        now = int(datetime.datetime.now(datetime.timezone.utc).timestamp())
+        identities = {
+            identity.id: identity for identity in found.values() if identity
+        }.values()
+        with self.connection:
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO repos VALUES (?, ?, ?)", identities
+            )
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO aliases VALUES (?, ?, ?)",
+                (
+                    (repo_key(url), identity.id if identity else None, now)
+                    for url, identity in [
+                        *found.items(),
+                        *((identity.url, identity) for identity in identities),
+                    ]
+                ),
+            )
+
+    def lookup(self, repos: Iterable[str]) -> dict[str, RepoIdentity | None]:
+        """Find out which repo each URL leads to, as far as the index knows.
+
+        :param repos: The URLs of the repositories.
+        :type repos: Iterable[str]
+        :return: The identity of the repo each URL leads to, or `None` if it
+            leads to none, for the URLs the index knows (and has checked within
+            the last `REPO_INDEX_TTL_DAYS` days), keyed by lower-cased URL.
+        :rtype: dict[str, RepoIdentity | None]
+        """
+        fresh_since = datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(
+            days=REPO_INDEX_TTL_DAYS
+        )
+        query = (
+            "SELECT aliases.id, repos.node_id, repos.url FROM aliases "
+            "LEFT JOIN repos ON repos.id = aliases.id "
+            "WHERE aliases.alias = ? AND aliases.checked_at >= ?"
+        )
+        known: dict[str, RepoIdentity | None] = {}
+        for repo in repos:
+            row = self.connection.execute(
+                query, (repo_key(repo), int(fresh_since.timestamp()))
+            ).fetchone()
+            if row is None:
+                continue
+            repo_id, node_id, url = row
+            known[repo.lower()] = (
+                None if repo_id is None else RepoIdentity(repo_id, node_id, url)
+            )
+        return known
+
+    def current_urls(self, repos: Iterable[str]) -> dict[str, str]:
+        """Find out the URL each repo goes by now, as far as the index knows.
+
+        :param repos: The URLs of the repositories.
+        :type repos: Iterable[str]
+        :return: The current URL of each repo, or the URL given if the index
+            doesn't know of another.
+        :rtype: dict[str, str]
+        """
+        repos = list(repos)
+        repo_ids = self.lookup(repos)
+        return {repo: canonical_url(repo, repo_ids) for repo in repos}
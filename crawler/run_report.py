@@ -0,0 +1,237 @@
+"""
+Run Report
+----------
+
+Write a machine-readable report at the end of every run, so slow runs can be
+picked apart and regressions tracked across scheduled runs: the time spent in
+each stage and subprocess, the requests made to each Github endpoint, the time
+spent waiting on rate limits, and how often the HTTP cache answered instead of
+Github.
+
+Reports are written as JSON under `out/reports/`, and (when
+`PROMETHEUS_TEXTFILE` is set) as Prometheus metrics too.
+"""
+
+import datetime
+import json
+import logging
+import os
+import time
+from collections.abc import Iterator
+from contextlib import contextmanager
+from typing import Any
+
+from crawler.constants import PROMETHEUS_TEXTFILE
+from crawler.http_cache import active_http_cache
+from crawler.instrumentation import StageTiming, metrics
+from crawler.ratelimit import buckets
+
+logger = logging.getLogger(__name__)
+
+
+def _timings(timings: dict[str, StageTiming]) -> dict[str, dict[str, Any]]:
+    return {
+        name: {
+            "calls": timing.calls,
+            "seconds": round(timing.seconds, 3),
+            "items": timing.items,
+            "items_per_second": (
+                round(timing.items / timing.seconds, 2) if timing.seconds else None
+            ),
+        }
+        for name, timing in sorted(timings.items())
+    }
+
+
+def build_run_report(command: str, status: str) -> dict[str, Any]:
+    """Gather the metrics of the current run into a report.
+
+    :param command: The command that was run, e.g. `count_contrib`.
+    :type command: str
+    :param status: How the run ended: `ok` or `failed`.
+    :type status: str
+    :return: The report, ready to be written as JSON.
+    :rtype: dict[str, Any]
+    """
+    finished_at = time.time()
+    endpoints = {
+        endpoint: {
+            "calls": calls.calls,
+            "pages": calls.pages,
+            "errors": calls.errors,
+            "seconds": round(calls.seconds, 3),
+        }
+        for endpoint, calls in sorted(metrics.endpoints.items())
+    }
+    http_cache = active_http_cache()
+    cache_report: dict[str, Any] | None = None
+    if http_cache is not None:
+        answered = http_cache.hits + http_cache.revalidated
+        looked_up = answered + http_cache.misses
+        cache_report = {
+            "hits": http_cache.hits,
+            "revalidated": http_cache.revalidated,
+            "misses": http_cache.misses,
+            "hit_rate": round(answered / looked_up, 3) if looked_up else None,
+        }
+
+    return {
+        "command": command,
+        "status": status,
+        "started_at": datetime.datetime.fromtimestamp(
+            metrics.started_at, datetime.timezone.utc
+        ).isoformat(),
+        "finished_at": datetime.datetime.fromtimestamp(
+            finished_at, datetime.timezone.utc
+        ).isoformat(),
+        "wall_seconds": round(finished_at - metrics.started_at, 3),
+        "stages": _timings(metrics.stages),
+        "subprocesses": _timings(metrics.subprocesses),
+        "api": {
+            "calls": sum(e["calls"] for e in endpoints.values()),
+            "pages": sum(e["pages"] for e in endpoints.values()),
+            "errors": sum(e["errors"] for e in endpoints.values()),
+            "endpoints": endpoints,
+        },
+        "rate_limits": {
+            resource: {
+                "requests": bucket.requests,
+                "waits": bucket.waits,
+                "waited_seconds": round(bucket.waited_seconds, 3),
+                "backoffs": bucket.backoffs,
+                "limit": bucket.limit,
+                "remaining": bucket.remaining,
+            }
+            for resource, bucket in buckets.items()
+        },
+        "http_cache": cache_report,
+    }
+
+
+_PROMETHEUS_METRICS = [
+    ("stage_seconds", "The time spent in each stage.", "stage", "seconds"),
+    ("stage_items", "The items each stage got through.", "stage", "items"),
+    ("subprocess_seconds", "The time each subprocess ran.", "subprocess", "seconds"),
+    ("api_calls", "The requests made to each endpoint.", "endpoint", "calls"),
+    ("api_pages", "The pages of listings fetched.", "endpoint", "pages"),
+    ("api_errors", "The requests that failed.", "endpoint", "errors"),
+    (
+        "rate_limit_waited_seconds",
+        "The time spent waiting on each rate limit.",
+        "resource",
+        "waited_seconds",
+    ),
+    (
+        "rate_limit_backoffs",
+        "The times each rate limit was hit.",
+        "resource",
+        "backoffs",
+    ),
+    (
+        "http_cache_responses",
+        "The responses looked up in the HTTP cache, by result.",
+        "result",
+        "responses",
+    ),
+]
+"""The metrics written for Prometheus: their names, descriptions, the label
+telling their samples apart, and the field of the report each sample is from."""
+
+
+def _label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def format_prometheus(report: dict[str, Any]) -> str:
+    """Render a run report as metrics in the Prometheus text format.
+
+    :param report: A report from `build_run_report`.
+    :type report: dict[str, Any]
+    :return: The metrics, one sample per line.
+    :rtype: str
+    """
+    command = f'command="{_label(report["command"])}"'
+    http_cache = report["http_cache"] or {}
+    by_label: dict[str, dict[str, dict[str, Any]]] = {
+        "stage": report["stages"],
+        "subprocess": report["subprocesses"],
+        "endpoint": report["api"]["endpoints"],
+        "resource": report["rate_limits"],
+        "result": {
+            result: {"responses": http_cache[result]}
+            for result in ("hits", "revalidated", "misses")
+            if result in http_cache
+        },
+    }
+
+    lines = [
+        "# HELP ec_crawler_run_success Whether the run succeeded.",
+        "# TYPE ec_crawler_run_success gauge",
+        f"ec_crawler_run_success{{{command}}} {int(report['status'] == 'ok')}",
+        "# HELP ec_crawler_run_wall_seconds The run's wall time.",
+        "# TYPE ec_crawler_run_wall_seconds gauge",
+        f"ec_crawler_run_wall_seconds{{{command}}} {report['wall_seconds']}",
+    ]
+    for name, doc, label, field in _PROMETHEUS_METRICS:
+        if not by_label[label]:
+            continue
+        lines.append(f"# HELP ec_crawler_{name} {doc}")
+        lines.append(f"# TYPE ec_crawler_{name} gauge")
+        lines.extend(
+            f'ec_crawler_{name}{{{command},{label}="{_label(key)}"}} {values[field]}'
+            for key, values in by_label[label].items()
+        )
+    return "\n".join(lines) + "\n"
+
+
+def _write_atomically(filepath: str, text: str) -> None:
+    with open(f"{filepath}.tmp", "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(f"{filepath}.tmp", filepath)
+
+
+def write_run_report(command: str, status: str) -> str:
+    """Write the current run's report under `out/reports/`.
+
+    The report is written twice: once named after the run's start time, and
+    once as `<command>-latest.json`. The Prometheus metrics (if enabled)
+    replace the previous run's.
+
+    :param command: The command that was run, e.g. `count_contrib`.
+    :type command: str
+    :param status: How the run ended: `ok` or `failed`.
+    :type status: str
+    :return: The path of the timestamped report.
+    :rtype: str
+    """
+    report = build_run_report(command, status)
+    out_dirpath = f"{os.getcwd()}/out/reports"
+    os.makedirs(out_dirpath, exist_ok=True)
+    started = datetime.datetime.fromtimestamp(metrics.started_at).strftime(
+        "%Y-%m-%dT%H%M%S"
+    )
+    text = json.dumps(report, indent=2)
+    filepath = f"{out_dirpath}/{command}-{started}.json"
+    _write_atomically(filepath, text)
+    _write_atomically(f"{out_dirpath}/{command}-latest.json", text)
+    logger.info("Wrote the run report to %s", filepath)
+
+    if PROMETHEUS_TEXTFILE:
+        _write_atomically(PROMETHEUS_TEXTFILE, format_prometheus(report))
+        logger.info("Wrote the run metrics to %s", PROMETHEUS_TEXTFILE)
+    return filepath
+
+
+@contextmanager
+def reporting(command: str) -> Iterator[None]:
+    """Write a run report once the run ends, whether it succeeded or not.
+
+    :param command: The command being run, e.g. `count_contrib`.
+    :type command: str
+    """
+    status = "failed"
+    try:
+        yield
+        status = "ok"
+    finally:
+        write_run_report(command, status)
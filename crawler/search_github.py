@@ -8,124 +8,619 @@ of an org's public repositories, build search queries from the defined
 results.
 """
 
+import base64
 import datetime
 import logging
+import math
+import threading
+from collections.abc import Iterable, Iterator
+from concurrent.futures import ThreadPoolExecutor
 
 from github import Auth, Github, GithubException
-from github.GithubException import UnknownObjectException
+from github.GithubException import RateLimitExceededException, UnknownObjectException
+from github.Repository import Repository
 
-from crawler.constants import GITHUB_TOKEN, SEARCH_QUERIES
+from crawler.activity import (
+    classify_repos,
+    group_by_owner,
+    list_owner_activity,
+    load_pushed_at,
+    record_pushed_at,
+    store_pushed_at,
+)
+from crawler.checkpoint import CrawlCheckpoint, QueryProgress
+from crawler.commit_store import CommitRecord, CommitStore, contributor_window
+from crawler.constants import (
+    ACTIVITY_LISTING_MAX_PAGES,
+    ACTIVITY_LISTING_MIN_REPOS,
+    COMMIT_RETENTION_DAYS,
+    COMMIT_WATERMARK_OVERLAP_HOURS,
+    CONTRIBUTOR_BACKEND,
+    CONTRIBUTOR_WORKERS,
+    GITHUB_API_URL,
+    GITHUB_TOKEN,
+    GRAPHQL_BATCH_SIZE,
+    HTTP_CACHE_MAX_MB,
+    MANIFEST_WORKERS,
+    SEARCH_KNOWN_RUN,
+    SEARCH_QUERIES,
+)
+from crawler.github_graphql import (
+    GraphqlRateLimited,
+    fetch_batch_commits,
+    fetch_repo_identities,
+)
+from crawler.http_cache import install_http_cache
+from crawler.instrumentation import stage
+from crawler.manifests import (
+    ManifestCache,
+    manifest_kind,
+    matches_keyword,
+    parse_manifest,
+)
+from crawler.query_planner import plan_search_queries, search_keywords
+from crawler.ratelimit import (
+    buckets,
+    install_rate_governor,
+    log_rate_limit_waits,
+    poll_rate_limits,
+)
+from crawler.repo_index import RepoIdentity, RepoIndex
+from crawler.search_history import SearchHistory, ShardHistory
+from crawler.sharding import SEARCH_RESULT_LIMIT, plan_shards
 
 logging.getLogger("github.Requester").setLevel(logging.CRITICAL)
 logger = logging.getLogger(__name__)
 
+# must come before any client is created, so they all pick up the cache and
+# the rate-limit buckets, which pace requests instead of fixed sleeps
+if HTTP_CACHE_MAX_MB > 0:
+    install_http_cache(HTTP_CACHE_MAX_MB * 1024 * 1024)
+else:
+    install_rate_governor()
+
 auth = Auth.Token(GITHUB_TOKEN) if GITHUB_TOKEN else None
-g = {
-    "code": Github(
-        auth=auth,
-        per_page=100,
-        seconds_between_requests=7.1,
-    ),
-    "contrib": Github(
+
+
+def new_client() -> Github:
+    """Create a Github client for the configured API and token.
+
+    PyGithub's own throttling is turned off, including its one-second pause
+    between `POST`s (which GraphQL queries are, too): the rate-limit buckets
+    pace every request instead.
+
+    :return: A new `Github` client.
+    :rtype: Github
+    """
+    return Github(
         auth=auth,
+        base_url=GITHUB_API_URL,
         per_page=100,
         seconds_between_requests=0,
-    ),
-}
+        seconds_between_writes=0,
+    )
+
+
+g = {"code": new_client(), "contrib": new_client()}
+
+
+def use_token(token: str | None) -> None:
+    """Switch this process's clients over to another token, e.g. the one handed
+    to a shard of a contributor count.
+
+    Only clients created from now on (and the shared ones in `g`, which are
+    replaced) use the new token, so call this before any requests go out.
+
+    :param token: The Personal Access Token to authenticate with, if any.
+    :type token: str | None
+    """
+    global auth  # pylint: disable=global-statement
+    auth = Auth.Token(token) if token else None
+    for name in g:
+        g[name] = new_client()
+
+
+search_plan = plan_search_queries(SEARCH_QUERIES)
+"""The search query strings actually run for each ecosystem in `SEARCH_QUERIES`."""
+
+_worker_clients = threading.local()
 
+_WATERMARK_OVERLAP = datetime.timedelta(hours=COMMIT_WATERMARK_OVERLAP_HOURS)
 
-def build_search_query(query: dict[str, str]) -> str:
-    """Build a search query string based on the given criteria.
 
-    :param query: The dictionary of query qualifiers, keyed by available Github
-        `API search query qualifiers
-        <https://docs.github.com/search-github/searching-on-github/searching-code>`_
-    :type query: dict[str, str]
-    :return: The formatted query string to use in the Github search request.
-    :rtype: str
+def contrib_client() -> Github:
+    """Return the contributor-counting client for the current thread.
+
+    PyGithub clients keep per-request state on their connection, so concurrent
+    workers each get their own client (sharing the same token and budget).
+
+    :return: A `Github` client configured like `g["contrib"]`.
+    :rtype: Github
+    """
+    if threading.current_thread() is threading.main_thread():
+        return g["contrib"]
+    if not hasattr(_worker_clients, "client"):
+        _worker_clients.client = new_client()
+    return _worker_clients.client
+
+
+def fetch_search_page(
+    search: str, checkpoint: CrawlCheckpoint, past: ShardHistory | None = None
+) -> QueryProgress:
+    """Fetch the next page of code search results for a query, then save it.
+
+    Results are fetched most recently indexed first, so that an incremental
+    search can stop as soon as it gets to the ones it has seen before.
+
+    :param search: The search query string.
+    :type search: str
+    :param checkpoint: The crawl journal, whose progress for the query is
+        updated with the repository URLs found, the total number of results,
+        and whether that was the last page Github will serve.
+    :type checkpoint: CrawlCheckpoint
+    :param past: What earlier crawls found for the query, to search it
+        incrementally. The search is done once it reaches the results of the
+        last crawl, or `SEARCH_KNOWN_RUN` results in a row of known repos.
+    :type past: ShardHistory | None
+    :return: The query's progress. Only the repos whose manifests really
+        depend on one of the query's keywords are added to it (see
+        `verify_hits`).
+    :rtype: QueryProgress
+    """
+    progress = checkpoint.query(search)
+    code_results = g["code"].search_code(search, sort="indexed", order="desc")
+    results = code_results.get_page(progress.next_page)
+    # Github never serves more than `SEARCH_RESULT_LIMIT` results
+    served = min(code_results.totalCount, SEARCH_RESULT_LIMIT)
+
+    # the results come with their repos' IDs, for the repo index
+    with RepoIndex() as index:
+        index.record(
+            {
+                res.repository.html_url: RepoIdentity(
+                    res.repository.id, res.repository.node_id, res.repository.html_url
+                )
+                for res in results
+            }
+        )
+
+    hits: list[tuple[str, str, str]] = []
+    known_run = progress.known_run
+    reached_known = False
+    for res in results:
+        result = f"{res.html_url}@{res.sha}"
+        if past is not None and result == past.mark:
+            reached_known = True
+            break
+        repo = res.repository.html_url
+        hits.append((repo, res.path, res.sha))
+        if past is not None:
+            known_run = known_run + 1 if repo.lower() in past.lower_repos else 0
+            if known_run >= SEARCH_KNOWN_RUN:
+                reached_known = True
+                break
+
+    # repos found (and verified) before are already among the query's results
+    with checkpoint.lock:
+        seen = {repo.lower() for repo in progress.repos}
+    if past is not None:
+        seen |= past.lower_repos
+    repos = verify_hits(
+        [hit for hit in hits if hit[0].lower() not in seen], search_keywords(search)
+    )
+
+    with checkpoint.lock:
+        if progress.next_page == 0 and results:
+            progress.first_result = f"{results[0].html_url}@{results[0].sha}"
+        progress.repos.update(repos)
+        progress.next_page += 1
+        progress.total_count = code_results.totalCount
+        progress.known_run = known_run
+        progress.done = (
+            not results
+            or reached_known
+            or progress.next_page * g["code"].per_page >= served
+        )
+        checkpoint.save()
+    return progress
+
+
+def _fetch_manifest(repo: str, sha: str) -> tuple[bytes | None, bool]:
+    """Fetch a manifest by its blob SHA.
+
+    :return: The manifest's content, or `None` if it couldn't be fetched, and
+        whether it's gone (along with its repo, most likely).
     """
-    query_parts: list[str] = []
+    owner, project = repo.split("/")[-2:]
+    client = contrib_client()
+    # the blob is all that's needed, not the repository itself
+    repository = Repository(
+        client.requester.withLazy(True), url=f"/repos/{owner}/{project}"
+    )
+    try:
+        blob = repository.get_git_blob(sha)
+        return base64.b64decode(blob.content), False
+    except UnknownObjectException:
+        return None, True
+    except GithubException as err:
+        logger.warning("Could not fetch %s's manifest %s: %s", repo, sha, err)
+        return None, False
 
-    if "filename" in query:
-        query_parts.append(f"filename:{query['filename']}")
-    if "path" in query:
-        query_parts.append(f"path:{query['path']}")
-    if "keyword" in query:
-        query_parts.append(f"{query['keyword']}")
 
-    query_parts.append("sort:updated")
-    return " ".join(query_parts)
+def verify_hits(
+    hits: Iterable[tuple[str, str, str]],
+    keywords: list[str],
+    workers: int = MANIFEST_WORKERS,
+) -> set[str]:
+    """Check which code search hits really depend on one of the keywords.
 
+    Each hit's manifest is parsed for its dependencies, which are kept by blob
+    SHA (see `manifests.py`), so only the manifests never seen before are
+    fetched. Hits in files there's no parser for, that don't parse, or that
+    can't be fetched right now are given the benefit of the doubt.
 
-def search_gh_repos(ecosystem_name: str) -> set[str]:
+    :param hits: The repository URL, file path and blob SHA of each hit.
+    :type hits: Iterable[tuple[str, str, str]]
+    :param keywords: The keywords that were searched for.
+    :type keywords: list[str]
+    :param workers: The number of manifests to fetch concurrently.
+    :type workers: int
+    :return: The URLs of the repos with a verified hit.
+    :rtype: set[str]
+    """
+    verified: set[str] = set()
+    repos_by_blob: dict[tuple[str, str], list[str]] = {}
+    for repo, path, sha in hits:
+        kind = manifest_kind(path)
+        if kind is None:
+            verified.add(repo)
+        else:
+            repos_by_blob.setdefault((sha, kind), []).append(repo)
+    if not repos_by_blob:
+        return verified
+
+    with ManifestCache() as cache:
+        dependencies = cache.lookup(repos_by_blob)
+    unknown = [blob for blob in repos_by_blob if blob not in dependencies]
+    if unknown:
+        parsed: dict[tuple[str, str], set[str] | None] = {}
+        with stage("verify manifests") as fetched:
+            with ThreadPoolExecutor(max_workers=max(workers, 1)) as executor:
+                contents = executor.map(
+                    lambda blob: _fetch_manifest(repos_by_blob[blob][0], blob[0]),
+                    unknown,
+                )
+                for (sha, kind), (content, gone) in zip(unknown, contents):
+                    if gone:
+                        dependencies[sha, kind] = set()
+                    elif content is None:
+                        # trusted this time, but not remembered
+                        dependencies[sha, kind] = None
+                    else:
+                        parsed[sha, kind] = parse_manifest(kind, content)
+                        dependencies[sha, kind] = parsed[sha, kind]
+            fetched.items = len(parsed)
+        with ManifestCache() as cache:
+            cache.record(parsed)
+
+    rejected = 0
+    for blob, repos in repos_by_blob.items():
+        names = dependencies[blob]
+        if names is None or matches_keyword(names, keywords):
+            verified.update(repos)
+        else:
+            rejected += 1
+    if rejected:
+        logger.debug(
+            "%d of %d manifests don't depend on %s",
+            rejected,
+            len(repos_by_blob),
+            " or ".join(keywords),
+        )
+    return verified
+
+
+def run_search(
+    search: str, checkpoint: CrawlCheckpoint, history: SearchHistory | None = None
+) -> set[str]:
+    """Find every repository matching a search query, sharding it if needed.
+
+    :param search: The search query string.
+    :type search: str
+    :param checkpoint: The crawl journal, saved after every page.
+    :type checkpoint: CrawlCheckpoint
+    :param history: The search history of earlier crawls. Given one, the query
+        is only searched for results that are new since, unless it's due a
+        full sweep. Either way, what it finds is recorded in the history.
+    :type history: SearchHistory | None
+    :return: A set of unique repository URLs
+    :rtype: set[str]
+    """
+    progress = checkpoint.query(search)
+    if progress.done:
+        return progress.repos
+
+    def count(shard: str) -> int:
+        # the first page of every shard is fetched for its total anyway, so
+        # it's kept, rather than fetched again when the shard is run
+        shard_progress = checkpoint.query(shard)
+        if shard_progress.total_count is None:
+            shard_progress = fetch_search_page(shard, checkpoint)
+        return shard_progress.total_count or 0
+
+    swept = history.incremental(search) if history is not None else None
+    if progress.shards is None and swept is not None:
+        # the shards of the last full sweep still partition the results
+        logger.debug("Searching for %s since the last crawl", search)
+        with checkpoint.lock:
+            progress.shards = swept.shards
+            checkpoint.save()
+    elif progress.shards is None:
+        logger.debug("Searching for %s", search)
+        shards = plan_shards(search, count)
+        with checkpoint.lock:
+            progress.shards = shards
+            checkpoint.save()
+        pages = sum(
+            math.ceil(min(count(shard), SEARCH_RESULT_LIMIT) / g["code"].per_page)
+            for shard in progress.shards
+        )
+        logger.info(
+            "Searching %d shards in about %d pages", len(progress.shards), pages
+        )
+
+    found_repos: set[str] = set()
+    for shard in progress.shards:
+        past = history.shard(shard) if history is not None and swept else None
+        shard_progress = checkpoint.query(shard)
+        while not shard_progress.done:
+            shard_progress = fetch_search_page(shard, checkpoint, past)
+        found_repos.update(shard_progress.repos)
+        if past is not None:
+            found_repos.update(past.repos)
+        if history is not None:
+            history.record_shard(
+                shard,
+                ShardHistory(set(shard_progress.repos), shard_progress.first_result),
+                full=past is None,
+            )
+
+    if history is not None and swept is None:
+        history.record_sweep(search, progress.shards)
+    with checkpoint.lock:
+        progress.repos = found_repos
+        progress.done = True
+        checkpoint.save()
+    return found_repos
+
+
+def search_gh_repos(
+    ecosystem_name: str,
+    checkpoint: CrawlCheckpoint | None = None,
+    history: SearchHistory | None = None,
+) -> set[str]:
     """Use Github's code search API to find repositories in the ecosystem.
 
+    Queries matching more results than Github will serve are split into shards
+    by file size, so none of their results are missed.
+
     :param ecosystem_name: The name of the ecosystem to find repositories for.
     :type ecosystem_name: str
+    :param checkpoint: The crawl journal. Queries it has already finished are
+        answered from it, and unfinished ones resume from the next page.
+    :type checkpoint: CrawlCheckpoint | None
+    :param history: The search history of earlier crawls, to only search for
+        results that are new since (see `search_history.py`).
+    :type history: SearchHistory | None
     :return: A set of unique repository URLs
     :rtype: set[str]
     """
+    if checkpoint is None:
+        checkpoint = CrawlCheckpoint(filepath=None)
     found_repos: set[str] = set()
 
-    if ecosystem_name in SEARCH_QUERIES:
+    if ecosystem_name in search_plan:
         logger.info("Searching code in the %s ecosystem", ecosystem_name)
-        for query in SEARCH_QUERIES[ecosystem_name]:
-            search = build_search_query(query)
-            logger.debug("Searching for %s", search)
-            code_results = g["code"].search_code(search)
-            for res in code_results:
-                found_repos.add(res.repository.html_url)
+        with stage("code search") as searched:
+            for search in search_plan[ecosystem_name]:
+                found_repos.update(run_search(search, checkpoint, history))
+            searched.items = len(found_repos)
 
     return found_repos
 
 
-def get_contributors(ecosystem_repos_set: set[str]) -> set[str]:
-    """Use Github's commit search API to find contributors to the repos
+def report_search_plan(checkpoint: CrawlCheckpoint | None = None) -> int:
+    """Log what a crawl's code searches will cost, before running any of them.
 
-    :param ecosystem_repos_set: The set of unique repos for the ecosystem.
-    :type ecosystem_repos_set: set[str]
-    :return: A set of unique Github usernames
-    :rtype: set[str]
+    Until a search has run, its number of results is unknown, so it's counted
+    as a single page. The estimate is a lower bound for searches that go on to
+    need more pages (or shards).
+
+    :param checkpoint: The crawl journal, whose finished searches cost nothing
+        and whose started ones only cost their remaining pages.
+    :type checkpoint: CrawlCheckpoint | None
+    :return: The estimated number of search requests.
+    :rtype: int
     """
-    contributors: set[str] = set()
-    for repo in ecosystem_repos_set:
-        logger.debug("checking for commits in repo: %s", repo)
-        project = repo.split("/")[-1]
-        owner = repo.split("/")[-2]
+    try:
+        poll_rate_limits(g["code"].requester)
+    except GithubException as err:
+        logger.warning("Could not poll the rate limits: %s", err)
+
+    searches = {search for plan in search_plan.values() for search in plan}
+    requests = 0
+    for search in searches:
+        progress = checkpoint.queries.get(search) if checkpoint else None
+        if progress is None or progress.total_count is None:
+            requests += 1
+        elif not progress.done:
+            served = min(progress.total_count, SEARCH_RESULT_LIMIT)
+            pages = math.ceil(served / g["code"].per_page)
+            requests += max(pages - progress.next_page, 0)
 
+    logger.info(
+        "Planned %d searches for %d search queries: at least %d requests, "
+        "taking at least %d minutes",
+        len(searches),
+        sum(len(queries) for queries in SEARCH_QUERIES.values()),
+        requests,
+        # code search allows `limit` requests per minute
+        math.ceil(requests / (buckets["code_search"].limit or 10)),
+    )
+    return requests
+
+
+def _fetch_repo_identities(repos: list[str]) -> dict[str, RepoIdentity | None]:
+    """Look up a batch of repos' identities, retrying after rate-limit errors."""
+    for _ in range(3):
         try:
-            now = datetime.datetime.now(datetime.timezone.utc)
-            # now = datetime.datetime(2025, 4, 1, 0, 0, tzinfo=datetime.timezone.utc)
-            thirty_days_ago = now - datetime.timedelta(days=30)
-            # thirty_days_ago = datetime.datetime(
-            #     2025, 3, 1, 0, 0, tzinfo=datetime.timezone.utc
-            # )
-            repository = g["contrib"].get_repo(f"{owner}/{project}")
-            if (
-                repository
-                and repository.pushed_at
-                and not repository.archived
-                and thirty_days_ago <= repository.pushed_at
-            ):
-                commits = repository.get_commits(
-                    since=thirty_days_ago,
-                    until=now,
+            return fetch_repo_identities(contrib_client().requester, repos)
+        except GraphqlRateLimited as err:
+            buckets["graphql"].back_off(err.headers)
+        except RateLimitExceededException:
+            logger.warning(
+                "Rate limited while looking up %d repos, retrying", len(repos)
+            )
+        except GithubException as err:
+            logger.warning("Could not look up %d repos: %s", len(repos), err)
+            return {}
+
+    logger.error("Giving up on %d repos after repeated rate limiting", len(repos))
+    return {}
+
+
+def resolve_repo_ids(
+    repos: Iterable[str], workers: int = CONTRIBUTOR_WORKERS
+) -> dict[str, RepoIdentity | None]:
+    """Find out which repo each URL leads to, looking up the ones the repo index
+    doesn't know yet in batches of `GRAPHQL_BATCH_SIZE`.
+
+    :param repos: The URLs of the repositories.
+    :type repos: Iterable[str]
+    :param workers: The number of lookups to run concurrently.
+    :type workers: int
+    :return: The identity of the repo each URL leads to, or `None` if it leads
+        to none, keyed by lower-cased URL. URLs that couldn't be looked up are
+        left out.
+    :rtype: dict[str, RepoIdentity | None]
+    """
+    repos = set(repos)
+    with RepoIndex() as index:
+        repo_ids = index.lookup(repos)
+    unknown = sorted(repo for repo in repos if repo.lower() not in repo_ids)
+    if not unknown:
+        return repo_ids
+
+    batches = [
+        unknown[i : i + GRAPHQL_BATCH_SIZE]
+        for i in range(0, len(unknown), GRAPHQL_BATCH_SIZE)
+    ]
+    found: dict[str, RepoIdentity | None] = {}
+    with stage("resolve repo ids") as resolved:
+        with ThreadPoolExecutor(max_workers=max(workers, 1)) as executor:
+            for identities in executor.map(_fetch_repo_identities, batches):
+                found.update(identities)
+        resolved.items = len(found)
+    logger.info(
+        "Looked up %d repos: %d renamed or moved, %d gone",
+        len(found),
+        sum(
+            identity is not None and identity.url.lower() != repo.lower()
+            for repo, identity in found.items()
+        ),
+        sum(identity is None for identity in found.values()),
+    )
+
+    with RepoIndex() as index:
+        index.record(found)
+    repo_ids.update((repo.lower(), identity) for repo, identity in found.items())
+    return repo_ids
+
+
+def get_repo_commits(
+    repo: str,
+    since: datetime.datetime,
+    until: datetime.datetime,
+    known_active: bool = False,
+) -> list[CommitRecord]:
+    """Find the (non-bot) commits to a single repo within the given window.
+
+    :param repo: The URL of the repository.
+    :type repo: str
+    :param since: The start of the window to look for commits in.
+    :type since: datetime.datetime
+    :param until: The end of the window to look for commits in.
+    :type until: datetime.datetime
+    :param known_active: Whether the repo is already known to have been pushed
+        to within the window, so the check (and its request) can be skipped.
+    :type known_active: bool
+    :return: The commits, each attributed to a lower-cased Github username.
+    :rtype: list[CommitRecord]
+    """
+    logger.debug("checking for commits in repo: %s", repo)
+    project = repo.split("/")[-1]
+    owner = repo.split("/")[-2]
+    client = contrib_client()
+
+    records: list[CommitRecord] = []
+    if known_active:
+        # a lazy repository doesn't fetch itself until an attribute is read
+        repository = Repository(
+            client.requester.withLazy(True), url=f"/repos/{owner}/{project}"
+        )
+    else:
+        repository = client.get_repo(f"{owner}/{project}")
+        record_pushed_at(repo, repository.pushed_at)
+
+    if known_active or (
+        repository
+        and repository.pushed_at
+        and not repository.archived
+        and since <= repository.pushed_at
+    ):
+        commits = repository.get_commits(since=since, until=until)
+        for commit in commits:
+            if commit.author:
+                committer = commit.author.login
+            elif commit.commit.author:
+                committer = commit.commit.author.name
+            else:
+                logger.info("weird nonetype thing? %s", commit.html_url)
+                continue
+
+            if committer and "[bot]" not in committer:
+                records.append(
+                    CommitRecord(
+                        commit.sha, committer.lower(), commit.commit.committer.date
+                    )
                 )
-                for commit in commits:
-                    if commit.author:
-                        committer = commit.author.login
-                    elif commit.commit.author:
-                        committer = commit.commit.author.name
-                    else:
-                        logger.info("weird nonetype thing? %s", commit.html_url)
-                        continue
 
-                    if committer and "[bot]" not in committer:
-                        contributors.add(committer.lower())
+    return records
+
+
+def _fetch_repo_commits(
+    repo: str,
+    since: datetime.datetime,
+    until: datetime.datetime,
+    known_active: bool = False,
+) -> list[CommitRecord] | None:
+    """Fetch a repo's commits, retrying after rate-limit errors.
+
+    Errors for individual repos are logged rather than raised, so one bad repo
+    can't take down the whole count. Missing and empty repos have no commits;
+    any other failure returns `None`, so the repo's watermark stays put.
+    """
+    for _ in range(3):
+        try:
+            return get_repo_commits(repo, since, until, known_active)
+        except RateLimitExceededException:
+            # the rate-limit bucket has paused, the retry waits it out
+            logger.warning("Rate limited while fetching %s, retrying", repo)
         except UnknownObjectException:
             logger.exception(
                 "GithubException.UnknownObjectException encountered: %s", repo
             )
+            return []
         except GithubException as err:
             if err.status == 409:
                 logger.exception(
@@ -133,7 +628,229 @@ def get_contributors(ecosystem_repos_set: set[str]) -> set[str]:
                     409,
                     repo,
                 )
-            else:
-                logger.exception("GithubException encountered: %s", err)
+                return []
+            logger.exception("GithubException encountered: %s", err)
+            return None
+
+    logger.error("Giving up on %s after repeated rate limiting", repo)
+    return None
+
+
+def _fetch_batch_commits(
+    repos: dict[str, datetime.datetime], until: datetime.datetime
+) -> dict[str, list[CommitRecord] | None]:
+    """Fetch a batch of repos' commits with the GraphQL backend.
+
+    Batches the server fails to answer (large ones can time out) are retried in
+    halves, down to single repos.
+    """
+    for _ in range(3):
+        try:
+            return dict(fetch_batch_commits(contrib_client().requester, repos, until))
+        except GraphqlRateLimited as err:
+            # reported in a successful response, so the bucket hasn't seen it
+            buckets["graphql"].back_off(err.headers)
+        except RateLimitExceededException:
+            logger.warning("Rate limited while fetching %d repos, retrying", len(repos))
+        except GithubException as err:
+            if err.status >= 500 and len(repos) > 1:
+                urls = list(repos)
+                half = len(urls) // 2
+                return _fetch_batch_commits(
+                    {repo: repos[repo] for repo in urls[:half]}, until
+                ) | _fetch_batch_commits(
+                    {repo: repos[repo] for repo in urls[half:]}, until
+                )
+            logger.exception("GithubException encountered: %s", err)
+            return dict.fromkeys(repos)
+
+    logger.error("Giving up on %d repos after repeated rate limiting", len(repos))
+    return dict.fromkeys(repos)
+
+
+def prefilter_active_repos(
+    repos: list[str], since: datetime.datetime, workers: int = CONTRIBUTOR_WORKERS
+) -> tuple[set[str], set[str]]:
+    """Drop the repos that can't have had any commits since the given time.
+
+    Owners with at least `ACTIVITY_LISTING_MIN_REPOS` tracked repos get their
+    repos listed in bulk, most recently pushed first. Other repos fall back on
+    the `pushed_at` times cached by previous runs.
+
+    :param repos: The URLs of the repositories.
+    :type repos: list[str]
+    :param since: The start of the contributor-counting window.
+    :type since: datetime.datetime
+    :param workers: The number of owners to list concurrently.
+    :type workers: int
+    :return: The repos known to be active, and the repos that still need to be
+        checked one by one.
+    :rtype: tuple[set[str], set[str]]
+    """
+    owners = {
+        owner: names
+        for owner, names in group_by_owner(repos).items()
+        if len(names) >= ACTIVITY_LISTING_MIN_REPOS
+    }
+
+    def list_owner(owner: str) -> dict[str, tuple[datetime.datetime | None, bool]]:
+        try:
+            return list_owner_activity(
+                contrib_client(),
+                owner,
+                owners[owner],
+                since,
+                ACTIVITY_LISTING_MAX_PAGES,
+            )
+        except GithubException as err:
+            logger.warning("Could not list the repos owned by %s: %s", owner, err)
+            return {}
+
+    listed: dict[str, tuple[datetime.datetime | None, bool]] = {}
+    with ThreadPoolExecutor(max_workers=max(workers, 1)) as executor:
+        for activity in executor.map(list_owner, sorted(owners)):
+            listed.update(activity)
+
+    return classify_repos(repos, since, listed, load_pushed_at())
+
+
+def fetch_commits(
+    since: dict[str, datetime.datetime],
+    until: datetime.datetime,
+    active: set[str],
+    backend: str = CONTRIBUTOR_BACKEND,
+    workers: int = CONTRIBUTOR_WORKERS,
+) -> Iterator[tuple[str, list[CommitRecord] | None]]:
+    """Fetch the commits to many repos concurrently, in repo order.
+
+    :param since: The start of the window to fetch commits for, per repo URL.
+    :type since: dict[str, datetime.datetime]
+    :param until: The end of the window to fetch commits for.
+    :type until: datetime.datetime
+    :param active: The repos already known to be active.
+    :type active: set[str]
+    :param backend: Either `"graphql"` or `"rest"`.
+    :type backend: str
+    :param workers: The number of requests to run concurrently.
+    :type workers: int
+    :return: Each repo, with its commits (or `None` if they couldn't be fetched).
+    :rtype: Iterator[tuple[str, list[CommitRecord] | None]]
+    """
+    repos = list(since)
+    if backend == "graphql":
+        batches = [
+            repos[i : i + GRAPHQL_BATCH_SIZE]
+            for i in range(0, len(repos), GRAPHQL_BATCH_SIZE)
+        ]
+    else:
+        batches = [[repo] for repo in repos]
+
+    def fetch(batch: list[str]) -> dict[str, list[CommitRecord] | None]:
+        if backend == "graphql":
+            return _fetch_batch_commits({r: since[r] for r in batch}, until)
+        repo = batch[0]
+        return {repo: _fetch_repo_commits(repo, since[repo], until, repo in active)}
+
+    with ThreadPoolExecutor(max_workers=max(workers, 1)) as executor:
+        for batch_commits in executor.map(fetch, batches):
+            yield from batch_commits.items()
+
+
+# pylint: disable-next=too-many-locals
+def get_contributors_by_repo(
+    ecosystem_repos_set: set[str],
+    workers: int = CONTRIBUTOR_WORKERS,
+    backend: str = CONTRIBUTOR_BACKEND,
+    incremental: bool = True,
+    store_filepath: str | None = None,
+) -> dict[str, set[str]]:
+    """Find the contributors to each of the repos from the previous
+    `CONTRIBUTOR_WINDOW_DAYS` days.
+
+    Repos are fetched concurrently by a pool of workers, which share a single
+    rate-limit budget. Their results are merged in repo order, so the outcome
+    doesn't depend on which worker finishes first.
+
+    Fetched commits are kept in the commit store, so the next run only has to
+    fetch each repo's commits since its watermark. Repos the repo index knows
+    by another, current URL are fetched (and stored) by that one, and only once
+    however many of their URLs are given.
+
+    :param ecosystem_repos_set: The set of unique repos for the ecosystem.
+    :type ecosystem_repos_set: set[str]
+    :param workers: The number of requests to run concurrently.
+    :type workers: int
+    :param backend: Either `"graphql"`, to ask about `GRAPHQL_BATCH_SIZE` repos
+        per request, or `"rest"`, to make (at least) two requests per repo.
+    :type backend: str
+    :param incremental: Whether to fetch only the commits since each repo's
+        watermark. Otherwise, every repo's whole window is fetched again.
+    :type incremental: bool
+    :param store_filepath: The commit store to use, if not the default one.
+    :type store_filepath: str | None
+    :return: The unique Github usernames, per repository URL.
+    :rtype: dict[str, set[str]]
+    """
+    window_start, now = contributor_window()
+
+    # a repo known by more than one URL is fetched once, by its current one
+    with RepoIndex() as index:
+        canonical = index.current_urls(ecosystem_repos_set)
+
+    with stage("prefilter repos") as timed:
+        timed.items = len(set(canonical.values()))
+        active, unknown = prefilter_active_repos(
+            sorted(set(canonical.values())), window_start, workers
+        )
+
+    with CommitStore(store_filepath) as store:
+        store.expire(now - datetime.timedelta(days=COMMIT_RETENTION_DAYS))
+        since = {
+            repo: (
+                store.fetch_since(repo, window_start, _WATERMARK_OVERLAP)
+                if incremental
+                else window_start
+            )
+            for repo in sorted(active | unknown)
+        }
+
+        with stage("fetch commits") as timed:
+            for repo, commits in fetch_commits(since, now, active, backend, workers):
+                timed.items += 1
+                if commits is not None:
+                    store.record(repo, commits, now)
+
+        # inactive repos were never fetched, and have no recent contributors
+        contributors = {
+            repo: (
+                store.authors(canonical[repo], window_start, now)
+                if canonical[repo] in since
+                else set()
+            )
+            for repo in sorted(ecosystem_repos_set)
+        }
+
+    store_pushed_at()
+    log_rate_limit_waits()
+    return contributors
+
+
+def get_contributors(
+    ecosystem_repos_set: set[str], workers: int = CONTRIBUTOR_WORKERS
+) -> set[str]:
+    """Use Github's APIs to find contributors to the repos
+
+    :param ecosystem_repos_set: The set of unique repos for the ecosystem.
+    :type ecosystem_repos_set: set[str]
+    :param workers: The number of requests to run concurrently.
+    :type workers: int
+    :return: A set of unique Github usernames
+    :rtype: set[str]
+    """
+    contributors: set[str] = set()
+    for repo_contributors in get_contributors_by_repo(
+        ecosystem_repos_set, workers
+    ).values():
+        contributors.update(repo_contributors)
 
     return contributors
@@ -0,0 +1,214 @@
+"""
+Search History
+--------------
+
+Remember what every code search found on earlier crawls, so a routine crawl
+only has to page through the results that are new since.
+
+Searches are asked for their results most recently indexed first. For every
+shard of a search (see `sharding.py`), the history keeps the repos it has
+found and a high-water mark: the first result of its last run.
+An incremental search stops paging once it reaches that mark, or once a whole
+run of `SEARCH_KNOWN_RUN` results in a row only turns up repos it already
+knows. Its results are then the repos it found this time, plus those found by
+earlier runs.
+
+Every `SEARCH_FULL_SWEEP_DAYS`, a search is run in full again (re-planning its
+shards), to catch anything an incremental run stopped short of, and to drop
+the repos it no longer finds. `crawl --full-sweep` forces one for every search.
+
+The history lives at `out/cache/search_history.json`.
+"""
+
+import datetime
+import json
+import logging
+import os
+import threading
+from dataclasses import dataclass, field
+
+from crawler.cache import cache_dir
+from crawler.constants import SEARCH_FULL_SWEEP_DAYS
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class ShardHistory:
+    """What earlier crawls found for a single shard of a search."""
+
+    repos: set[str] = field(default_factory=set)
+    """The repo URLs found by every run since the last full sweep."""
+
+    mark: str | None = None
+    """The first (most recently indexed) result of the last run."""
+
+    lower_repos: set[str] = field(default_factory=set, repr=False, compare=False)
+    """The same repo URLs, lower-cased, for case-insensitive comparisons."""
+
+    def __post_init__(self) -> None:
+        self.lower_repos = {repo.lower() for repo in self.repos}
+
+
+@dataclass
+class QueryHistory:
+    """The last full sweep of a search."""
+
+    shards: list[str]
+    """The shards the search was split into."""
+
+    swept_at: datetime.datetime
+    """When the search was run in full."""
+
+
+def default_history_filepath() -> str:
+    """Return where the search history is kept.
+
+    :return: The absolute path of the search history.
+    :rtype: str
+    """
+    return f"{cache_dir()}/search_history.json"
+
+
+@dataclass
+class SearchHistory:
+    """The history of every search, shared by the crawl's search threads."""
+
+    filepath: str | None = field(default_factory=default_history_filepath)
+    """Where the history is saved, or `None` to keep it in memory only."""
+
+    full_sweep: bool = False
+    """Whether to run every search in full this time, whatever its history."""
+
+    queries: dict[str, QueryHistory] = field(default_factory=dict)
+    """The last full sweep of every search, keyed by search query string."""
+
+    shards: dict[str, ShardHistory] = field(default_factory=dict)
+    """The history of every shard, keyed by the shard's search query string.
+    (A search that didn't need splitting is its own single shard.)"""
+
+    lock: threading.Lock = field(
+        default_factory=threading.Lock, repr=False, compare=False
+    )
+    """Held while the history is updated or saved."""
+
+    @classmethod
+    def load(
+        cls, filepath: str | None = None, full_sweep: bool = False
+    ) -> "SearchHistory":
+        """Load the search history of previous crawls.
+
+        :param filepath: Where the history is saved. Defaults to
+            `out/cache/search_history.json` in the current working directory.
+        :type filepath: str | None
+        :param full_sweep: Whether to run every search in full this time.
+        :type full_sweep: bool
+        :return: The saved history, or an empty one if there is none.
+        :rtype: SearchHistory
+        """
+        history = cls(full_sweep=full_sweep)
+        if filepath is not None:
+            history.filepath = filepath
+        assert history.filepath is not None
+        try:
+            with open(history.filepath, "r", encoding="utf-8") as f:
+                saved = json.load(f)
+        except FileNotFoundError:
+            return history
+        except json.JSONDecodeError:
+            logger.warning("Ignoring unreadable search history: %s", history.filepath)
+            return history
+
+        history.queries = {
+            key: QueryHistory(
+                query["shards"], datetime.datetime.fromisoformat(query["swept_at"])
+            )
+            for key, query in saved["queries"].items()
+        }
+        history.shards = {
+            key: ShardHistory(set(shard["repos"]), shard["mark"])
+            for key, shard in saved["shards"].items()
+        }
+        return history
+
+    def incremental(self, search: str) -> QueryHistory | None:
+        """Return the last full sweep an incremental run of a search can build on.
+
+        :param search: The search query string.
+        :type search: str
+        :return: The search's last full sweep, or `None` if it's due another
+            (it's new, or its last was more than `SEARCH_FULL_SWEEP_DAYS` ago).
+        :rtype: QueryHistory | None
+        """
+        with self.lock:
+            past = self.queries.get(search)
+        if self.full_sweep or past is None:
+            return None
+        age = datetime.datetime.now(datetime.timezone.utc) - past.swept_at
+        if age > datetime.timedelta(days=SEARCH_FULL_SWEEP_DAYS):
+            logger.info("Sweeping %s in full, %d days after the last", search, age.days)
+            return None
+        return past
+
+    def shard(self, shard: str) -> ShardHistory | None:
+        """Return what earlier crawls found for a shard.
+
+        :param shard: The shard's search query string.
+        :type shard: str
+        :return: The shard's history, if it has any.
+        :rtype: ShardHistory | None
+        """
+        with self.lock:
+            return self.shards.get(shard)
+
+    def record_shard(self, shard: str, found: ShardHistory, full: bool) -> None:
+        """Record a run of a shard, then save the history.
+
+        :param shard: The shard's search query string.
+        :type shard: str
+        :param found: The repos the run found, and its first result.
+        :type found: ShardHistory
+        :param full: Whether the shard was searched in full, in which case the
+            run replaces its history rather than adding to it.
+        :type full: bool
+        """
+        with self.lock:
+            past = self.shards.get(shard)
+            if full or past is None:
+                self.shards[shard] = found
+            else:
+                past.repos.update(found.repos)
+                past.lower_repos.update(found.lower_repos)
+                past.mark = found.mark or past.mark
+            self._write()
+
+    def record_sweep(self, search: str, shards: list[str]) -> None:
+        """Record a full sweep of a search, then save the history.
+
+        :param search: The search query string.
+        :type search: str
+        :param shards: The shards the search was split into.
+        :type shards: list[str]
+        """
+        with self.lock:
+            self.queries[search] = QueryHistory(
+                shards, datetime.datetime.now(datetime.timezone.utc)
+            )
+            self._write()
+
+    def _write(self) -> None:
+        if self.filepath is None:
+            return
+        saved = {
+            "queries": {
+                key: {"shards": query.shards, "swept_at": query.swept_at.isoformat()}
+                for key, query in self.queries.items()
+            },
+            "shards": {
+                key: {"repos": sorted(shard.repos), "mark": shard.mark}
+                for key, shard in self.shards.items()
+            },
+        }
+        with open(f"{self.filepath}.tmp", "w", encoding="utf-8") as f:
+            json.dump(saved, f, indent=2)
+        os.replace(f"{self.filepath}.tmp", self.filepath)
@@ -0,0 +1,80 @@
+"""
+Sharding
+--------
+
+Github's code search never serves more than 1000 results for a query, however
+many files actually match. Popular keywords (`stellar-sdk` in `package.json`,
+`soroban-sdk` in `Cargo.toml`) match far more than that, so a single search
+silently misses repos.
+
+A query that's over the limit is split into shards by file size (the `size:`
+qualifier), halving the size range until every shard fits under the limit.
+Only files smaller than 384 KB are searchable at all, so the shards together
+cover every result of the original query.
+"""
+
+import logging
+from collections.abc import Callable
+
+logger = logging.getLogger(__name__)
+
+SEARCH_RESULT_LIMIT = 1000
+"""The most results Github's code search will serve for any one query."""
+
+MAX_INDEXED_FILE_SIZE = 384_000
+"""The size (in bytes) below which Github indexes files for code search."""
+
+
+def with_size(search: str, low: int, high: int) -> str:
+    """Restrict a search query to files within a range of sizes.
+
+    :param search: The search query string.
+    :type search: str
+    :param low: The smallest file size (in bytes) to match.
+    :type low: int
+    :param high: The largest file size (in bytes) to match.
+    :type high: int
+    :return: The restricted search query string.
+    :rtype: str
+    """
+    return f"{search} size:{low}..{high}"
+
+
+def plan_shards(search: str, count: Callable[[str], int]) -> list[str]:
+    """Split a search query into shards that each fit under the result limit.
+
+    :param search: The search query string.
+    :type search: str
+    :param count: Returns the total number of results for a search query string.
+        Each shard considered is counted exactly once.
+    :type count: Callable[[str], int]
+    :return: The search query strings to run, which together find every result
+        of the original query. A query under the limit is its own only shard.
+    :rtype: list[str]
+    """
+    if count(search) <= SEARCH_RESULT_LIMIT:
+        return [search]
+
+    shards: list[str] = []
+    pending = [(0, MAX_INDEXED_FILE_SIZE)]
+    while pending:
+        low, high = pending.pop()
+        shard = with_size(search, low, high)
+        total = count(shard)
+        if total > SEARCH_RESULT_LIMIT and low < high:
+            middle = (low + high) // 2
+            pending.extend([(middle + 1, high), (low, middle)])
+            continue
+
+        if total > SEARCH_RESULT_LIMIT:
+            logger.warning(
+                "Can't split %s any further, %d of its %d results will be missed",
+                shard,
+                total - SEARCH_RESULT_LIMIT,
+                total,
+            )
+        if total > 0:
+            shards.append(shard)
+
+    logger.info("Split %s into %d shards", search, len(shards))
+    return shards
@@ -0,0 +1,132 @@
+"""
+Fixtures
+--------
+
+Run the crawler offline: every Github client talks to a local stand-in, the
+Open Dev Data clone is a temporary directory whose `run.sh` makes up a
+synthetic taxonomy, and everything written under `out/` goes to a temporary
+directory too.
+"""
+
+import os
+import stat
+import sys
+from collections.abc import Iterator
+from dataclasses import dataclass
+from pathlib import Path
+
+import pytest
+
+from crawler import (
+    activity,
+    cache,
+    ecosystem,
+    migrations,
+    ratelimit,
+    search_github,
+)
+from crawler.instrumentation import metrics
+from tests.github_stand_in import GithubStandIn
+from tests.synthetic import SyntheticGithub
+
+REPO_ROOT = Path(__file__).parent.parent
+
+SYNTHETIC_REPOS = 2000
+"""The number of repos on the synthetic Github."""
+
+TAXONOMY_REPOS = 1500
+"""The number of those repos the synthetic taxonomy already tracks. The rest
+can only be found by code search."""
+
+TAXONOMY_DEPTH = 3
+"""The depth of the synthetic taxonomy's chains of sub-ecosystems."""
+
+TAXONOMY_WIDTH = 4
+"""The number of chains of sub-ecosystems in the synthetic taxonomy."""
+
+
+@dataclass
+class Offline:
+    """The pieces of an offline crawler run."""
+
+    stand_in: GithubStandIn
+    """The Github stand-in every client talks to."""
+
+    repo_path: Path
+    """The fake Open Dev Data clone."""
+
+    out_path: Path
+    """The `out/` directory of the run."""
+
+    def fresh_taxonomy(self) -> None:
+        """Remove the run's cached exports and this crawl's mutations."""
+        for path in (self.out_path / "cache").glob("tree-*"):
+            path.unlink()
+        for path in (self.repo_path / "migrations").glob("*_stellar_mutations"):
+            path.unlink()
+
+    def fresh_contributors(self) -> None:
+        """Remove everything a previous contributor count left behind."""
+        for name in ("commits.sqlite", "cache/pushed_at.json"):
+            (self.out_path / name).unlink(missing_ok=True)
+        activity.observed_pushed_at.clear()
+
+
+@pytest.fixture(scope="session")
+def stand_in() -> Iterator[GithubStandIn]:
+    """A Github stand-in serving a synthetic Github, for the whole session."""
+    server = GithubStandIn(SyntheticGithub(SYNTHETIC_REPOS)).start()
+    yield server
+    server.stop()
+
+
+def write_fake_run_sh(repo_path: Path) -> None:
+    """Put a `run.sh` in the fake clone that exports a synthetic taxonomy."""
+    run_sh = repo_path / "run.sh"
+    run_sh.write_text(
+        f"#!/bin/sh\n"
+        f'PYTHONPATH="{REPO_ROOT}" exec "{sys.executable}" -m tests.synthetic "$@"\n',
+        encoding="utf-8",
+    )
+    run_sh.chmod(run_sh.stat().st_mode | stat.S_IXUSR)
+
+
+@pytest.fixture
+def offline(
+    stand_in: GithubStandIn, tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> Offline:
+    """Point the crawler at the stand-in, a fake clone and a temporary `out/`."""
+    repo_path = tmp_path / "open-dev-data"
+    (repo_path / "migrations").mkdir(parents=True)
+    (repo_path / "migrations" / "2025-01-01T000000_init").write_text(
+        "ecocon Stellar\n", encoding="utf-8"
+    )
+    write_fake_run_sh(repo_path)
+    monkeypatch.setattr(ecosystem, "BASE_REPO_PATH", str(repo_path))
+    monkeypatch.setattr(cache, "BASE_REPO_PATH", str(repo_path))
+    monkeypatch.setattr(migrations, "BASE_REPO_PATH", str(repo_path))
+    # the fake `run.sh` makes up its taxonomy from the environment, not from
+    # the migrations, so it's exported unless a test replays it on purpose
+    monkeypatch.setattr(ecosystem, "TAXONOMY_SOURCE", "export")
+    monkeypatch.setenv("FAKE_TAXONOMY_REPOS", str(TAXONOMY_REPOS))
+    monkeypatch.setenv("FAKE_TAXONOMY_DEPTH", str(TAXONOMY_DEPTH))
+    monkeypatch.setenv("FAKE_TAXONOMY_WIDTH", str(TAXONOMY_WIDTH))
+
+    work_path = tmp_path / "work"
+    work_path.mkdir()
+    monkeypatch.chdir(work_path)
+    os.makedirs(work_path / "out" / "dumps" / "contribs")
+
+    monkeypatch.setattr(search_github, "GITHUB_API_URL", stand_in.url)
+    monkeypatch.setattr(search_github, "auth", None)
+    for name in search_github.g:
+        monkeypatch.setitem(search_github.g, name, search_github.new_client())
+    for resource, bucket in ratelimit.buckets.items():
+        monkeypatch.setitem(
+            ratelimit.buckets, resource, ratelimit.RateLimitGovernor(bucket.reserve)
+        )
+    monkeypatch.setattr(activity, "observed_pushed_at", {})
+    metrics.reset()
+
+    stand_in.reset()
+    return Offline(stand_in, repo_path, work_path / "out")
@@ -0,0 +1,456 @@
+"""
+Github Stand-In
+---------------
+
+A local HTTP server that answers the Github API requests the crawler makes,
+from a `SyntheticGithub`. Responses are the recorded ones under
+`fixtures/github/`, filled in for each synthetic repo, commit and search
+result. They're paginated with `Link` headers, carry `X-RateLimit-*` headers
+like Github's do, and missing or empty repos get their real `404`/`409` errors.
+
+Every request is counted by endpoint, so a benchmark can report how many
+requests a run took as well as how long.
+"""
+
+import base64
+import copy
+import datetime
+import json
+import math
+import re
+import threading
+import time
+from collections import Counter
+from collections.abc import Callable
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any
+from urllib.parse import parse_qs, urlencode, urlsplit
+
+from tests.synthetic import SyntheticCommit, SyntheticGithub, SyntheticRepo
+
+FIXTURES = Path(__file__).parent / "fixtures" / "github"
+
+RATE_LIMITS = {"core": 5000, "search": 30, "code_search": 1000, "graphql": 5000}
+"""The requests allowed per window, by resource. Code search is far more
+generous than Github's, so benchmarks aren't paced by the minute."""
+
+
+def _fixture(name: str) -> Any:
+    with open(FIXTURES / f"{name}.json", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _timestamp(moment: datetime.datetime) -> str:
+    return moment.strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+def _pushed_at(repo: SyntheticRepo) -> str | None:
+    return _timestamp(repo.pushed_at) if repo.pushed_at else None
+
+
+class GithubStandIn:
+    """The stand-in server, running on a thread of its own.
+
+    :param github: The synthetic repos and search results to serve.
+    :type github: SyntheticGithub
+    """
+
+    def __init__(self, github: SyntheticGithub) -> None:
+        self.github = github
+        self.requests: Counter[str] = Counter()
+        self.remaining = dict(RATE_LIMITS)
+        self.reset_at = int(time.time()) + 3600
+        self.lock = threading.Lock()
+        self.templates = {
+            name: _fixture(name)
+            for name in (
+                "repository",
+                "commit",
+                "code_search_item",
+                "rate_limit",
+                "not_found",
+                "empty_repository",
+                "git_blob",
+            )
+        }
+        self.blobs: dict[str, bytes] = {}
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), _handler(self))
+        self.server.daemon_threads = True
+        self.thread = threading.Thread(
+            target=self.server.serve_forever, name="github-stand-in", daemon=True
+        )
+
+    @property
+    def url(self) -> str:
+        """The base URL to point a `Github` client at."""
+        host, port = self.server.server_address[:2]
+        return f"http://{host!s}:{port}"
+
+    def start(self) -> "GithubStandIn":
+        """Start serving requests."""
+        self.thread.start()
+        return self
+
+    def stop(self) -> None:
+        """Stop serving requests."""
+        self.server.shutdown()
+        self.server.server_close()
+
+    def reset(self) -> None:
+        """Forget the requests counted so far, and refill the rate limits."""
+        with self.lock:
+            self.requests.clear()
+            self.remaining = dict(RATE_LIMITS)
+
+    @property
+    def total(self) -> int:
+        """The number of requests counted since the last reset."""
+        return sum(self.requests.values())
+
+    def take(self, endpoint: str, resource: str | None) -> dict[str, str]:
+        """Count a request, and return its rate-limit headers."""
+        with self.lock:
+            self.requests[endpoint] += 1
+            if resource is None:
+                return {}
+            self.remaining[resource] = max(self.remaining[resource] - 1, 0)
+            return {
+                "X-RateLimit-Limit": str(RATE_LIMITS[resource]),
+                "X-RateLimit-Remaining": str(self.remaining[resource]),
+                "X-RateLimit-Reset": str(self.reset_at),
+                "X-RateLimit-Used": str(
+                    RATE_LIMITS[resource] - self.remaining[resource]
+                ),
+                "X-RateLimit-Resource": resource,
+            }
+
+    def repository(self, repo: SyntheticRepo) -> dict[str, Any]:
+        """Fill in the recorded repository response for a synthetic repo."""
+        body = copy.deepcopy(self.templates["repository"])
+        body.update(
+            id=repo.number,
+            node_id=f"R_{repo.number}",
+            name=repo.name,
+            full_name=f"{repo.owner}/{repo.name}",
+            html_url=repo.url,
+            url=f"{self.url}/repos/{repo.owner}/{repo.name}",
+            commits_url=f"{self.url}/repos/{repo.owner}/{repo.name}/commits{{/sha}}",
+            pushed_at=_pushed_at(repo),
+            archived=repo.archived,
+        )
+        body["owner"].update(login=repo.owner, html_url=repo.url.rsplit("/", 1)[0])
+        return body
+
+    def commit(self, repo: SyntheticRepo, commit: SyntheticCommit) -> dict[str, Any]:
+        """Fill in the recorded commit response for a synthetic commit."""
+        body = copy.deepcopy(self.templates["commit"])
+        body["sha"] = commit.sha
+        body["html_url"] = f"{repo.url}/commit/{commit.sha}"
+        body["url"] = f"{self.url}/repos/{repo.owner}/{repo.name}/commits/{commit.sha}"
+        for person in ("author", "committer"):
+            body["commit"][person].update(
+                name=commit.name, date=_timestamp(commit.committed_at)
+            )
+            if commit.login is None:
+                body[person] = None
+            else:
+                body[person]["login"] = commit.login
+        return body
+
+    def search_item(self, repo: SyntheticRepo, size: int, query: str) -> dict[str, Any]:
+        """Fill in the recorded code search result for a synthetic repo, and
+        keep its manifest to serve as a blob."""
+        manifest = self.github.manifest(query, repo)
+        with self.lock:
+            self.blobs[manifest.sha] = manifest.content
+        api = f"{self.url}/repos/{repo.owner}/{repo.name}"
+        body = copy.deepcopy(self.templates["code_search_item"])
+        body.update(
+            name=manifest.path.rsplit("/", 1)[-1],
+            path=manifest.path,
+            sha=manifest.sha,
+            url=f"{api}/contents/{manifest.path}?ref={manifest.sha}",
+            git_url=f"{api}/git/blobs/{manifest.sha}",
+            html_url=f"{repo.url}/blob/main/{manifest.path}",
+            size=size,
+        )
+        body["repository"].update(
+            id=repo.number,
+            node_id=f"R_{repo.number}",
+            name=repo.name,
+            full_name=f"{repo.owner}/{repo.name}",
+            html_url=repo.url,
+            url=api,
+        )
+        return body
+
+    def blob(self, sha: str) -> dict[str, Any]:
+        """Fill in the recorded blob response for a manifest."""
+        body = copy.deepcopy(self.templates["git_blob"])
+        content = self.blobs[sha]
+        body.update(
+            sha=sha,
+            size=len(content),
+            content=base64.encodebytes(content).decode(),
+        )
+        return body
+
+    def graphql_identity(self, repo: SyntheticRepo | None) -> dict[str, Any] | None:
+        """Answer the `repository` node of a repo ID lookup."""
+        if repo is None or repo.missing:
+            return None
+        return {"databaseId": repo.number, "id": f"R_{repo.number}", "url": repo.url}
+
+    def graphql_repository(
+        self, repo: SyntheticRepo | None, since: str, until: str, after: str | None
+    ) -> dict[str, Any] | None:
+        """Answer the `repository` node of a contributor query."""
+        if repo is None or repo.missing:
+            return None
+        node: dict[str, Any] = {
+            "isArchived": repo.archived,
+            "pushedAt": _pushed_at(repo),
+            "defaultBranchRef": None,
+        }
+        if repo.empty:
+            return node
+        commits = [
+            commit
+            for commit in repo.commits
+            if since <= _timestamp(commit.committed_at) <= until
+        ]
+        start = int(after or 0)
+        page = commits[start : start + 100]
+        node["defaultBranchRef"] = {
+            "target": {
+                "history": {
+                    "pageInfo": {
+                        "hasNextPage": start + 100 < len(commits),
+                        "endCursor": str(start + 100),
+                    },
+                    "nodes": [
+                        {
+                            "oid": commit.sha,
+                            "committedDate": _timestamp(commit.committed_at),
+                            "author": {
+                                "name": commit.name,
+                                "user": commit.login and {"login": commit.login},
+                            },
+                        }
+                        for commit in page
+                    ],
+                }
+            }
+        }
+        return node
+
+
+def _utc(value: str) -> str:
+    """Normalize a timestamp parameter to the stand-in's `...Z` format."""
+    return value.replace("+00:00", "Z").split(".")[0].rstrip("Z") + "Z"
+
+
+def _handler(stand_in: GithubStandIn) -> type[BaseHTTPRequestHandler]:
+    """Build the request handler class serving from the given stand-in."""
+
+    class Handler(BaseHTTPRequestHandler):
+        """Route each request to the matching synthetic response."""
+
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args: Any) -> None:
+            """Keep the test output quiet."""
+
+        def respond(
+            self,
+            status: int,
+            body: Any,
+            headers: dict[str, str],
+            link: str = "",
+        ) -> None:
+            data = json.dumps(body).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json; charset=utf-8")
+            self.send_header("Content-Length", str(len(data)))
+            for name, value in headers.items():
+                self.send_header(name, value)
+            if link:
+                self.send_header("Link", link)
+            self.end_headers()
+            self.wfile.write(data)
+
+        def paginate(
+            self, items: list[Any], path: str, query: dict[str, str]
+        ) -> tuple[list[Any], str]:
+            per_page = int(query.get("per_page", "30"))
+            page = int(query.get("page", "1"))
+            last = max(math.ceil(len(items) / per_page), 1)
+            links = []
+            if page < last:
+                links.append((page + 1, "next"))
+                links.append((last, "last"))
+            link = ", ".join(
+                f'<{stand_in.url}{path}?{urlencode({**query, "page": n})}>; rel="{rel}"'
+                for n, rel in links
+            )
+            return items[(page - 1) * per_page : page * per_page], link
+
+        def do_GET(self) -> None:  # pylint: disable=invalid-name
+            """Answer a REST request."""
+            url = urlsplit(self.path)
+            query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+            for pattern, route in self.routes():
+                match = re.fullmatch(pattern, url.path)
+                if match:
+                    route(url.path, query, *match.groups())
+                    return
+            headers = stand_in.take("GET (unknown)", "core")
+            self.respond(404, stand_in.templates["not_found"], headers)
+
+        def do_POST(self) -> None:  # pylint: disable=invalid-name
+            """Answer a GraphQL query."""
+            length = int(self.headers.get("Content-Length", 0))
+            payload = json.loads(self.rfile.read(length))
+            variables: dict[str, Any] = payload.get("variables") or {}
+            headers = stand_in.take("POST /graphql", "graphql")
+            data: dict[str, Any] = {}
+            errors: list[dict[str, Any]] = []
+
+            def lookup(owner: str, name: str) -> SyntheticRepo | None:
+                return stand_in.github.by_full_name.get(f"{owner}/{name}".lower())
+
+            until = _utc(variables.get("until", "9999-12-31T00:00:00Z"))
+            identities = "databaseId" in payload.get("query", "")
+            if "owner" in variables:
+                repo = lookup(variables["owner"], variables["name"])
+                data["repository"] = stand_in.graphql_repository(
+                    repo, _utc(variables["since"]), until, variables.get("after")
+                )
+            i = 0
+            while f"owner{i}" in variables:
+                repo = lookup(variables[f"owner{i}"], variables[f"name{i}"])
+                if identities:
+                    node = stand_in.graphql_identity(repo)
+                else:
+                    node = stand_in.graphql_repository(
+                        repo, _utc(variables[f"since{i}"]), until, None
+                    )
+                data[f"r{i}"] = node
+                if node is None:
+                    errors.append(
+                        {
+                            "type": "NOT_FOUND",
+                            "path": [f"r{i}"],
+                            "message": "Could not resolve to a Repository.",
+                        }
+                    )
+                i += 1
+
+            body: dict[str, Any] = {"data": data}
+            if errors:
+                body["errors"] = errors
+            self.respond(200, body, headers)
+
+        def routes(self) -> list[tuple[str, Callable[..., None]]]:
+            return [
+                (r"/rate_limit", self.rate_limit),
+                (r"/search/code", self.search_code),
+                (r"/repos/([^/]+)/([^/]+)", self.get_repo),
+                (r"/repos/([^/]+)/([^/]+)/commits", self.list_commits),
+                (r"/repos/([^/]+)/([^/]+)/git/blobs/([0-9a-f]+)", self.get_blob),
+                (r"/users/([^/]+)/repos", self.list_owner_repos),
+            ]
+
+        def rate_limit(self, _path: str, _query: dict[str, str]) -> None:
+            stand_in.take("GET /rate_limit", None)
+            body = copy.deepcopy(stand_in.templates["rate_limit"])
+            with stand_in.lock:
+                for resource, values in body["resources"].items():
+                    values.update(
+                        limit=RATE_LIMITS[resource],
+                        remaining=stand_in.remaining[resource],
+                        reset=stand_in.reset_at,
+                    )
+            self.respond(200, body, {})
+
+        def search_code(self, path: str, query: dict[str, str]) -> None:
+            headers = stand_in.take("GET /search/code", "code_search")
+            results = stand_in.github.search_results(query.get("q", ""))
+            per_page = int(query.get("per_page", "30"))
+            if (int(query.get("page", "1")) - 1) * per_page >= 1000:
+                body = {
+                    "message": "Cannot access beyond the first 1000 results.",
+                    "status": "422",
+                }
+                self.respond(422, body, headers)
+                return
+            page, link = self.paginate(results[:1000], path, query)
+            body = {
+                "total_count": len(results),
+                "incomplete_results": False,
+                "items": [
+                    stand_in.search_item(repo, size, query.get("q", ""))
+                    for repo, size in page
+                ],
+            }
+            self.respond(200, body, headers, link)
+
+        def get_repo(
+            self, _path: str, _query: dict[str, str], owner: str, name: str
+        ) -> None:
+            headers = stand_in.take("GET /repos/{owner}/{repo}", "core")
+            repo = stand_in.github.by_full_name.get(f"{owner}/{name}".lower())
+            if repo is None or repo.missing:
+                self.respond(404, stand_in.templates["not_found"], headers)
+                return
+            self.respond(200, stand_in.repository(repo), headers)
+
+        def get_blob(
+            self, _path: str, _query: dict[str, str], owner: str, name: str, sha: str
+        ) -> None:
+            headers = stand_in.take("GET /repos/{owner}/{repo}/git/blobs/{sha}", "core")
+            repo = stand_in.github.by_full_name.get(f"{owner}/{name}".lower())
+            if repo is None or repo.missing or sha not in stand_in.blobs:
+                self.respond(404, stand_in.templates["not_found"], headers)
+                return
+            self.respond(200, stand_in.blob(sha), headers)
+
+        def list_commits(
+            self, path: str, query: dict[str, str], owner: str, name: str
+        ) -> None:
+            headers = stand_in.take("GET /repos/{owner}/{repo}/commits", "core")
+            repo = stand_in.github.by_full_name.get(f"{owner}/{name}".lower())
+            if repo is None or repo.missing:
+                self.respond(404, stand_in.templates["not_found"], headers)
+                return
+            if repo.empty:
+                self.respond(409, stand_in.templates["empty_repository"], headers)
+                return
+            since = _utc(query.get("since", "0000-01-01T00:00:00Z"))
+            until = _utc(query.get("until", "9999-12-31T00:00:00Z"))
+            commits = [
+                commit
+                for commit in repo.commits
+                if since <= _timestamp(commit.committed_at) <= until
+            ]
+            page, link = self.paginate(commits, path, query)
+            body = [stand_in.commit(repo, commit) for commit in page]
+            self.respond(200, body, headers, link)
+
+        def list_owner_repos(
+            self, path: str, query: dict[str, str], owner: str
+        ) -> None:
+            headers = stand_in.take("GET /users/{owner}/repos", "core")
+            repos = [
+                repo
+                for repo in stand_in.github.by_owner.get(owner.lower(), [])
+                if not repo.missing
+            ]
+            repos.sort(key=lambda repo: _pushed_at(repo) or "", reverse=True)
+            page, link = self.paginate(repos, path, query)
+            self.respond(
+                200, [stand_in.repository(repo) for repo in page], headers, link
+            )
+
+    return Handler
@@ -0,0 +1,410 @@
+"""
+Synthetic
+---------
+
+A deterministic, synthetic slice of Github and of the Open Dev Data taxonomy,
+for running the crawler offline.
+
+Repos are numbered, and everything about a repo (its URL, whether it's active,
+its commits) follows from its number and the seed, so the Github stand-in and
+the fake `run.sh` (which runs in a subprocess) agree on them without sharing
+any state.
+
+Run as a script, this module is the fake `run.sh`: it answers `export -e
+<ecosystem> <filepath>` with a taxonomy of `FAKE_TAXONOMY_REPOS` repos, spread
+over `FAKE_TAXONOMY_WIDTH` chains of sub-ecosystems, `FAKE_TAXONOMY_DEPTH`
+deep.
+"""
+
+import datetime
+import hashlib
+import json
+import os
+import random
+import re
+import sys
+from dataclasses import dataclass, field
+from string import Template
+
+REPOS_PER_OWNER = 8
+"""The number of consecutively numbered repos belonging to each owner."""
+
+NAMED_BRANCHES = ("PaltaLabs", "Cheesecake Labs")
+"""The first sub-ecosystems of the taxonomy, named after the ecosystems in
+`SEARCH_QUERIES` so their code searches are run too."""
+
+MAX_FILE_SIZE = 384_000
+"""The largest file size given to a code search result."""
+
+FALSE_POSITIVES = 0.15
+"""The share of code search results whose manifest only mentions the keyword
+(in a description or a comment), rather than depending on it."""
+
+MANIFESTS: dict[str, tuple[str, str]] = {
+    "package.json": (
+        '{"name": "$name", "dependencies": {"$keyword": "^1.0.0"}}',
+        '{"name": "$name", "description": "Not $keyword", '
+        '"dependencies": {"left-pad": "^1.3.0"}}',
+    ),
+    "composer.json": (
+        '{"name": "x/$name", "require": {"soneso/$keyword": "^1.0"}}',
+        '{"name": "x/$name", "description": "Not $keyword", "require": {}}',
+    ),
+    "Cargo.toml": (
+        '[package]\nname = "$name"\n\n[dependencies]\n$keyword = "21"\n',
+        '[package]\nname = "$name"\ndescription = "Not $keyword"\n\n'
+        '[dependencies]\nserde = "1"\n',
+    ),
+    "pyproject.toml": (
+        '[project]\nname = "$name"\ndependencies = ["$keyword>=9"]\n',
+        '# not $keyword\n[project]\nname = "$name"\ndependencies = ["requests"]\n',
+    ),
+    "requirements.txt": (
+        "# $name\nrequests\n$keyword==9.0\n",
+        "# $name\nrequests  # not $keyword\n",
+    ),
+    "go.mod": (
+        "module github.com/x/$name\n\nrequire (\n\tgithub.com/stellar/$keyword v0.1.0\n)\n",
+        "module github.com/x/$name\n\n// not $keyword\n"
+        "require github.com/pkg/errors v0.9.1\n",
+    ),
+    "pom.xml": (
+        "<project><artifactId>$name</artifactId><dependencies><dependency><groupId>network.lightsail</groupId>"
+        "<artifactId>$keyword</artifactId></dependency></dependencies></project>",
+        "<project><artifactId>$name</artifactId>"
+        "<description>Not $keyword</description></project>",
+    ),
+    "build.gradle": (
+        "// $name\ndependencies {\n    implementation 'network.lightsail:$keyword:1.0'\n}\n",
+        "// $name, not $keyword\ndependencies {\n"
+        "    implementation 'com.google.guava:guava:33.0'\n}\n",
+    ),
+    "build.gradle.kts": (
+        '// $name\ndependencies {\n    implementation("$keyword:1.0")\n}\n',
+        '// $name, not $keyword\ndependencies {\n    implementation("com.google.guava:guava:33.0")\n}\n',
+    ),
+    "build.sbt": (
+        '// $name\nlibraryDependencies += "io.github.synesso" %% "$keyword" % "0.21"\n',
+        '// $name, not $keyword\nlibraryDependencies += "org.typelevel" %% "cats-core" % "2.10"\n',
+    ),
+    "mix.exs": (
+        '# $name\ndefp deps do\n  [{:$keyword, "~> 0.5"}]\nend\n',
+        '# $name, not $keyword\ndefp deps do\n  [{:jason, "~> 1.4"}]\nend\n',
+    ),
+    "Gemfile": (
+        '# $name\ngem "$keyword"\n',
+        '# $name, gem "$keyword"\ngem "rails"\n',
+    ),
+    "Podfile": (
+        "# $name\npod '$keyword'\n",
+        "# $name, pod '$keyword'\npod 'Alamofire'\n",
+    ),
+    "Cartfile": (
+        '# $name\ngithub "Soneso/$keyword"\n',
+        '# $name, github "Soneso/$keyword"\ngithub "Alamofire/Alamofire"\n',
+    ),
+    "pubspec.yaml": (
+        "name: $name\ndependencies:\n  $keyword: ^1.0.0\n",
+        "name: $name\ndescription: Not $keyword\ndependencies:\n  http: ^1.0.0\n",
+    ),
+    "Package.swift": (
+        '// $name\n.package(url: "https://github.com/Soneso/$keyword.git", from: "1.0.0")\n',
+        "// $name, not $keyword\n"
+        '.package(url: "https://github.com/apple/swift-log.git", from: "1.0.0")\n',
+    ),
+    "packages.config": (
+        '<!-- $name --><packages><package id="$keyword" version="1.0" /></packages>',
+        "<!-- $name, not $keyword --><packages>"
+        '<package id="Newtonsoft.Json" version="13.0" /></packages>',
+    ),
+    ".nuspec": (
+        '<package><id>$name</id><dependency id="$keyword" version="1.0" /></package>',
+        "<package><id>$name</id><description>Not $keyword</description></package>",
+    ),
+    ".csproj": (
+        '<!-- $name --><Project><PackageReference Include="$keyword" Version="1.0" /></Project>',
+        "<!-- $name, not $keyword --><Project>"
+        '<PackageReference Include="Newtonsoft.Json" Version="13.0" /></Project>',
+    ),
+}
+"""A manifest that depends on the keyword, and one that only mentions it, for
+every kind of file searched for. Other files always count as matching."""
+
+
+def repo_url(number: int) -> str:
+    """Return the URL of a numbered repo."""
+    return f"https://github.com/Org{number // REPOS_PER_OWNER}/Repo-{number}"
+
+
+def branch_of(number: int, depth: int, width: int) -> tuple[str, ...]:
+    """Return the sub-ecosystems a numbered repo is tracked under.
+
+    Repos are spread over `width` chains of nested sub-ecosystems, at every
+    depth from the root (an empty branch) down to `depth`.
+    """
+    chain = number % width
+    level = (number // width) % (depth + 1)
+    top = NAMED_BRANCHES[chain] if chain < len(NAMED_BRANCHES) else f"Eco {chain}"
+    return tuple([top] + [f"{top} {i}" for i in range(1, level)])[:level]
+
+
+def taxonomy_lines(
+    ecosystem: str, repos: int, depth: int, width: int
+) -> list[dict[str, object]]:
+    """Build the records of a synthetic taxonomy export.
+
+    Every tenth repo is tracked at the root as well as in its own branch.
+    """
+    lines: list[dict[str, object]] = []
+    for number in range(repos):
+        branch = branch_of(number, depth, width)
+        tags = ["#protocol"] if number % 7 == 0 else []
+        lines.append(
+            {
+                "eco_name": ecosystem,
+                "branch": list(branch),
+                "repo_url": repo_url(number),
+                "tags": tags,
+            }
+        )
+        if branch and number % 10 == 0:
+            lines.append(
+                {"eco_name": ecosystem, "branch": [], "repo_url": repo_url(number)}
+            )
+    return lines
+
+
+def _quoted(name: str) -> str:
+    return f'"{name}"' if " " in name else name
+
+
+def migration_lines(ecosystem: str, repos: int, depth: int, width: int) -> list[str]:
+    """Write the synthetic taxonomy as migrations, which replay into the same
+    records `taxonomy_lines` exports."""
+    lines = [f"ecoadd {ecosystem}"]
+    for chain in range(width):
+        top = NAMED_BRANCHES[chain] if chain < len(NAMED_BRANCHES) else f"Eco {chain}"
+        parent = ecosystem
+        for name in [top] + [f"{top} {i}" for i in range(1, depth)]:
+            lines.append(f"ecoadd {_quoted(name)}")
+            lines.append(f"ecocon {_quoted(parent)} {_quoted(name)}")
+            parent = name
+    for line in taxonomy_lines(ecosystem, repos, depth, width):
+        branch: list[str] = line["branch"]  # type: ignore[assignment]
+        eco = branch[-1] if branch else ecosystem
+        tags = " ".join(line.get("tags") or [])  # type: ignore[arg-type]
+        lines.append(f"repadd {_quoted(eco)} {line['repo_url']} {tags}".rstrip())
+    return lines
+
+
+@dataclass
+class SyntheticCommit:
+    """A commit, as far as the stand-in's responses need it."""
+
+    sha: str
+    login: str | None
+    name: str
+    committed_at: datetime.datetime
+
+
+@dataclass
+class SyntheticRepo:
+    """A repo, as far as the stand-in's responses need it."""
+
+    number: int
+    pushed_at: datetime.datetime | None
+    archived: bool = False
+    missing: bool = False
+    empty: bool = False
+    commits: list[SyntheticCommit] = field(default_factory=list)
+    renamed_to: str | None = None
+    """The repo's URL since it was renamed (or moved), if it was."""
+
+    @property
+    def owner(self) -> str:
+        """The owner's login."""
+        return self.url.split("/")[-2]
+
+    @property
+    def name(self) -> str:
+        """The repo's name."""
+        return self.url.split("/")[-1]
+
+    @property
+    def url(self) -> str:
+        """The repo's URL."""
+        return self.renamed_to or repo_url(self.number)
+
+
+@dataclass
+class SyntheticManifest:
+    """The file a code search result matched."""
+
+    path: str
+    content: bytes
+    genuine: bool
+    """Whether it really depends on a keyword searched for, as far as the
+    crawler can tell."""
+
+    @property
+    def sha(self) -> str:
+        """The file's git blob SHA."""
+        header = f"blob {len(self.content)}\0".encode()
+        return hashlib.sha1(header + self.content).hexdigest()
+
+
+def _keywords(query: str) -> list[str]:
+    keywords = re.sub(r"\b(?:filename|path|size|sort):\S+", " ", query).split(" OR ")
+    return [
+        keyword
+        for part in keywords
+        if (keyword := part.replace("\\", "").replace('"', "").strip())
+    ]
+
+
+def build_repo(number: int, seed: int, now: datetime.datetime) -> SyntheticRepo:
+    """Make up a numbered repo: missing, empty, archived, stale or active."""
+    rng = random.Random(f"{seed}-{number}")
+    roll = rng.random()
+    if roll < 0.02:
+        return SyntheticRepo(number, None, missing=True)
+    if roll < 0.04:
+        return SyntheticRepo(number, now - datetime.timedelta(days=2), empty=True)
+    if roll < 0.40:
+        days = rng.uniform(60, 400)
+        return SyntheticRepo(number, now - datetime.timedelta(days=days))
+
+    pushed_at = now - datetime.timedelta(days=rng.uniform(0, 10))
+    repo = SyntheticRepo(number, pushed_at, archived=roll < 0.45)
+    # a few busy repos overflow the first page of commits
+    count = rng.randint(100, 180) if rng.random() < 0.05 else rng.randint(0, 30)
+    for i in range(count):
+        committed_at = pushed_at - datetime.timedelta(days=rng.uniform(0, 17))
+        if rng.random() < 0.05:
+            login: str | None = "dependabot[bot]"
+        elif rng.random() < 0.05:
+            login = None
+        else:
+            login = f"Dev{rng.randrange(400)}"
+        name = login or f"Unlinked Author {rng.randrange(20)}"
+        sha = f"{number:08x}{i:08x}".ljust(40, "0")
+        repo.commits.append(SyntheticCommit(sha, login, name, committed_at))
+    repo.commits.sort(key=lambda commit: commit.committed_at, reverse=True)
+    return repo
+
+
+class SyntheticGithub:
+    """The repos and code search results the stand-in serves.
+
+    :param repos: The number of repos on the synthetic Github.
+    :type repos: int
+    :param results_per_query: The number of results every code search has.
+    :type results_per_query: int
+    :param seed: The seed everything is made up from.
+    :type seed: int
+    """
+
+    def __init__(self, repos: int, results_per_query: int = 300, seed: int = 0):
+        self.now = datetime.datetime.now(datetime.timezone.utc)
+        self.seed = seed
+        self.results_per_query = results_per_query
+        self.repos = [build_repo(number, seed, self.now) for number in range(repos)]
+        self.by_full_name = {
+            f"{repo.owner}/{repo.name}".lower(): repo for repo in self.repos
+        }
+        self.by_owner: dict[str, list[SyntheticRepo]] = {}
+        for repo in self.repos:
+            self.by_owner.setdefault(repo.owner.lower(), []).append(repo)
+
+    def search_results(self, query: str) -> list[tuple[SyntheticRepo, int]]:
+        """Return every result of a code search, with its file size.
+
+        `size:` qualifiers are honored, so shards of a query partition its
+        results; any other qualifiers just seed which repos match.
+        """
+        base = re.sub(r"\s*size:\d+\.\.\d+", "", query).strip()
+        rng = random.Random(f"{self.seed}-{base}")
+        results = [
+            (rng.choice(self.repos), rng.randrange(MAX_FILE_SIZE))
+            for _ in range(self.results_per_query)
+        ]
+        size = re.search(r"size:(\d+)\.\.(\d+)", query)
+        if size:
+            low, high = int(size[1]), int(size[2])
+            results = [result for result in results if low <= result[1] <= high]
+        return results
+
+    def manifest(self, query: str, repo: SyntheticRepo) -> SyntheticManifest:
+        """Make up the file a code search matched in a repo, from the query's
+        `filename:` or `path:` and its keywords."""
+        base = re.sub(r"\s*size:\d+\.\.\d+", "", query).strip()
+        rng = random.Random(f"{self.seed}-{base}-{repo.number}")
+        filename = re.search(r"filename:(\S+)", base)
+        extension = re.search(r"path:\*(\.\S+)", base)
+        if filename:
+            path = kind = filename[1]
+        elif extension:
+            kind = extension[1]
+            path = f"src/{repo.name}{kind}"
+        else:
+            path = kind = "README.md"
+
+        keyword = rng.choice(_keywords(base) or [""])
+        templates = MANIFESTS.get(kind)
+        # one gone with its repo can't be checked, unless it needn't be
+        genuine = templates is None or (
+            rng.random() >= FALSE_POSITIVES and not repo.missing
+        )
+        if templates is None:
+            content = f"{repo.name} uses {keyword}\n"
+        else:
+            template = Template(templates[0] if genuine else templates[1])
+            content = template.substitute(name=repo.name, keyword=keyword)
+        return SyntheticManifest(path, content.encode(), genuine)
+
+    def search_repo_urls(self, query: str) -> set[str]:
+        """Return the URLs of the repos a code search finds, leaving out those
+        whose manifest doesn't really depend on the keywords."""
+        return {
+            repo.url
+            for repo, _ in self.search_results(query)
+            if self.manifest(query, repo).genuine
+        }
+
+    def contributors(
+        self, repos: set[str], since: datetime.datetime
+    ) -> dict[str, set[str]]:
+        """Work out who a contributor count should find, per repo URL."""
+        expected: dict[str, set[str]] = {}
+        for url in repos:
+            repo = self.by_full_name["/".join(url.split("/")[-2:]).lower()]
+            authors: set[str] = set()
+            if not (repo.missing or repo.empty or repo.archived):
+                authors = {
+                    commit.name.lower()
+                    for commit in repo.commits
+                    if commit.committed_at >= since and "[bot]" not in commit.name
+                }
+            expected[url] = authors
+        return expected
+
+
+def main(argv: list[str]) -> int:
+    """Answer `run.sh export -e <ecosystem> <filepath>` with a synthetic export."""
+    if len(argv) != 4 or argv[0] != "export" or argv[1] != "-e":
+        print(f"unsupported fake run.sh command: {argv}", file=sys.stderr)
+        return 2
+    ecosystem, filepath = argv[2], argv[3]
+    lines = taxonomy_lines(
+        ecosystem,
+        int(os.getenv("FAKE_TAXONOMY_REPOS", "1000")),
+        int(os.getenv("FAKE_TAXONOMY_DEPTH", "3")),
+        int(os.getenv("FAKE_TAXONOMY_WIDTH", "4")),
+    )
+    with open(filepath, "w", encoding="utf-8") as f:
+        f.writelines(f"{json.dumps(line)}\n" for line in lines)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,145 @@
+"""
+Attribution
+-----------
+
+Check that repos are attributed to their most specific ecosystems, and that
+doing so stays linear in the number of repos on deep and wide taxonomies.
+"""
+
+import time
+from collections.abc import Callable
+
+from crawler.ecosystem import attribute_repos, build_ecosystem_tree
+from crawler.export_reader import RepoRecord
+from crawler.repo_index import RepoIdentity
+
+
+def record(url: str, *branch: str) -> RepoRecord:
+    """Build an export record of the `Root` ecosystem."""
+    return RepoRecord("Root", branch, url)
+
+
+def test_repos_go_to_the_most_specific_ecosystem():
+    tree = build_ecosystem_tree(
+        "Root",
+        [
+            record("https://github.com/a/root-only"),
+            record("https://github.com/a/leaf"),
+            record("https://github.com/a/leaf", "Mid", "Leaf"),
+            record("https://github.com/a/mid", "Mid"),
+        ],
+    )
+
+    assert attribute_repos(tree, "Root") == {
+        "Root": {"https://github.com/a/root-only"},
+        "Mid": {"https://github.com/a/mid"},
+        "Leaf": {"https://github.com/a/leaf"},
+    }
+
+
+def test_siblings_both_keep_a_shared_repo():
+    tree = build_ecosystem_tree(
+        "Root",
+        [
+            record("https://github.com/a/shared", "Left"),
+            record("https://github.com/A/Shared", "Right"),
+        ],
+    )
+
+    sets = attribute_repos(tree, "Root")
+    assert sets["Root"] == set()
+    assert sets["Left"] == {"https://github.com/a/shared"}
+    assert sets["Right"] == {"https://github.com/a/shared"}
+
+
+def test_ecosystem_under_two_parents_is_computed_once():
+    tree = build_ecosystem_tree(
+        "Root",
+        [
+            record("https://github.com/a/shared", "Left", "Shared"),
+            record("https://github.com/a/shared", "Right", "Shared"),
+            record("https://github.com/a/left", "Left"),
+        ],
+    )
+
+    sets = attribute_repos(tree, "Root")
+    assert list(sets).count("Shared") == 1
+    assert sets["Shared"] == {"https://github.com/a/shared"}
+    assert sets["Left"] == {"https://github.com/a/left"}
+    assert sets["Right"] == set()
+
+
+def test_sub_ecosystem_scope_ignores_outer_ecosystems():
+    tree = build_ecosystem_tree(
+        "Root",
+        [
+            record("https://github.com/a/both"),
+            record("https://github.com/a/both", "Mid"),
+        ],
+    )
+
+    assert attribute_repos(tree, "Mid") == {"Mid": {"https://github.com/a/both"}}
+
+
+def deep_taxonomy(repos: int) -> list[RepoRecord]:
+    """A chain of 50 nested ecosystems, with repos tracked at every depth (and
+    every tenth repo tracked at two depths)."""
+    chain = tuple(f"Eco{depth}" for depth in range(50))
+    records = []
+    for i in range(repos):
+        depth = i % len(chain)
+        records.append(record(f"https://github.com/o/r{i}", *chain[:depth]))
+        if i % 10 == 0:
+            records.append(record(f"https://github.com/o/r{i}", *chain[: depth // 2]))
+    return records
+
+
+def wide_taxonomy(repos: int) -> list[RepoRecord]:
+    """500 sibling ecosystems, with every tenth repo shared by two of them."""
+    records = []
+    for i in range(repos):
+        records.append(record(f"https://github.com/o/r{i}", f"Eco{i % 500}"))
+        if i % 10 == 0:
+            records.append(record(f"https://github.com/o/r{i}", f"Eco{(i + 1) % 500}"))
+    return records
+
+
+def best_time(taxonomy: Callable[[int], list[RepoRecord]], repos: int) -> float:
+    """The fastest of three attributions of a synthetic taxonomy, in seconds."""
+    tree = build_ecosystem_tree("Root", taxonomy(repos))
+    timings = []
+    for _ in range(3):
+        started = time.perf_counter()
+        attribute_repos(tree, "Root")
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+
+def test_attribution_is_linear_in_repo_count():
+    for taxonomy in (deep_taxonomy, wide_taxonomy):
+        small = best_time(taxonomy, 20_000)
+        large = best_time(taxonomy, 80_000)
+        # four times the repos; quadratic would be sixteen times the time
+        assert large < small * 8, (taxonomy.__name__, small, large)
+
+
+def test_a_repo_tracked_under_two_urls_is_attributed_once():
+    tree = build_ecosystem_tree(
+        "Root",
+        [
+            record("https://github.com/a/old-name"),
+            record("https://github.com/b/new-name", "Mid"),
+            record("https://github.com/a/other"),
+        ],
+    )
+    renamed = RepoIdentity(1, "R_1", "https://github.com/b/new-name")
+    repo_ids: dict[str, RepoIdentity | None] = {
+        "https://github.com/a/old-name": renamed,
+        "https://github.com/b/new-name": renamed,
+        "https://github.com/a/other": None,
+    }
+
+    assert attribute_repos(tree, "Root", repo_ids) == {
+        "Root": {"https://github.com/a/other"},
+        "Mid": {"https://github.com/b/new-name"},
+    }
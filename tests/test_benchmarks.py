@@ -0,0 +1,186 @@
+"""
+Benchmarks
+----------
+
+Time the crawl and count stages offline, against the Github stand-in and a
+synthetic taxonomy, and check that they still find what they should.
+
+Every benchmark records the requests one run took in its `extra_info`, next to
+pytest-benchmark's wall-clock numbers, e.g. with `--benchmark-json`. Each round
+starts from the same cold state (no cached exports, commits or `pushed_at`
+times), except where warm runs are the point.
+"""
+
+from pathlib import Path
+
+import pytest
+from pytest_benchmark.fixture import BenchmarkFixture
+
+from crawler.commit_store import contributor_window
+from crawler.counter import get_ecosystem_repos
+from crawler.ecosystem import (
+    load_ecosystem_tree,
+    parse_eco_filename,
+    process_ecosystem,
+)
+from crawler.search_github import (
+    get_contributors_by_repo,
+    search_gh_repos,
+    search_plan,
+)
+from tests.conftest import TAXONOMY_DEPTH, TAXONOMY_REPOS, TAXONOMY_WIDTH, Offline
+from tests.synthetic import NAMED_BRANCHES, branch_of, repo_url, taxonomy_lines
+
+ROUNDS = 3
+
+
+def record_requests(benchmark: BenchmarkFixture, offline: Offline) -> None:
+    """Note the requests made by the last round, by endpoint."""
+    benchmark.extra_info["requests"] = offline.stand_in.total
+    benchmark.extra_info["requests_by_endpoint"] = dict(offline.stand_in.requests)
+
+
+def expected_search_repos(offline: Offline, ecosystem: str) -> set[str]:
+    """The repos an ecosystem's code searches should find."""
+    github = offline.stand_in.github
+    return {
+        url
+        for search in search_plan[ecosystem]
+        for url in github.search_repo_urls(search)
+    }
+
+
+def test_search_gh_repos(benchmark: BenchmarkFixture, offline: Offline):
+    found = benchmark.pedantic(
+        search_gh_repos,
+        args=("stellar",),
+        setup=offline.stand_in.reset,
+        rounds=ROUNDS,
+    )
+    record_requests(benchmark, offline)
+
+    assert found == expected_search_repos(offline, "stellar")
+    assert offline.stand_in.requests["GET /search/code"] >= len(search_plan["stellar"])
+
+
+def test_search_gh_repos_past_the_result_limit(
+    benchmark: BenchmarkFixture, offline: Offline, monkeypatch: pytest.MonkeyPatch
+):
+    monkeypatch.setattr(offline.stand_in.github, "results_per_query", 2500)
+
+    found = benchmark.pedantic(
+        search_gh_repos,
+        args=("paltalabs",),
+        setup=offline.stand_in.reset,
+        rounds=ROUNDS,
+    )
+    record_requests(benchmark, offline)
+
+    # more than Github serves for any one query, so the searches were sharded
+    assert found == expected_search_repos(offline, "paltalabs")
+    assert offline.stand_in.requests["GET /search/code"] > 25
+
+
+@pytest.mark.parametrize(
+    ("depth", "width"), [(2, 4), (25, 2), (1, 200)], ids=["default", "deep", "wide"]
+)
+def test_get_ecosystem_repos(
+    benchmark: BenchmarkFixture,
+    offline: Offline,
+    monkeypatch: pytest.MonkeyPatch,
+    depth: int,
+    width: int,
+):
+    monkeypatch.setenv("FAKE_TAXONOMY_DEPTH", str(depth))
+    monkeypatch.setenv("FAKE_TAXONOMY_WIDTH", str(width))
+
+    ecosystem_sets = benchmark.pedantic(
+        get_ecosystem_repos,
+        args=("Stellar",),
+        setup=offline.fresh_taxonomy,
+        rounds=ROUNDS,
+    )
+
+    tracked = {
+        line["repo_url"]
+        for line in taxonomy_lines("Stellar", TAXONOMY_REPOS, depth, width)
+    }
+    counted = set().union(*ecosystem_sets.values())
+    assert counted == tracked
+    # repos tracked at the root and in a branch only count in the branch
+    shared = next(n for n in range(0, TAXONOMY_REPOS, 10) if branch_of(n, depth, width))
+    assert repo_url(shared) not in ecosystem_sets["Stellar"]
+    assert (offline.out_path / "dumps" / "repos" / "stellar.txt").exists()
+
+
+def test_process_ecosystem(benchmark: BenchmarkFixture, offline: Offline):
+    def setup() -> None:
+        offline.fresh_taxonomy()
+        Path("out/checkpoints/crawl.json").unlink(missing_ok=True)
+        offline.stand_in.reset()
+
+    benchmark.pedantic(process_ecosystem, args=("Stellar",), setup=setup, rounds=ROUNDS)
+    record_requests(benchmark, offline)
+
+    # each ecosystem adds the repos its searches find that it doesn't track yet
+    lines = taxonomy_lines("Stellar", TAXONOMY_REPOS, TAXONOMY_DEPTH, TAXONOMY_WIDTH)
+    expected: set[str] = set()
+    for name in ("Stellar", *NAMED_BRANCHES):
+        tracked = {
+            str(line["repo_url"]).lower()
+            for line in lines
+            if name == "Stellar" or name in line["branch"]  # type: ignore[operator]
+        }
+        searched = expected_search_repos(offline, parse_eco_filename(name))
+        expected.update(url for url in searched if url.lower() not in tracked)
+    (mutations,) = (offline.repo_path / "migrations").glob("*_stellar_mutations")
+    added = {line.split()[-1] for line in mutations.read_text().splitlines()}
+    assert added == expected
+    assert not Path("out/checkpoints/crawl.json").exists()
+
+
+@pytest.mark.parametrize("backend", ["graphql", "rest"])
+def test_get_contributors_by_repo(
+    benchmark: BenchmarkFixture, offline: Offline, backend: str
+):
+    repos = set(load_ecosystem_tree("Stellar").repo_urls("Stellar"))
+
+    def setup() -> None:
+        offline.fresh_contributors()
+        offline.stand_in.reset()
+
+    contributors = benchmark.pedantic(
+        get_contributors_by_repo,
+        args=(repos,),
+        kwargs={"backend": backend},
+        setup=setup,
+        rounds=ROUNDS,
+    )
+    record_requests(benchmark, offline)
+
+    # missing (404) and empty (409) repos are counted without any contributors
+    since, _ = contributor_window()
+    assert contributors == offline.stand_in.github.contributors(repos, since)
+
+
+def test_get_contributors_by_repo_incrementally(
+    benchmark: BenchmarkFixture, offline: Offline
+):
+    repos = set(load_ecosystem_tree("Stellar").repo_urls("Stellar"))
+    offline.fresh_contributors()
+    get_contributors_by_repo(repos)
+    cold_requests = offline.stand_in.total
+
+    offline.stand_in.reset()
+    contributors = benchmark.pedantic(
+        get_contributors_by_repo,
+        args=(repos,),
+        setup=offline.stand_in.reset,
+        rounds=ROUNDS,
+    )
+    record_requests(benchmark, offline)
+
+    since, _ = contributor_window()
+    assert contributors == offline.stand_in.github.contributors(repos, since)
+    # the cached `pushed_at` times and commit watermarks save requests
+    assert offline.stand_in.total < cold_requests
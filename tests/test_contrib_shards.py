@@ -0,0 +1,87 @@
+"""
+Contributor Shards
+------------------
+
+Check that sharded contributor counts add up to the unsharded count, whether
+the shards run as worker processes or one at a time, and that the repos stay
+with their shards as shards are added.
+"""
+
+import pytest
+
+from crawler import contrib_shards
+from crawler.commit_store import contributor_window
+from crawler.contrib_shards import (
+    HashRing,
+    count_contributor_shards,
+    merge_contributor_shards,
+)
+from crawler.counter import get_ecosystem_repos
+from tests.conftest import Offline
+from tests.synthetic import repo_url
+
+
+def expected_contributors(offline: Offline) -> dict[str, set[str]]:
+    """The contributors an unsharded count finds in each ecosystem."""
+    since, _ = contributor_window()
+    github = offline.stand_in.github
+    return {
+        eco: set().union(*github.contributors(repos, since).values())
+        for eco, repos in get_ecosystem_repos("Stellar").items()
+    }
+
+
+def test_hash_ring_spreads_the_repos_evenly():
+    ring = HashRing(4)
+    counts = [0] * 4
+    for n in range(4000):
+        counts[ring.shard_of(repo_url(n))] += 1
+
+    assert all(700 < count < 1300 for count in counts)
+
+
+def test_hash_ring_keeps_repos_with_their_shards():
+    repos = [repo_url(n) for n in range(4000)]
+    before, after = HashRing(4), HashRing(5)
+
+    moved = [repo for repo in repos if before.shard_of(repo) != after.shard_of(repo)]
+    # only the new shard takes repos, and only its share of them
+    assert all(after.shard_of(repo) == 4 for repo in moved)
+    assert len(moved) < len(repos) * 0.3
+    assert HashRing(4).shard_of(repos[0].upper()) == before.shard_of(repos[0])
+
+
+def test_count_shards_one_at_a_time(offline: Offline):
+    for shard in range(3):
+        assert count_contributor_shards("Stellar", 3, only_shard=shard) is None
+
+    merged = merge_contributor_shards("Stellar", 3)
+
+    assert merged == expected_contributors(offline)
+    contribs_path = offline.out_path / "dumps" / "contribs"
+    assert (
+        set((contribs_path / "Stellar.txt").read_text().splitlines())
+        == merged["Stellar"]
+    )
+    assert len(list((offline.out_path / "shards").glob("commits-*.sqlite"))) == 3
+
+
+def test_merge_needs_every_shard(offline: Offline):
+    count_contributor_shards("Stellar", 3, only_shard=1)
+
+    with pytest.raises(RuntimeError, match=r"\[0, 2\]"):
+        merge_contributor_shards("Stellar", 3)
+
+
+def test_count_shards_in_worker_processes(
+    offline: Offline, monkeypatch: pytest.MonkeyPatch
+):
+    # the workers are spawned, so they pick the stand-in up from the environment
+    monkeypatch.setenv("GITHUB_API_URL", offline.stand_in.url)
+    monkeypatch.setattr(contrib_shards, "GITHUB_TOKENS", ["token-a", "token-b"])
+
+    merged = count_contributor_shards("Stellar", 2)
+
+    assert merged == expected_contributors(offline)
+    # the workers' requests are accounted for in this process's metrics
+    assert sum(e.calls for e in contrib_shards.metrics.endpoints.values()) > 0
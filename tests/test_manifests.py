@@ -0,0 +1,176 @@
+"""
+Manifests
+---------
+
+Check that code search hits only count when their manifest really depends on
+what was searched for, and that each manifest is fetched and parsed once.
+"""
+
+import pytest
+
+from crawler.manifests import (
+    ManifestCache,
+    manifest_kind,
+    matches_keyword,
+    parse_manifest,
+)
+from crawler.search_github import search_gh_repos, search_plan
+from tests.conftest import Offline
+
+ECOSYSTEM = "stellar"
+
+BLOBS = "GET /repos/{owner}/{repo}/git/blobs/{sha}"
+
+
+@pytest.mark.parametrize(
+    ("path", "content", "dependencies"),
+    [
+        (
+            "package.json",
+            '{"description": "stellar-sdk", "dependencies": {"left-pad": "1"},'
+            ' "devDependencies": {"@stellar/freighter-api": "2"}}',
+            {"left-pad", "@stellar/freighter-api"},
+        ),
+        (
+            "crates/x/Cargo.toml",
+            '[dependencies]\nsdk = { package = "soroban-sdk", version = "21" }\n'
+            '[target.wasm32-unknown-unknown.dev-dependencies]\nstellar-xdr = "22"\n',
+            {"sdk", "soroban-sdk", "stellar-xdr"},
+        ),
+        (
+            "pyproject.toml",
+            "[project]\ndependencies = [\"stellar-sdk>=9; python_version>'3.9'\"]\n"
+            '[tool.poetry.group.dev.dependencies]\npytest = "*"\n',
+            {"stellar-sdk", "pytest"},
+        ),
+        (
+            "requirements.txt",
+            "-r base.txt\nstellar_sdk==9.0  # stellar-base\n# soroban\n",
+            {"stellar_sdk"},
+        ),
+        (
+            "go.mod",
+            "module x\n\nrequire github.com/a/b v1\n// github.com/stellar/go\n"
+            "require (\n\tgithub.com/stellar/go-stellar-sdk v0.1.0 // indirect\n)\n",
+            {"github.com/a/b", "github.com/stellar/go-stellar-sdk"},
+        ),
+        (
+            "pom.xml",
+            "<project><artifactId>stellar-sdk</artifactId><!-- <dependency>"
+            "<artifactId>x</artifactId></dependency> --><dependency>"
+            "<artifactId>java-stellar-sdk</artifactId></dependency></project>",
+            {"java-stellar-sdk"},
+        ),
+        (
+            "build.gradle.kts",
+            'implementation("org.stellar:wallet-sdk:1.0")\n'
+            '// implementation("a:b:1")\n',
+            {"org.stellar:wallet-sdk", "wallet-sdk"},
+        ),
+        (
+            "pubspec.yaml",
+            "name: x\ndescription: stellar_sdk\ndependencies:\n"
+            "  stellar_flutter_sdk: ^1.0.0\n  flutter:\n    sdk: flutter\n",
+            {"stellar_flutter_sdk", "flutter"},
+        ),
+        (
+            "Package.swift",
+            '.package(url: "https://github.com/Soneso/stellar-ios-mac-sdk.git",'
+            ' from: "2.0.0")',
+            {"stellar-ios-mac-sdk"},
+        ),
+        (
+            "mix.exs",
+            '# {:soroban, "~> 1"}\ndefp deps, do: [{:stellar_sdk, "~> 0.1"}]\n',
+            {"stellar_sdk"},
+        ),
+        (
+            "src/App.csproj",
+            '<PackageReference Include="stellar-dotnet-sdk" Version="1" />',
+            {"stellar-dotnet-sdk"},
+        ),
+    ],
+)
+def test_parse_manifest(path: str, content: str, dependencies: set[str]):
+    kind = manifest_kind(path)
+    assert kind is not None
+    assert parse_manifest(kind, content.encode()) == dependencies
+
+
+def test_unparseable_manifests():
+    assert manifest_kind("src/StellarQt.pro") is None
+    assert parse_manifest("package.json", b"{not json") is None
+    assert parse_manifest("Cargo.toml", b"dependencies = 1") is None
+
+
+@pytest.mark.parametrize(
+    ("dependency", "matches"),
+    [
+        ("stellar_sdk", True),
+        ("java-stellar-sdk", True),
+        ("github.com/stellar/go-stellar-sdk", True),
+        ("@stellar/Stellar-SDK", True),
+        ("stellar-sdkx", False),
+        ("stellar", False),
+    ],
+)
+def test_matches_keyword(dependency: str, matches: bool):
+    assert matches_keyword([dependency], ["stellar-sdk", "soroban"]) is matches
+
+
+def test_hits_that_only_mention_a_keyword_are_dropped(offline: Offline):
+    github = offline.stand_in.github
+    searched = {
+        repo.url
+        for search in search_plan[ECOSYSTEM]
+        for repo, _ in github.search_results(search)
+    }
+
+    found = search_gh_repos(ECOSYSTEM)
+
+    expected = {
+        url
+        for search in search_plan[ECOSYSTEM]
+        for url in github.search_repo_urls(search)
+    }
+    assert found == expected
+    assert len(found) < len(searched)
+
+
+def test_manifests_are_fetched_once(offline: Offline):
+    search_gh_repos(ECOSYSTEM)
+    fetched = offline.stand_in.requests[BLOBS]
+    assert fetched > 0
+    offline.stand_in.reset()
+
+    found = search_gh_repos(ECOSYSTEM)
+
+    assert offline.stand_in.requests[BLOBS] == 0
+    assert found
+    with ManifestCache() as cache:
+        count = cache.connection.execute("SELECT COUNT(*) FROM manifests").fetchone()
+    assert count[0] == fetched
+
+
+def test_debug(offline: Offline):
+    from crawler import search_github
+    from crawler.checkpoint import CrawlCheckpoint
+
+    github = offline.stand_in.github
+    s = search_plan[ECOSYSTEM][0]
+    cp = CrawlCheckpoint(filepath=None)
+    for s in search_plan[ECOSYSTEM]:
+        r = search_github.run_search(s, cp)
+        print(
+            s,
+            len(r),
+            r - github.search_repo_urls(s),
+            cp.query(s).shards,
+            cp.query(s).total_count,
+        )
+    print(offline.stand_in.requests)
+    res = (
+        search_github.g["code"].search_code(s, sort="indexed", order="desc").get_page(0)
+    )
+    print([(r.path, r.sha, r.repository.html_url) for r in res[:3]])
+    assert False
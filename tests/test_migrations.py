@@ -0,0 +1,215 @@
+"""
+Migrations
+----------
+
+Check that replaying the migrations in-process builds the same taxonomy as an
+export, that later replays only apply what's new, and that every command of
+the DSL does what it says.
+"""
+
+from pathlib import Path
+
+import pytest
+
+from crawler import ecosystem
+from crawler.ecosystem import build_ecosystem_tree, load_ecosystem_tree
+from crawler.export_reader import RepoRecord
+from crawler.instrumentation import metrics
+from crawler.migrations import MigrationError, Taxonomy, replay_migrations
+from tests.conftest import TAXONOMY_DEPTH, TAXONOMY_REPOS, TAXONOMY_WIDTH, Offline
+from tests.synthetic import migration_lines, taxonomy_lines
+
+
+def write_migration(offline: Offline, name: str, lines: list[str]) -> Path:
+    """Write a migration file into the fake clone."""
+    path = offline.repo_path / "migrations" / name
+    path.write_text("".join(f"{line}\n" for line in lines), encoding="utf-8")
+    return path
+
+
+def replayed_mutations() -> int:
+    """The number of mutations applied by the replays since the last reset."""
+    replays = metrics.stages.get("replay migrations")
+    return replays.items if replays else 0
+
+
+@pytest.fixture
+def synthetic_migrations(offline: Offline) -> list[str]:
+    """Replace the fake clone's migrations with the synthetic taxonomy."""
+    (offline.repo_path / "migrations" / "2025-01-01T000000_init").unlink()
+    lines = migration_lines("Stellar", TAXONOMY_REPOS, TAXONOMY_DEPTH, TAXONOMY_WIDTH)
+    write_migration(offline, "2025-01-01T000000_init", lines)
+    return lines
+
+
+def taxonomy(*lines: str) -> Taxonomy:
+    """Replay some mutations onto an empty taxonomy."""
+    replayed = Taxonomy()
+    replayed.apply_text("test", "\n".join(lines))
+    return replayed
+
+
+def test_replay_matches_export(synthetic_migrations: list[str]):
+    exported = build_ecosystem_tree(
+        "Stellar",
+        (
+            RepoRecord(
+                line["eco_name"],  # type: ignore[arg-type]
+                tuple(line["branch"]),  # type: ignore[arg-type]
+                line["repo_url"],  # type: ignore[arg-type]
+                tuple(line.get("tags") or ()),  # type: ignore[arg-type]
+            )
+            for line in taxonomy_lines(
+                "Stellar", TAXONOMY_REPOS, TAXONOMY_DEPTH, TAXONOMY_WIDTH
+            )
+        ),
+    )
+
+    replayed = build_ecosystem_tree("Stellar", replay_migrations().export("Stellar"))
+
+    assert replayed.children == exported.children
+    assert replayed.lower_repos == exported.lower_repos
+    assert replayed.direct == exported.direct
+
+
+def test_replay_applies_only_new_migrations(
+    offline: Offline, synthetic_migrations: list[str]
+):
+    replay_migrations()
+    assert replayed_mutations() == len(synthetic_migrations)
+
+    metrics.reset()
+    write_migration(
+        offline,
+        "2025-02-01T000000_more",
+        ["repadd PaltaLabs https://github.com/new/one"],
+    )
+    replay_migrations()
+    assert replayed_mutations() == 1
+
+    # lines appended to the newest file are applied on their own too
+    metrics.reset()
+    with open(
+        offline.repo_path / "migrations" / "2025-02-01T000000_more",
+        "a",
+        encoding="utf-8",
+    ) as f:
+        f.write("repadd Stellar https://github.com/new/two\n")
+    taxonomy_now = replay_migrations()
+    assert replayed_mutations() == 1
+    assert "https://github.com/new/two" in taxonomy_now.repos["Stellar"]
+
+    # a nothing-new replay applies nothing
+    metrics.reset()
+    replay_migrations()
+    assert replayed_mutations() == 0
+
+
+def test_replay_starts_over_when_history_changes(
+    offline: Offline, synthetic_migrations: list[str]
+):
+    replay_migrations()
+    write_migration(offline, "2024-12-31T000000_earlier", ["ecoadd Earlier"])
+
+    metrics.reset()
+    replayed = replay_migrations()
+
+    assert replayed_mutations() == len(synthetic_migrations) + 1
+    assert "Earlier" in replayed.repos
+
+
+def test_load_ecosystem_tree_replays_without_exporting(
+    synthetic_migrations: list[str], monkeypatch: pytest.MonkeyPatch
+):
+    monkeypatch.setattr(ecosystem, "TAXONOMY_SOURCE", "replay")
+
+    tree = load_ecosystem_tree("Stellar")
+
+    assert len(tree.lower_repos["Stellar"]) == TAXONOMY_REPOS
+    assert not metrics.subprocesses
+
+
+def test_load_ecosystem_tree_falls_back_to_exporting(
+    offline: Offline, monkeypatch: pytest.MonkeyPatch
+):
+    monkeypatch.setattr(ecosystem, "TAXONOMY_SOURCE", "replay")
+    write_migration(offline, "2025-02-01T000000_odd", ["ecofrob Stellar"])
+
+    tree = load_ecosystem_tree("Stellar")
+
+    assert len(tree.lower_repos["Stellar"]) == TAXONOMY_REPOS
+    assert metrics.subprocesses["taxonomy export"].calls == 1
+
+
+def test_quoted_names_and_comments():
+    replayed = taxonomy(
+        "-- a comment",
+        "ecoadd Stellar",
+        'ecoadd "Aquarius (AQUA token)"',
+        "",
+        'ecocon Stellar "Aquarius (AQUA token)"',
+        'repadd "Aquarius (AQUA token)" https://github.com/a/b #defi #token',
+    )
+
+    assert replayed.children["Stellar"] == {"Aquarius (AQUA token)"}
+    assert replayed.repos["Aquarius (AQUA token)"] == {
+        "https://github.com/a/b": ("#defi", "#token")
+    }
+
+
+def test_renaming_and_removing():
+    replayed = taxonomy(
+        "ecoadd Stellar",
+        "ecoadd Old",
+        "ecoadd Gone",
+        "ecocon Stellar Old",
+        "ecocon Old Gone",
+        "repadd Old https://github.com/a/b",
+        "repadd Gone https://github.com/a/b",
+        "repadd Gone https://github.com/a/c",
+        "ecomov Old New",
+        "repmov https://github.com/a/b https://github.com/a/d",
+        "ecorem Gone",
+    )
+
+    assert replayed.children == {"Stellar": {"New"}, "New": set()}
+    assert replayed.repos == {
+        "Stellar": {},
+        "New": {"https://github.com/a/d": ()},
+    }
+    assert replayed.repo_ecosystems == {"https://github.com/a/d": {"New"}}
+
+
+def test_disconnecting_and_removing_repos():
+    replayed = taxonomy(
+        "ecoadd Stellar",
+        "ecoadd Sub",
+        "ecocon Stellar Sub",
+        "repadd Stellar https://github.com/a/b",
+        "repadd Sub https://github.com/a/b",
+        "repadd Sub https://github.com/a/c",
+        "reprem Sub https://github.com/a/b",
+        "reprem https://github.com/a/c",
+        "ecodis Stellar Sub",
+    )
+
+    assert [r.repo_url for r in replayed.export("Stellar")] == [
+        "https://github.com/a/b"
+    ]
+    assert replayed.repos["Sub"] == {}
+
+
+@pytest.mark.parametrize(
+    "line",
+    [
+        "ecofrob Stellar",
+        "ecoadd",
+        "repadd Nowhere https://github.com/a/b",
+        "repadd Stellar https://github.com/a/b protocol",
+        "ecocon Stellar Nowhere",
+        "ecomov Nowhere Somewhere",
+    ],
+)
+def test_bad_mutations(line: str):
+    with pytest.raises(MigrationError, match="test:2"):
+        taxonomy("ecoadd Stellar", line)
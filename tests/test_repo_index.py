@@ -0,0 +1,127 @@
+"""
+Repo Index
+----------
+
+Check that a repo known by several URLs, e.g. from before and after a rename,
+is crawled, attributed and counted as the one repo it is.
+"""
+
+import pytest
+
+from crawler import search_github
+from crawler.commit_store import contributor_window
+from crawler.ecosystem import parse_eco_filename, process_ecosystem
+from crawler.repo_index import RepoIdentity, RepoIndex
+from crawler.search_github import (
+    get_contributors_by_repo,
+    resolve_repo_ids,
+    search_plan,
+)
+from tests.conftest import TAXONOMY_REPOS, Offline
+from tests.synthetic import NAMED_BRANCHES, SyntheticRepo, repo_url
+
+
+def rename(
+    offline: Offline, monkeypatch: pytest.MonkeyPatch, repo: SyntheticRepo
+) -> str:
+    """Move a repo to a new owner and name, leaving a redirect behind."""
+    new_url = f"https://github.com/Moved/Renamed-{repo.number}"
+    monkeypatch.setattr(repo, "renamed_to", new_url)
+    monkeypatch.setitem(
+        offline.stand_in.github.by_full_name, f"moved/renamed-{repo.number}", repo
+    )
+    return new_url
+
+
+def searched(offline: Offline, ecosystem: str) -> set[str]:
+    """The repos an ecosystem's code searches find."""
+    github = offline.stand_in.github
+    return {
+        url
+        for search in search_plan[ecosystem]
+        for url in github.search_repo_urls(search)
+    }
+
+
+def test_resolve_repo_ids_remembers_what_it_looked_up(
+    offline: Offline, monkeypatch: pytest.MonkeyPatch
+):
+    github = offline.stand_in.github
+    moved = next(repo for repo in github.repos if not repo.missing)
+    gone = next(repo for repo in github.repos if repo.missing)
+    old_url = moved.url
+    new_url = rename(offline, monkeypatch, moved)
+
+    repo_ids = resolve_repo_ids([old_url, gone.url])
+
+    identity = RepoIdentity(moved.number, f"R_{moved.number}", new_url)
+    assert repo_ids == {old_url.lower(): identity, gone.url.lower(): None}
+    offline.stand_in.reset()
+    assert resolve_repo_ids([old_url.upper(), new_url, gone.url]) == {
+        old_url.lower(): identity,
+        new_url.lower(): identity,
+        gone.url.lower(): None,
+    }
+    assert offline.stand_in.total == 0
+
+
+def test_search_results_fill_in_the_index(offline: Offline):
+    search_github.search_gh_repos("paltalabs")
+
+    with RepoIndex() as index:
+        repo_ids = index.lookup(searched(offline, "paltalabs"))
+    assert len(repo_ids) == len(searched(offline, "paltalabs"))
+    assert all(identity is not None for identity in repo_ids.values())
+
+
+def test_crawl_skips_renamed_repos(offline: Offline, monkeypatch: pytest.MonkeyPatch):
+    branch_finds = set().union(
+        *(searched(offline, parse_eco_filename(name)) for name in NAMED_BRANCHES)
+    )
+    # tracked, found by the root's searches, and by none of the branches'
+    number = next(
+        n
+        for n in range(TAXONOMY_REPOS)
+        if repo_url(n) in searched(offline, "stellar")
+        and repo_url(n) not in branch_finds
+    )
+    repo = offline.stand_in.github.by_full_name[
+        "/".join(repo_url(number).split("/")[-2:]).lower()
+    ]
+    new_url = rename(offline, monkeypatch, repo)
+
+    process_ecosystem("Stellar")
+
+    (mutations,) = (offline.repo_path / "migrations").glob("*_stellar_mutations")
+    added = {line.split()[-1] for line in mutations.read_text().splitlines()}
+    assert added
+    assert new_url not in added
+
+
+def test_contributors_are_fetched_once_per_repo(
+    offline: Offline, monkeypatch: pytest.MonkeyPatch
+):
+    github = offline.stand_in.github
+    since, _ = contributor_window()
+    repo = next(
+        repo
+        for repo in github.repos
+        if github.contributors({repo.url}, since)[repo.url]
+    )
+    old_url = repo.url
+    new_url = rename(offline, monkeypatch, repo)
+    resolve_repo_ids([old_url])
+    fetched: list[str] = []
+    fetch_commits = search_github.fetch_commits
+
+    def spy(since_by_repo, *args, **kwargs):
+        fetched.extend(since_by_repo)
+        return fetch_commits(since_by_repo, *args, **kwargs)
+
+    monkeypatch.setattr(search_github, "fetch_commits", spy)
+
+    contributors = get_contributors_by_repo({old_url, new_url})
+
+    assert fetched == [new_url]
+    expected = github.contributors({new_url}, since)[new_url]
+    assert contributors == {old_url: expected, new_url: expected}
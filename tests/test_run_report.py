@@ -0,0 +1,76 @@
+"""
+Run Report
+----------
+
+Check the metrics recorded during an offline run, and the report written from
+them.
+"""
+
+import json
+from pathlib import Path
+
+import pytest
+
+from crawler import run_report
+from crawler.counter import count_all_contributors
+from crawler.instrumentation import endpoint_of, metrics
+from crawler.run_report import reporting
+from tests.conftest import Offline
+
+
+@pytest.mark.parametrize(
+    ("method", "url", "endpoint"),
+    [
+        ("GET", "/search/code?q=stellar&page=2", "GET /search/code"),
+        ("GET", "/repos/Org1/Repo-9/commits", "GET /repos/{owner}/{repo}/commits"),
+        ("GET", "/users/Org1/repos?per_page=100", "GET /users/{user}/repos"),
+        (
+            "GET",
+            "/api/v3/repos/a/b/commits/" + "0123456789abcdef" * 2 + "01234567",
+            "GET /api/v3/repos/{owner}/{repo}/commits/{sha}",
+        ),
+        ("POST", "/graphql", "POST /graphql"),
+    ],
+)
+def test_endpoint_of(method: str, url: str, endpoint: str):
+    assert endpoint_of(method, url) == endpoint
+
+
+def test_run_report(offline: Offline, tmp_path: Path, monkeypatch: pytest.MonkeyPatch):
+    textfile = tmp_path / "ec_crawler.prom"
+    monkeypatch.setattr(run_report, "PROMETHEUS_TEXTFILE", str(textfile))
+
+    with reporting("count_contrib"):
+        count_all_contributors("Stellar")
+
+    report = json.loads(
+        (offline.out_path / "reports" / "count_contrib-latest.json").read_text()
+    )
+    assert report["status"] == "ok"
+    assert report["subprocesses"]["taxonomy export"]["calls"] == 1
+    assert report["stages"]["count contributors"]["items"] > 0
+    # every request the stand-in answered is accounted for, by endpoint
+    assert report["api"]["calls"] == offline.stand_in.total
+    assert sorted(e["calls"] for e in report["api"]["endpoints"].values()) == sorted(
+        offline.stand_in.requests.values()
+    )
+    assert report["rate_limits"]["core"]["requests"] > 0
+
+    prometheus = textfile.read_text()
+    assert 'ec_crawler_run_success{command="count_contrib"} 1' in prometheus
+    assert (
+        'ec_crawler_subprocess_seconds{command="count_contrib",'
+        'subprocess="taxonomy export"}' in prometheus
+    )
+
+
+def test_failed_run_report(offline: Offline):
+    with pytest.raises(RuntimeError), reporting("count_repos"):
+        raise RuntimeError("export failed")
+
+    report = json.loads(
+        (offline.out_path / "reports" / "count_repos-latest.json").read_text()
+    )
+    assert report["status"] == "failed"
+    assert report["started_at"] <= report["finished_at"]
+    assert not metrics.endpoints
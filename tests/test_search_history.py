@@ -0,0 +1,126 @@
+"""
+Search History
+--------------
+
+Check that a crawl with a search history only pages through the code search
+results that are new since the last one, and still finds every repo: those
+it pages through, and those found before.
+"""
+
+import datetime
+import re
+
+import pytest
+
+from crawler import search_github
+from crawler.search_github import search_gh_repos, search_plan
+from crawler.search_history import SearchHistory
+from tests.conftest import Offline
+from tests.synthetic import MAX_FILE_SIZE, SyntheticRepo
+
+ECOSYSTEM = "paltalabs"
+
+
+def found_so_far(offline: Offline) -> set[str]:
+    """The repos the ecosystem's code searches find."""
+    github = offline.stand_in.github
+    return {
+        url
+        for search in search_plan[ECOSYSTEM]
+        for url in github.search_repo_urls(search)
+    }
+
+
+def add_new_results(
+    offline: Offline, monkeypatch: pytest.MonkeyPatch, count: int
+) -> set[str]:
+    """Index `count` new results, ahead of the others, for every code search,
+    and return the repos they add."""
+    github = offline.stand_in.github
+    known = found_so_far(offline)
+    fresh: list[tuple[SyntheticRepo, int]] = [
+        (repo, n * MAX_FILE_SIZE // count)
+        for n, repo in enumerate(
+            [repo for repo in github.repos if repo.url not in known][:count]
+        )
+    ]
+    search_results = github.search_results
+
+    def with_new_results(query: str) -> list[tuple[SyntheticRepo, int]]:
+        size = re.search(r"size:(\d+)\.\.(\d+)", query)
+        new = [
+            (repo, size_)
+            for repo, size_ in fresh
+            if not size or int(size[1]) <= size_ <= int(size[2])
+        ]
+        return new + search_results(query)
+
+    monkeypatch.setattr(github, "search_results", with_new_results)
+    # those whose manifests really depend on a keyword
+    return found_so_far(offline) - known
+
+
+@pytest.fixture
+def sharded(offline: Offline, monkeypatch: pytest.MonkeyPatch) -> Offline:
+    """More results than Github serves for a query, so the searches are sharded."""
+    monkeypatch.setattr(offline.stand_in.github, "results_per_query", 2500)
+    return offline
+
+
+def test_incremental_search_stops_at_the_last_crawl(
+    sharded: Offline, monkeypatch: pytest.MonkeyPatch
+):
+    search_gh_repos(ECOSYSTEM, history=SearchHistory.load())
+    full_requests = sharded.stand_in.requests["GET /search/code"]
+    new_repos = add_new_results(sharded, monkeypatch, 40)
+    sharded.stand_in.reset()
+
+    found = search_gh_repos(ECOSYSTEM, history=SearchHistory.load())
+
+    assert found == found_so_far(sharded)
+    assert new_repos <= found
+    # a page per shard, instead of every page of every shard (and the planning)
+    assert sharded.stand_in.requests["GET /search/code"] < full_requests / 3
+
+
+def test_incremental_search_stops_at_a_run_of_known_repos(
+    sharded: Offline, monkeypatch: pytest.MonkeyPatch
+):
+    search_gh_repos(ECOSYSTEM, history=SearchHistory.load())
+    full_requests = sharded.stand_in.requests["GET /search/code"]
+    history = SearchHistory.load()
+    # without the marks, only the known repos can stop the searches
+    for shard in history.shards.values():
+        shard.mark = None
+    monkeypatch.setattr(search_github, "SEARCH_KNOWN_RUN", 50)
+    sharded.stand_in.reset()
+
+    found = search_gh_repos(ECOSYSTEM, history=history)
+
+    assert found == found_so_far(sharded)
+    assert sharded.stand_in.requests["GET /search/code"] < full_requests / 3
+
+
+@pytest.mark.parametrize("due", ["full_sweep", "aged"])
+def test_full_sweep_searches_everything_again(
+    sharded: Offline, monkeypatch: pytest.MonkeyPatch, due: str
+):
+    search_gh_repos(ECOSYSTEM, history=SearchHistory.load())
+    full_requests = sharded.stand_in.requests["GET /search/code"]
+    history = SearchHistory.load(full_sweep=due == "full_sweep")
+    if due == "aged":
+        for query in history.queries.values():
+            query.swept_at -= datetime.timedelta(days=365)
+    add_new_results(sharded, monkeypatch, 40)
+    sharded.stand_in.reset()
+
+    found = search_gh_repos(ECOSYSTEM, history=history)
+
+    assert found == found_so_far(sharded)
+    assert sharded.stand_in.requests["GET /search/code"] >= full_requests
+    saved = SearchHistory.load()
+    assert all(
+        query.swept_at
+        > datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(minutes=5)
+        for query in saved.queries.values()
+    )